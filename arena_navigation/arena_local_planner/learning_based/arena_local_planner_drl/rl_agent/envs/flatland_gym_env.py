@@ -5,11 +5,13 @@ import gym
 from gym import spaces
 from gym.spaces import space
 from typing import Union
+from concurrent.futures import ThreadPoolExecutor
 from stable_baselines3.common.env_checker import check_env
 import yaml
 from rl_agent.utils.observation_collector import ObservationCollector
+from rl_agent.utils.observation_reducer import ObservationReducer
 from rl_agent.utils.reward import RewardCalculator
-from rl_agent.utils.debug import timeit
+from rl_agent.utils.debug import timeit, StepProfiler
 from task_generator.tasks import ABSTask
 import numpy as np
 import rospy
@@ -21,7 +23,7 @@ import time
 class FlatlandEnv(gym.Env):
     """Custom Environment that follows gym interface"""
 
-    def __init__(self, task: ABSTask, robot_yaml_path: str, settings_yaml_path: str, reward_fnc: str, is_action_space_discrete, safe_dist: float = None, goal_radius: float = 0.1, max_steps_per_episode=100):
+    def __init__(self, task: ABSTask, robot_yaml_path: str, settings_yaml_path: str, reward_fnc: str, is_action_space_discrete, safe_dist: float = None, goal_radius: float = 0.1, max_steps_per_episode=100, ns: str = None, lockstep: bool = False, sim_backend=None, profiler: StepProfiler = None):
         """Default env
         Flatland yaml node check the entries in the yaml file, therefore other robot related parameters cound only be saved in an other file.
         TODO : write an uniform yaml paser node to handel with multiple yaml files.
@@ -36,17 +38,36 @@ class FlatlandEnv(gym.Env):
             is_action_space_discrete (bool): [description]
             safe_dist (float, optional): [description]. Defaults to None.
             goal_radius (float, optional): [description]. Defaults to 0.1.
+            ns (str, optional): namespace of the simulation instance the env is bound to, used to run several
+                instances in parallel. Defaults to None (global namespace).
+            lockstep (bool, optional): advance the simulation exactly one laser update per step and use the sensor
+                data of that tick (see ObservationCollector). Defaults to False.
+            sim_backend (HeadlessSimulator, optional): in-process simulator used instead of the flatland server,
+                no ROS master is needed in this case. Defaults to None.
+            profiler (StepProfiler, optional): records the timing of the phases of step and reset, the last
+                aggregation can be read with get_profile_summary. Defaults to None.
         """
         super(FlatlandEnv, self).__init__()
+        self.ns = ns
+        self.ns_prefix = "" if ns is None or ns == "" else "/"+ns+"/"
         # Define action and observation space
         # They must be gym.spaces objects
 
         self._is_action_space_discrete = is_action_space_discrete
         self.setup_by_configuration(robot_yaml_path, settings_yaml_path)
+        self._sim_backend = sim_backend
         # observation collector
-        self.observation_collector = ObservationCollector(
-            self._laser_num_beams, self._laser_max_range)
+        if sim_backend is not None:
+            # the simulator advances one laser update per observation and provides the same interface
+            sim_backend.set_observation_reducer(self._observation_reducer)
+            self.observation_collector = sim_backend
+        else:
+            self.observation_collector = ObservationCollector(
+                self._laser_num_beams, self._laser_max_range, ns=ns, lockstep=lockstep,
+                sim_time_per_obs=1.0/self._laser_update_rate, reducer=self._observation_reducer)
         self.observation_space = self.observation_collector.get_observation_space()
+        self._profiler = profiler
+        self.observation_collector.profiler = profiler
 
         # reward calculator
         if safe_dist is None:
@@ -55,22 +76,28 @@ class FlatlandEnv(gym.Env):
         self.reward_calculator = RewardCalculator(
             robot_radius=self._robot_radius, safe_dist=1.1*self._robot_radius, goal_radius=goal_radius, rule=reward_fnc)
 
+        self.task = task
+        self._steps_curr_episode = 0
+        self._max_steps_per_episode = max_steps_per_episode
+        # background thread of step_async, created on first use
+        self._step_executor = None
+        self._pending_step = None
+        if sim_backend is not None:
+            self._is_train_mode = True
+            return
         # action agent publisher
-        self.agent_action_pub = rospy.Publisher('cmd_vel', Twist, queue_size=1)
+        self.agent_action_pub = rospy.Publisher(f'{self.ns_prefix}cmd_vel', Twist, queue_size=1)
         # service clients
         self._is_train_mode = rospy.get_param("train_mode")
         if self._is_train_mode:
-            self._service_name_step = '/step_world'
+            self._service_name_step = f'{self.ns_prefix}step_world'
             self._sim_step_client = rospy.ServiceProxy(
             self._service_name_step, StepWorld)
-        self.task = task
-        self._steps_curr_episode = 0
-        self._max_steps_per_episode = max_steps_per_episode
         # # get observation
         # obs=self.observation_collector.get_observations()
 
     def setup_by_configuration(self, robot_yaml_path: str, settings_yaml_path: str):
-        """get the configuration from the yaml file, including robot radius, discrete action space and continuous action space.
+        """get the configuration from the yaml file, including robot radius, discrete action space, continuous action space and the observation reduction.
 
         Args:
             robot_yaml_path (str): [description]
@@ -95,9 +122,13 @@ class FlatlandEnv(gym.Env):
                     self._laser_num_beams = int(
                         round((laser_angle_max-laser_angle_min)/laser_angle_increment)+1)
                     self._laser_max_range = plugin['range']
+                    self._laser_update_rate = plugin.setdefault('update_rate', 10)
 
         with open(settings_yaml_path, 'r') as fd:
             setting_data = yaml.safe_load(fd)
+            # optional reduction of the laser scan in the observation
+            self._observation_reducer = ObservationReducer.from_settings(
+                setting_data.get('observation', None), self._laser_num_beams, self._laser_max_range)
             if self._is_action_space_discrete:
                 # self._discrete_actions is a list, each element is a dict with the keys ["name", 'linear','angular']
                 self._discrete_acitons = setting_data['robot']['discrete_actions']
@@ -112,6 +143,13 @@ class FlatlandEnv(gym.Env):
                                                dtype=np.float)
 
     def _pub_action(self, action):
+        if self._sim_backend is not None:
+            if self._is_action_space_discrete:
+                self._sim_backend.set_cmd_vel(
+                    self._discrete_acitons[action]['linear'], self._discrete_acitons[action]['angular'])
+            else:
+                self._sim_backend.set_cmd_vel(action[0], action[1])
+            return
         action_msg = Twist()
         if self._is_action_space_discrete:
             action_msg.linear.x = self._discrete_acitons[action]['linear']
@@ -127,46 +165,113 @@ class FlatlandEnv(gym.Env):
                         1   -   collision with obstacle
                         2   -   goal reached
         """
+        profiler = self._profiler
+        if profiler is not None:
+            t = profiler.tic()
         self._pub_action(action)
         self._steps_curr_episode += 1
+        if profiler is not None:
+            t = profiler.toc("publish_action", t)
         # wait for new observations
-        s = time.time()
         merged_obs, obs_dict = self.observation_collector.get_observations()
-        # print("get observation: {}".format(time.time()-s))
+        if profiler is not None:
+            t = profiler.toc("get_observation", t)
 
         # calculate reward
         reward, reward_info = self.reward_calculator.get_reward(
             obs_dict['laser_scan'], obs_dict['goal_in_robot_frame'])
         done = reward_info['is_done']
+        if profiler is not None:
+            profiler.toc("reward", t)
+            profiler.step_done()
+
+        rospy.logdebug("reward:  %s", reward)
 
-        print("reward:  {}".format(reward))
-        
         # info
         info = {}
+        # sim steps needed in addition to the first one to get this observation
+        info['extra_sim_steps'] = self.observation_collector.num_extra_sim_steps
         if done:
             info['done_reason'] = reward_info['done_reason']
         else:
             if self._steps_curr_episode == self._max_steps_per_episode:
                 done = True
                 info['done_reason'] = 0
+        if done:
+            # read by the success rate logging of the (Async)EvalCallback
+            info['is_success'] = info['done_reason'] == 2
+            # the observation is a view of the collector's buffer, the VecEnvs keep it as terminal observation
+            # while the reset already writes the next one
+            merged_obs = merged_obs.copy()
 
         return merged_obs, reward, done, info
 
+    def step_async(self, action, reset_on_done: bool = False):
+        """start the step in a background thread and return immediately, the result is returned by step_wait.
+        Meanwhile the caller can e.g. compute the actions of other envs.
+
+        Args:
+            action: the action
+            reset_on_done (bool, optional): reset the env in the same background step if the episode is done. The
+                last observation is then stored in info['terminal_observation'] like the VecEnvs do.
+                Defaults to False.
+        """
+        assert self._pending_step is None, "step_wait must be called before the next step_async"
+        if self._step_executor is None:
+            self._step_executor = ThreadPoolExecutor(max_workers=1)
+        self._pending_step = self._step_executor.submit(
+            self._step_and_reset if reset_on_done else self.step, action)
+
+    def step_wait(self):
+        """wait for the step started by step_async and return its (obs, reward, done, info)
+        """
+        pending_step, self._pending_step = self._pending_step, None
+        return pending_step.result()
+
+    def _step_and_reset(self, action):
+        obs, reward, done, info = self.step(action)
+        if done:
+            info['terminal_observation'] = obs
+            obs = self.reset()
+        return obs, reward, done, info
+
     def reset(self):
 
         # set task
         # regenerate start position end goal position of the robot and change the obstacles accordingly
-        self.agent_action_pub.publish(Twist())
-        if self._is_train_mode:
-            self._sim_step_client()
-        self.task.reset()
+        if self._sim_backend is not None:
+            self._sim_backend.set_cmd_vel(0, 0)
+        else:
+            self.agent_action_pub.publish(Twist())
+            if self._is_train_mode:
+                self._sim_step_client()
+        if self._profiler is not None:
+            t = self._profiler.tic()
+            self.task.reset()
+            self._profiler.toc("task_reset", t)
+        else:
+            self.task.reset()
         self.reward_calculator.reset()
         self._steps_curr_episode = 0
         obs, _ = self.observation_collector.get_observations()
         return obs  # reward, done, info can't be included
 
+    def get_profile_summary(self) -> dict:
+        """the last aggregation of the step profiler (see StepProfiler.get_summary), empty if profiling is
+        disabled. Accessible through 'VecEnv.env_method'.
+        """
+        return self._profiler.get_summary() if self._profiler is not None else {}
+
+    def next_stage(self):
+        """advance the training curriculum of the task, only supported by staged tasks. This makes the stage
+        accessible through 'VecEnv.env_method' when the task lives in a subprocess.
+        """
+        self.task.next_stage()
+
     def close(self):
-        pass
+        if self._step_executor is not None:
+            self._step_executor.shutdown(wait=True)
+            self._step_executor = None
 
 
 if __name__ == '__main__':
@@ -0,0 +1,604 @@
+#! /usr/bin/env python
+"""A ROS-free 2D simulation backend for FlatlandEnv.
+
+The simulator loads the same inputs as flatland, i.e. the occupancy grid described by a map.yaml of
+simulator_setup/maps, the robot model yaml with its DiffDrive and Laser plugin and the obstacle model
+descriptions generated by the ObstaclesManager (circle/polygon footprints, RandomMove/Tween2 plugins),
+and simulates the diff-drive kinematics, the obstacles, collisions and the lidar in-process.
+
+Example:
+    sim = HeadlessSimulator.from_files(map_yaml_path, robot_yaml_path)
+    task = HeadlessRandomTask(sim, num_static_obstacles=10, num_dynamic_obstacles=10)
+    env = FlatlandEnv(task, robot_yaml_path, settings_yaml_path, "rule_01", False, sim_backend=sim)
+"""
+import json
+import math
+import os
+from pathlib import Path
+from typing import List, Tuple, Union
+
+import numpy as np
+import yaml
+from gym import spaces
+from PIL import Image
+from scipy import ndimage
+
+from rl_agent.utils.observation_reducer import ObservationReducer
+from rl_agent.utils.raycaster import LidarRaycaster
+
+
+# points on the unit circle used to check a circular footprint against the occupancy grid
+_UNIT_CIRCLE = np.stack([np.cos(np.linspace(0, 2 * np.pi, 16, endpoint=False)),
+                         np.sin(np.linspace(0, 2 * np.pi, 16, endpoint=False))], axis=1)
+
+
+class StopReset(Exception):
+    """Raised when The Task can not be reset anymore """
+
+
+class OccupancyMap:
+    """a static occupancy grid, row 0 of the grid is the row with the smallest y-coordinate.
+    """
+
+    def __init__(self, occupied: np.ndarray, free: np.ndarray, resolution: float, origin: Tuple[float, float]):
+        """
+        Args:
+            occupied (np.ndarray): 2D bool array, True for the cells blocking the robot and the laser
+            free (np.ndarray): 2D bool array, True for the cells on which objects can be placed
+            resolution (float): size of a cell in meters
+            origin (Tuple[float,float]): position of the lower left corner of the grid in meters
+        """
+        self.occupied = occupied
+        self.free = free
+        self.resolution = resolution
+        self.origin = np.array(origin[:2], dtype=np.float64)
+        self.height, self.width = occupied.shape
+        # distance of every cell to the closest non-free cell in meters, used for placing objects
+        self.clearance = ndimage.distance_transform_edt(
+            np.pad(free, 1, constant_values=False))[1:-1, 1:-1] * resolution
+        # safe_dist -> (rows, cols) of the cells with at least that clearance
+        self._free_cells = {}
+
+    @staticmethod
+    def from_yaml(map_yaml_path: str) -> 'OccupancyMap':
+        """load the map in the same way the ros map_server does.
+        """
+        with open(map_yaml_path, 'r') as fd:
+            map_data = yaml.safe_load(fd)
+        image_path = os.path.join(os.path.dirname(
+            os.path.abspath(map_yaml_path)), map_data['image'])
+        pixels = np.asarray(Image.open(image_path).convert('L'), dtype=np.float64)
+        if map_data.get('negate', 0):
+            occ_probability = pixels / 255.0
+        else:
+            occ_probability = (255.0 - pixels) / 255.0
+        # the first row of the image is the upper edge of the map
+        occ_probability = np.flipud(occ_probability)
+        occupied = occ_probability > map_data.get('occupied_thresh', 0.65)
+        free = occ_probability < map_data.get('free_thresh', 0.196)
+        return OccupancyMap(occupied, free, map_data['resolution'], map_data['origin'])
+
+    def world_to_cell(self, x, y):
+        col = np.floor((np.asarray(x) - self.origin[0]) / self.resolution).astype(np.int64)
+        row = np.floor((np.asarray(y) - self.origin[1]) / self.resolution).astype(np.int64)
+        return row, col
+
+    def is_occupied(self, x, y):
+        """vectorized occupancy lookup, everything outside of the grid is considered as occupied.
+        """
+        row, col = self.world_to_cell(x, y)
+        inside = (row >= 0) & (row < self.height) & (col >= 0) & (col < self.width)
+        result = np.ones(np.shape(row), dtype=bool)
+        result[inside] = self.occupied[row[inside], col[inside]]
+        return result
+
+    def sample_free_positions(self, n: int, safe_dist: float, rng: np.random.RandomState):
+        """draw n positions whose distance to the closest non-free cell is at least safe_dist. The free cells are
+        computed once per safe_dist.
+
+        Returns:
+            np.ndarray: array with the shape (n,2)
+        """
+        free_cells = self._free_cells.get(safe_dist)
+        if free_cells is None:
+            free_cells = self._free_cells[safe_dist] = np.nonzero(self.clearance >= safe_dist)
+        rows, cols = free_cells
+        if len(rows) == 0:
+            raise Exception(
+                "cann't find any no-occupied space please check the map information")
+        idx = rng.randint(0, len(rows), size=n)
+        x = (cols[idx] + 0.5) * self.resolution + self.origin[0]
+        y = (rows[idx] + 0.5) * self.resolution + self.origin[1]
+        return np.stack([x, y], axis=1)
+
+
+def load_model_yaml(model: Union[str, dict]) -> dict:
+    """the model can be given as the path of a flatland model yaml file or as the already parsed dict.
+    """
+    if isinstance(model, dict):
+        return model
+    with open(model, 'r') as fd:
+        return yaml.safe_load(fd)
+
+
+class HeadlessObstacle:
+    """an obstacle with a single circle or polygon footprint. Its movement is defined by the plugin of
+    the model, currently "RandomMove" and "Tween2" are supported, obstacles without plugin are static.
+    """
+
+    def __init__(self, name: str, model: dict, pose: List[float]):
+        self.name = name
+        body = model['bodies'][0]
+        footprint = body['footprints'][0]
+        self.shape = footprint['type']
+        if self.shape == 'circle':
+            self.radius = float(footprint['radius'])
+            self.center = np.array(footprint.get('center', [0.0, 0.0]), dtype=np.float64)
+            self.points = None
+        elif self.shape == 'polygon':
+            points = np.array(footprint['points'], dtype=np.float64)
+            # box2d uses the convex hull of the given points, for points around a center sorting by angle is enough
+            center = points.mean(axis=0)
+            order = np.argsort(np.arctan2(points[:, 1] - center[1], points[:, 0] - center[0]))
+            self.points = points[order]
+            self.radius = float(np.linalg.norm(self.points, axis=1).max())
+            self.center = np.zeros(2)
+        else:
+            raise ValueError(f"Shape {self.shape} is not supported, supported shape 'circle' OR 'polygon'")
+        self.is_dynamic = body.get('type', 'static') == 'dynamic'
+        self.plugin = None
+        for plugin in model.get('plugins', None) or []:
+            if plugin['type'] in ('RandomMove', 'Tween2'):
+                self.plugin = plugin
+        self.start_pose = np.array(pose, dtype=np.float64)
+        self.reset()
+
+    def reset(self):
+        """move the obstacle back to its start pose and reset the state of its plugin.
+        """
+        self.pose = self.start_pose.copy()
+        if self.plugin is not None and self.plugin['type'] == 'Tween2':
+            waypoints = np.array(self.plugin['waypoints'], dtype=np.float64).reshape(-1, 3)[:, :2]
+            if self.plugin.get('is_waypoint_relative', True):
+                waypoints = waypoints + self.start_pose[:2]
+            self._path = np.vstack([self.start_pose[:2], waypoints])
+            self._idx_target = 1
+            self._direction = 1
+            self._triggered = len(self.plugin.get('trigger_zones', None) or []) == 0
+
+    def set_pose(self, pose):
+        self.start_pose = np.array(pose, dtype=np.float64)
+        self.reset()
+
+    def global_center(self):
+        return self.pose[:2] + self.center
+
+    def global_polygon(self) -> np.ndarray:
+        c, s = math.cos(self.pose[2]), math.sin(self.pose[2])
+        rot = np.array([[c, -s], [s, c]])
+        return self.points @ rot.T + self.pose[:2]
+
+    def is_close_to(self, p: np.ndarray, dist: float) -> bool:
+        """cheap check with the bounding circle, whether the distance of p to the footprint can be less than dist.
+        """
+        center = self.global_center()
+        return math.hypot(p[0] - center[0], p[1] - center[1]) < self.radius + dist
+
+    def distance_to(self, p: np.ndarray) -> float:
+        """signed distance of the point p to the footprint (negative inside).
+        """
+        if self.shape == 'circle':
+            return float(np.linalg.norm(p - self.global_center()) - self.radius)
+        return _point_polygon_distance(p, self.global_polygon())
+
+    def update(self, dt: float, sim: 'HeadlessSimulator'):
+        if self.plugin is None:
+            return
+        if self.plugin['type'] == 'RandomMove':
+            self._update_random_move(dt, sim)
+        else:
+            self._update_tween2(dt, sim)
+
+    def _update_random_move(self, dt: float, sim: 'HeadlessSimulator'):
+        v = self.plugin.get('linear_velocity', 0.3)
+        # like the plugin the obstacle moves along its heading, when it gets stuck it turns to a random direction
+        for _ in range(5):
+            x = self.pose[0] + v * math.cos(self.pose[2]) * dt
+            y = self.pose[1] + v * math.sin(self.pose[2]) * dt
+            if not sim.is_colliding_static(np.array([x, y]), self.radius, ignore=self):
+                self.pose[0], self.pose[1] = x, y
+                return
+            w_max = self.plugin.get('angular_velocity_max', math.pi / 4)
+            turn = sim.rng.uniform(-w_max, w_max) + sim.rng.uniform(math.pi / 2, 3 * math.pi / 2)
+            self.pose[2] = (self.pose[2] + turn + math.pi) % (2 * math.pi) - math.pi
+
+    def _update_tween2(self, dt: float, sim: 'HeadlessSimulator'):
+        if not self._triggered:
+            for x, y, r in self.plugin.get('trigger_zones', None) or []:
+                if (sim.robot_pose[0] - x)**2 + (sim.robot_pose[1] - y)**2 < r**2:
+                    self._triggered = True
+            if not self._triggered:
+                return
+        mode = self.plugin.get('mode', 'yoyo')
+        dist_left = self.plugin.get('linear_velocity', 0.3) * dt
+        while dist_left > 0:
+            if self._idx_target < 0:
+                return
+            target = self._path[self._idx_target]
+            delta = target - self.pose[:2]
+            dist = float(np.linalg.norm(delta))
+            if dist > dist_left:
+                self.pose[:2] += delta / dist * dist_left
+                return
+            self.pose[:2] = target
+            dist_left -= dist
+            next_idx = self._idx_target + self._direction
+            if 0 <= next_idx < len(self._path):
+                self._idx_target = next_idx
+            elif mode == 'yoyo':
+                self._direction = -self._direction
+                self._idx_target += self._direction
+            elif mode == 'loop':
+                self._idx_target = 0
+            else:
+                # mode 'once'
+                self._idx_target = -1
+            if len(self._path) < 2:
+                return
+
+
+def _point_polygon_distance(p: np.ndarray, polygon: np.ndarray) -> float:
+    """signed distance between a point and a closed polygon (negative inside).
+    """
+    a = polygon
+    b = np.roll(polygon, -1, axis=0)
+    ab = b - a
+    t = np.clip(((p - a) * ab).sum(axis=1) / np.maximum((ab * ab).sum(axis=1), 1e-12), 0, 1)
+    closest = a + t[:, None] * ab
+    dist = float(np.sqrt(((closest - p)**2).sum(axis=1)).min())
+    # even-odd rule
+    cond = (a[:, 1] > p[1]) != (b[:, 1] > p[1])
+    x_cross = a[cond, 0] + (p[1] - a[cond, 1]) * ab[cond, 0] / ab[cond, 1]
+    inside = np.count_nonzero(x_cross > p[0]) % 2 == 1
+    return -dist if inside else dist
+
+
+class HeadlessSimulator:
+    """simulates a diff-drive robot with a 2D lidar among static and dynamic obstacles on an occupancy grid.
+    It provides the same observation interface as the ObservationCollector, so that it can be passed to the
+    FlatlandEnv as sim_backend.
+    """
+
+    def __init__(self, occupancy_map: OccupancyMap, robot_yaml_path: str, step_size: float = 0.05, seed: int = None):
+        """
+        Args:
+            occupancy_map (OccupancyMap): the static map
+            robot_yaml_path (str): the flatland model yaml file of the robot
+            step_size (float, optional): the physics step size in seconds, like the step_size of the flatland
+                server. Defaults to 0.05.
+            seed (int, optional): seed of the random generator. Defaults to None.
+        """
+        self.map = occupancy_map
+        self.step_size = step_size
+        self.rng = np.random.RandomState(seed)
+        self._load_robot_model(robot_yaml_path)
+        self._raycaster = LidarRaycaster(self.map.occupied, self.map.resolution, self.map.origin, self.laser_angle_min,
+                                         self.laser_angle_increment, self.num_beams, self.laser_range)
+
+        self.set_observation_reducer(ObservationReducer(self.num_beams, self.laser_range))
+        # interface of the ObservationCollector
+        self.num_extra_sim_steps = 0
+
+        # offsets of the cells covered by the footprint of the robot, used for the collision check with the map
+        r_cells = int(math.ceil(self.robot_radius / self.map.resolution))
+        d_row, d_col = np.mgrid[-r_cells:r_cells + 1, -r_cells:r_cells + 1]
+        inside = (d_row**2 + d_col**2) * self.map.resolution**2 <= self.robot_radius**2
+        self._footprint_cells = (d_row[inside], d_col[inside])
+
+        self.obstacles = {}
+        self.time = 0.0
+        self.robot_pose = np.zeros(3)
+        self.goal = np.zeros(3)
+        self._cmd_vel = (0.0, 0.0)
+
+    @staticmethod
+    def from_files(map_yaml_path: str, robot_yaml_path: str, **kwargs) -> 'HeadlessSimulator':
+        return HeadlessSimulator(OccupancyMap.from_yaml(map_yaml_path), robot_yaml_path, **kwargs)
+
+    def _load_robot_model(self, robot_yaml_path: str):
+        self.robot_name = os.path.basename(robot_yaml_path).split('.')[0]
+        with open(robot_yaml_path, 'r') as fd:
+            robot_data = yaml.safe_load(fd)
+        for body in robot_data['bodies']:
+            if body['name'] == "base_footprint":
+                for footprint in body['footprints']:
+                    if footprint['type'] == 'circle':
+                        self.robot_radius = footprint.setdefault('radius', 0.3)
+        for plugin in robot_data['plugins']:
+            if plugin['type'] == 'Laser':
+                self.laser_angle_min = plugin['angle']['min']
+                self.laser_angle_max = plugin['angle']['max']
+                self.laser_angle_increment = plugin['angle']['increment']
+                self.num_beams = int(
+                    round((self.laser_angle_max - self.laser_angle_min) / self.laser_angle_increment) + 1)
+                self.laser_range = plugin['range']
+                self.laser_update_rate = plugin.setdefault('update_rate', 10)
+                self.laser_origin = np.array(plugin.get('origin', [0, 0, 0]), dtype=np.float64)
+
+    def seed(self, seed: int = None):
+        self.rng = np.random.RandomState(seed)
+
+    # ---------------------------------------------------------------- model management (like flatland's services)
+    def spawn_model(self, name: str, model: Union[str, dict], pose: List[float]):
+        """spawn a model, given as a flatland model yaml file or as its parsed content.
+        """
+        self.obstacles[name] = HeadlessObstacle(name, load_model_yaml(model), pose)
+
+    def move_model(self, name: str, pose: List[float]):
+        if name == self.robot_name:
+            self.move_robot(pose)
+        else:
+            self.obstacles[name].set_pose(pose)
+
+    def delete_model(self, name: str):
+        del self.obstacles[name]
+
+    def delete_all_models(self):
+        self.obstacles = {}
+
+    def move_robot(self, pose: List[float]):
+        self.robot_pose = np.array(pose[:3], dtype=np.float64)
+
+    def set_goal(self, goal: List[float]):
+        self.goal = np.array(list(goal) + [0.0] * (3 - len(goal)), dtype=np.float64)
+
+    def set_cmd_vel(self, linear: float, angular: float):
+        self._cmd_vel = (float(linear), float(angular))
+
+    # ---------------------------------------------------------------- physics
+    def is_robot_colliding(self, pose: np.ndarray) -> bool:
+        row, col = self.map.world_to_cell(pose[0], pose[1])
+        rows = row + self._footprint_cells[0]
+        cols = col + self._footprint_cells[1]
+        inside = (rows >= 0) & (rows < self.map.height) & (cols >= 0) & (cols < self.map.width)
+        if not inside.all() or self.map.occupied[rows, cols].any():
+            return True
+        for obstacle in self.obstacles.values():
+            if obstacle.is_close_to(pose, self.robot_radius) and obstacle.distance_to(pose[:2]) < self.robot_radius:
+                return True
+        return False
+
+    def is_colliding_static(self, p: np.ndarray, radius: float, ignore: HeadlessObstacle = None) -> bool:
+        """check whether a circle collides with the map or any obstacle except the ignored one.
+        """
+        if self.map.is_occupied(p[0] + radius * _UNIT_CIRCLE[:, 0], p[1] + radius * _UNIT_CIRCLE[:, 1]).any():
+            return True
+        for obstacle in self.obstacles.values():
+            if obstacle is not ignore and obstacle.is_close_to(p, radius) and obstacle.distance_to(p) < radius:
+                return True
+        return False
+
+    def step(self, dt: float = None):
+        """advance the simulation by dt (default: step_size) seconds.
+        """
+        if dt is None:
+            dt = self.step_size
+        for obstacle in self.obstacles.values():
+            obstacle.update(dt, self)
+        v, w = self._cmd_vel
+        x, y, theta = self.robot_pose
+        theta_mid = theta + 0.5 * w * dt
+        new_pose = np.array([x + v * math.cos(theta_mid) * dt,
+                             y + v * math.sin(theta_mid) * dt,
+                             (theta + w * dt + math.pi) % (2 * math.pi) - math.pi])
+        if self.is_robot_colliding(new_pose):
+            # the robot is stopped at the contact point, found by bisection
+            lo, hi = 0.0, 1.0
+            for _ in range(8):
+                mid = 0.5 * (lo + hi)
+                if self.is_robot_colliding(self.robot_pose + mid * (new_pose - self.robot_pose)):
+                    hi = mid
+                else:
+                    lo = mid
+            new_pose = self.robot_pose + lo * (new_pose - self.robot_pose)
+            new_pose[2] = self.robot_pose[2]
+        self.robot_pose = new_pose
+        self.time += dt
+
+    # ---------------------------------------------------------------- sensors
+    def scan(self) -> np.ndarray:
+        """simulate the laser scan at the current robot pose.
+        """
+        c, s = math.cos(self.robot_pose[2]), math.sin(self.robot_pose[2])
+        laser_pose = np.array([self.robot_pose[0] + c * self.laser_origin[0] - s * self.laser_origin[1],
+                               self.robot_pose[1] + s * self.laser_origin[0] + c * self.laser_origin[1],
+                               self.robot_pose[2] + self.laser_origin[2]])
+        circles = [[*obstacle.global_center(), obstacle.radius]
+                   for obstacle in self.obstacles.values() if obstacle.shape == 'circle']
+        polygons = [obstacle.global_polygon()
+                    for obstacle in self.obstacles.values() if obstacle.shape == 'polygon']
+        return self._raycaster.scan(laser_pose, circles=circles or None, polygons=polygons)
+
+    def set_observation_reducer(self, reducer: ObservationReducer):
+        """reduces the scan in the observation (see ObservationCollector), the observation space changes accordingly.
+        """
+        self._reducer = reducer
+        scan_space = reducer.get_space()
+        self.observation_space = spaces.Box(
+            low=np.hstack([scan_space.low, [0, -np.pi]]), high=np.hstack([scan_space.high, [10, np.pi]]))
+
+    def get_observation_space(self):
+        return self.observation_space
+
+    def get_observations(self):
+        """advance the simulation by one laser update and return the observation, same format as
+        ObservationCollector.get_observations.
+        """
+        n_steps = max(1, int(round(1.0 / (self.laser_update_rate * self.step_size))))
+        for _ in range(n_steps):
+            self.step()
+        scan = self.scan()
+        x_relative, y_relative = self.goal[:2] - self.robot_pose[:2]
+        rho = (x_relative**2 + y_relative**2)**0.5
+        theta = (np.arctan2(y_relative, x_relative) - self.robot_pose[2] + 4 * np.pi) % (2 * np.pi) - np.pi
+        merged_obs = np.hstack([self._reducer.reduce(scan), np.array([rho, theta])])
+        obs_dict = {}
+        obs_dict["laser_scan"] = scan
+        obs_dict['goal_in_robot_frame'] = [rho, theta]
+        return merged_obs, obs_dict
+
+
+def _random_dynamic_obstacle_model(rng: np.random.RandomState, linear_velocity=0.3, angular_velocity_max=math.pi/6,
+                                   min_obstacle_radius=0.5, max_obstacle_radius=0.5) -> dict:
+    """same model as generated by ObstaclesManager.register_random_dynamic_obstacles
+    """
+    body = {"name": "random", "pose": [0, 0, 0], "type": "dynamic", "color": [1, 0.2, 0.1, 1.0],
+            "footprints": [{"density": 1, "restitution": 1, "layers": ["all"], "collision": 'true', "sensor": "false",
+                            "type": "circle", "radius": rng.uniform(min_obstacle_radius, max_obstacle_radius)}]}
+    random_move = {'type': 'RandomMove', 'name': 'RandomMove Plugin', 'linear_velocity': linear_velocity,
+                   'angular_velocity_max': angular_velocity_max, 'body': 'random'}
+    return {'bodies': [body], "plugins": [random_move]}
+
+
+def _random_static_obstacle_model(rng: np.random.RandomState, num_vertices_min=3, num_vertices_max=6,
+                                  min_obstacle_radius=0.5, max_obstacle_radius=2) -> dict:
+    """same model as generated by ObstaclesManager.register_random_static_obstacles
+    """
+    num_vertices = rng.randint(num_vertices_min, num_vertices_max + 1)
+    radius = rng.uniform(min_obstacle_radius, max_obstacle_radius)
+    angles = 2 * math.pi * rng.uniform(0, 1, size=num_vertices)
+    points = np.stack([np.cos(angles) * radius, np.sin(angles) * radius], axis=1).tolist()
+    body = {"name": "random", "pose": [0, 0, 0], "type": "static", "color": [1, 0.2, 0.1, 1.0],
+            "footprints": [{"density": 1, "restitution": 1, "layers": ["all"], "collision": 'true', "sensor": "false",
+                            "type": "polygon", "points": points}]}
+    return {'bodies': [body], "plugins": []}
+
+
+class HeadlessRandomTask:
+    """counterpart of the RandomTask, every reset the start position and goal of the robot and the positions
+    of the obstacles are sampled randomly.
+    """
+
+    def __init__(self, sim: HeadlessSimulator, num_static_obstacles: int = 0, num_dynamic_obstacles: int = 0,
+                 obstacle_linear_velocity: float = 0.3, min_dist: float = 1):
+        """
+        Args:
+            sim (HeadlessSimulator): the simulator
+            num_static_obstacles (int, optional): number of random polygon obstacles. Defaults to 0.
+            num_dynamic_obstacles (int, optional): number of random circle obstacles moved by "RandomMove".
+                Defaults to 0.
+            obstacle_linear_velocity (float, optional): linear velocity of the dynamic obstacles. Defaults to 0.3.
+            min_dist (float): minimum distance between start_pos and goal_pos
+        """
+        self.sim = sim
+        self.min_dist = min_dist
+        self.obstacle_linear_velocity = obstacle_linear_velocity
+        self.set_num_obstacles(num_static_obstacles, num_dynamic_obstacles)
+
+    def set_num_obstacles(self, num_static_obstacles: int, num_dynamic_obstacles: int):
+        self.sim.delete_all_models()
+        for i in range(num_static_obstacles):
+            self.sim.spawn_model(f'obstacle_random_static_{i:02d}',
+                                 _random_static_obstacle_model(self.sim.rng), [0, 0, 0])
+        for i in range(num_dynamic_obstacles):
+            self.sim.spawn_model(f'obstacle_random_dynamic_{i:02d}', _random_dynamic_obstacle_model(
+                self.sim.rng, linear_velocity=self.obstacle_linear_velocity), [0, 0, 0])
+
+    def reset(self):
+        sim = self.sim
+        robot_radius = sim.robot_radius
+        for _ in range(20):
+            start_pos = sim.map.sample_free_positions(1, robot_radius * 2, sim.rng)[0]
+            goal_pos = sim.map.sample_free_positions(1, robot_radius * 4, sim.rng)[0]
+            if np.linalg.norm(start_pos - goal_pos) >= self.min_dist:
+                break
+        else:
+            raise Exception(
+                "can not generate a path with the given start position and the goal position of the robot")
+        sim.move_robot([start_pos[0], start_pos[1], sim.rng.uniform(-math.pi, math.pi)])
+        sim.set_goal([goal_pos[0], goal_pos[1], 0.0])
+        forbidden_zones = np.array([[start_pos[0], start_pos[1], robot_radius],
+                                    [goal_pos[0], goal_pos[1], robot_radius]])
+        for obstacle in sim.obstacles.values():
+            for _ in range(100):
+                pos = sim.map.sample_free_positions(1, min(obstacle.radius, 0.2), sim.rng)[0]
+                dist = np.hypot(forbidden_zones[:, 0] - pos[0], forbidden_zones[:, 1] - pos[1])
+                if (dist >= forbidden_zones[:, 2] + obstacle.radius).all():
+                    break
+            obstacle.set_pose([pos[0], pos[1], sim.rng.uniform(-math.pi, math.pi)])
+
+
+class HeadlessScenerioTask:
+    """counterpart of the ScenerioTask, loads the scenerios from the same json file.
+    """
+
+    def __init__(self, sim: HeadlessSimulator, scenerios_json_path: str):
+        json_path = Path(scenerios_json_path)
+        assert json_path.is_file() and json_path.suffix == ".json"
+        self.sim = sim
+        self._scenerios_data = json.load(json_path.open())["scenerios"]
+        self._idx_curr_scene = -1
+        self._num_repeats_curr_scene = -1
+        self._max_repeats_curr_scene = 0
+
+    def reset(self):
+        info = {}
+        if self._idx_curr_scene == -1 or self._num_repeats_curr_scene == self._max_repeats_curr_scene:
+            self._set_new_scenerio()
+            info["new_scenerio_loaded"] = True
+        else:
+            info["new_scenerio_loaded"] = False
+            for obstacle in self.sim.obstacles.values():
+                obstacle.reset()
+        robot_data = self._scenerios_data[self._idx_curr_scene]['robot']
+        self.sim.move_robot(robot_data["start_pos"])
+        self.sim.set_goal(robot_data["goal_pos"])
+        info["robot_goal_pos"] = robot_data["goal_pos"]
+        self._num_repeats_curr_scene += 1
+        info['num_repeats_curr_scene'] = self._num_repeats_curr_scene
+        info['max_repeats_curr_scene'] = self._max_repeats_curr_scene
+        return info
+
+    def _set_new_scenerio(self):
+        try:
+            while True:
+                self._idx_curr_scene += 1
+                scenerio_data = self._scenerios_data[self._idx_curr_scene]
+                if scenerio_data["repeats"] > 0:
+                    break
+        except IndexError as e:
+            raise StopReset("All scenerios have been evaluated!") from e
+        sim = self.sim
+        sim.delete_all_models()
+        watchers_dict = scenerio_data.setdefault('watchers', {})
+        for obstacle_name, obstacle_data in scenerio_data["static_obstacles"].items():
+            footprint = {"type": obstacle_data['shape']}
+            if obstacle_data['shape'] == 'circle':
+                footprint['radius'] = obstacle_data['radius']
+                pose = [obstacle_data['x'], obstacle_data['y'], 0]
+            elif obstacle_data['shape'] == 'polygon':
+                vertices = np.array(obstacle_data["vertices"], dtype=np.float64)
+                center = vertices.mean(axis=0)
+                footprint['points'] = (vertices - center).tolist()
+                pose = [center[0], center[1], 0]
+            else:
+                raise ValueError(
+                    f"Shape {obstacle_data['shape']} is not supported, supported shape 'circle' OR 'polygon'")
+            sim.spawn_model(obstacle_name, {'bodies': [
+                            {"name": "static_object", "type": "static", "footprints": [footprint]}]}, pose)
+        for obstacle_name, obstacle_data in scenerio_data["dynamic_obstacles"].items():
+            trigger_zones = []
+            for trigger in obstacle_data.get('triggers', []):
+                if trigger not in watchers_dict:
+                    raise ValueError(
+                        f"For dynamic obstacle [{obstacle_name}] the trigger: {trigger} not found in the corresponding 'watchers' dict for scene {scenerio_data['scene_name']} ")
+                trigger_zones.append(watchers_dict[trigger]['pos'] + [watchers_dict[trigger]['range']])
+            model = {'bodies': [{"name": "object_with_traj", "type": "dynamic",
+                                 "footprints": [{"type": "circle", "radius": obstacle_data["obstacle_radius"]}]}],
+                     'plugins': [{'type': 'Tween2', 'linear_velocity': obstacle_data['linear_velocity'],
+                                  'waypoints': obstacle_data["waypoints"],
+                                  'is_waypoint_relative': obstacle_data["is_waypoint_relative"],
+                                  'mode': obstacle_data["mode"], 'trigger_zones': trigger_zones}]}
+            sim.spawn_model(obstacle_name, model, obstacle_data["start_pos"])
+        self._num_repeats_curr_scene = 0
+        self._max_repeats_curr_scene = scenerio_data["repeats"]
@@ -0,0 +1,224 @@
+#! /usr/bin/env python
+import multiprocessing as mp
+from multiprocessing import shared_memory
+from typing import Any, Callable, List, Optional, Type, Union
+
+import gym
+import numpy as np
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper, VecEnv, VecEnvIndices
+
+
+class _SharedBuffers():
+    """numpy views of the ring buffer in a shared memory block. Every slot holds the observations, rewards and
+    dones of all envs, env i only writes row i.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, n_slots: int, n_envs: int, obs_dim: int):
+        obs_size = n_slots * n_envs * obs_dim * 4
+        rew_size = n_slots * n_envs * 4
+        self.obs = np.ndarray((n_slots, n_envs, obs_dim), dtype=np.float32, buffer=shm.buf, offset=0)
+        self.rewards = np.ndarray((n_slots, n_envs), dtype=np.float32, buffer=shm.buf, offset=obs_size)
+        self.dones = np.ndarray((n_slots, n_envs), dtype=np.bool_, buffer=shm.buf, offset=obs_size+rew_size)
+
+    @staticmethod
+    def nbytes(n_slots: int, n_envs: int, obs_dim: int) -> int:
+        return n_slots * n_envs * (obs_dim * 4 + 4 + 1)
+
+
+def _worker(remote, parent_remote, env_fn_wrapper: CloudpickleWrapper, idx: int) -> None:
+    # Import here to avoid a circular import
+    from stable_baselines3.common.env_util import is_wrapped
+
+    parent_remote.close()
+    env = env_fn_wrapper.var()
+    shm = None
+    buffers = None
+    while True:
+        try:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                action, slot = data
+                observation, reward, done, info = env.step(action)
+                if done:
+                    # save final observation where user can get it, then reset
+                    info["terminal_observation"] = observation.copy()
+                    observation = env.reset()
+                buffers.obs[slot, idx] = observation
+                buffers.rewards[slot, idx] = reward
+                buffers.dones[slot, idx] = done
+                remote.send(info)
+            elif cmd == "reset":
+                buffers.obs[data, idx] = env.reset()
+                remote.send(None)
+            elif cmd == "attach":
+                shm = shared_memory.SharedMemory(name=data[0])
+                buffers = _SharedBuffers(shm, *data[1:])
+                remote.send(None)
+            elif cmd == "seed":
+                remote.send(env.seed(data))
+            elif cmd == "render":
+                remote.send(env.render(data))
+            elif cmd == "close":
+                env.close()
+                buffers = None
+                if shm is not None:
+                    shm.close()
+                remote.close()
+                break
+            elif cmd == "get_spaces":
+                remote.send((env.observation_space, env.action_space))
+            elif cmd == "env_method":
+                method = getattr(env, data[0])
+                remote.send(method(*data[1], **data[2]))
+            elif cmd == "get_attr":
+                remote.send(getattr(env, data))
+            elif cmd == "set_attr":
+                remote.send(setattr(env, data[0], data[1]))
+            elif cmd == "is_wrapped":
+                remote.send(is_wrapped(env, data))
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+        except EOFError:
+            break
+
+
+class SharedMemVecEnv(VecEnv):
+    """
+    Like SubprocVecEnv every env runs in its own process, but the observations, rewards and dones are written by
+    the workers into a ring buffer in shared memory instead of being pickled through the pipes. Only the actions,
+    the infos (including the terminal observation at the end of an episode) and the commands pass the pipes.
+
+    The observation space must be a 1D Box, it is stored as float32 with a fixed stride.
+
+    .. warning::
+
+        The observations returned by step and reset are views of the ring buffer without a copy. They stay valid
+        for n_slots-1 further calls of step, afterwards they are overwritten. The learner (rollout buffer,
+        VecNormalize) copies them before, keep a copy if you need them for longer.
+
+    :param env_fns: Environments to run in subprocesses
+    :param start_method: method used to start the subprocesses (see SubprocVecEnv)
+    :param n_slots: number of slots of the ring buffer, at least 2
+    """
+
+    def __init__(self, env_fns: List[Callable[[], gym.Env]], start_method: Optional[str] = None, n_slots: int = 2):
+        assert n_slots >= 2, "at least 2 slots are needed, the last observations are kept while the next are written"
+        self.waiting = False
+        self.closed = False
+        n_envs = len(env_fns)
+
+        if start_method is None:
+            forkserver_available = "forkserver" in mp.get_all_start_methods()
+            start_method = "forkserver" if forkserver_available else "spawn"
+        ctx = mp.get_context(start_method)
+
+        self._shm = None
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(n_envs)])
+        self.processes = []
+        for idx, (work_remote, remote, env_fn) in enumerate(zip(self.work_remotes, self.remotes, env_fns)):
+            args = (work_remote, remote, CloudpickleWrapper(env_fn), idx)
+            # daemon=True: if the main process crashes, we should not cause things to hang
+            process = ctx.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        self.remotes[0].send(("get_spaces", None))
+        observation_space, action_space = self.remotes[0].recv()
+        VecEnv.__init__(self, len(env_fns), observation_space, action_space)
+        assert isinstance(observation_space, gym.spaces.Box) and len(observation_space.shape) == 1, \
+            "SharedMemVecEnv only supports 1D Box observation spaces"
+
+        self.n_slots = n_slots
+        obs_dim = observation_space.shape[0]
+        # the size of the block depends on the observation space, the workers attach to it afterwards
+        self._shm = shared_memory.SharedMemory(create=True, size=_SharedBuffers.nbytes(n_slots, n_envs, obs_dim))
+        self._buffers = _SharedBuffers(self._shm, n_slots, n_envs, obs_dim)
+        for remote in self.remotes:
+            remote.send(("attach", (self._shm.name, n_slots, n_envs, obs_dim)))
+        for remote in self.remotes:
+            remote.recv()
+        self._slot = 0
+
+    def _next_slot(self) -> int:
+        self._slot = (self._slot + 1) % self.n_slots
+        return self._slot
+
+    def step_async(self, actions: np.ndarray) -> None:
+        slot = self._next_slot()
+        for remote, action in zip(self.remotes, actions):
+            remote.send(("step", (action, slot)))
+        self.waiting = True
+
+    def step_wait(self):
+        infos = [remote.recv() for remote in self.remotes]
+        self.waiting = False
+        slot = self._slot
+        return self._buffers.obs[slot], self._buffers.rewards[slot].copy(), self._buffers.dones[slot].copy(), infos
+
+    def seed(self, seed: Optional[int] = None) -> List[Union[None, int]]:
+        for idx, remote in enumerate(self.remotes):
+            remote.send(("seed", seed + idx if seed is not None else None))
+        return [remote.recv() for remote in self.remotes]
+
+    def reset(self):
+        slot = self._next_slot()
+        for remote in self.remotes:
+            remote.send(("reset", slot))
+        for remote in self.remotes:
+            remote.recv()
+        return self._buffers.obs[slot]
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self._buffers = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+        self.closed = True
+
+    def get_images(self):
+        for pipe in self.remotes:
+            pipe.send(("render", "rgb_array"))
+        return [pipe.recv() for pipe in self.remotes]
+
+    def get_attr(self, attr_name: str, indices: VecEnvIndices = None) -> List[Any]:
+        """Return attribute from vectorized environment (see base class)."""
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("get_attr", attr_name))
+        return [remote.recv() for remote in target_remotes]
+
+    def set_attr(self, attr_name: str, value: Any, indices: VecEnvIndices = None) -> None:
+        """Set attribute inside vectorized environments (see base class)."""
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("set_attr", (attr_name, value)))
+        for remote in target_remotes:
+            remote.recv()
+
+    def env_method(self, method_name: str, *method_args, indices: VecEnvIndices = None, **method_kwargs) -> List[Any]:
+        """Call instance methods of vectorized environments."""
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("env_method", (method_name, method_args, method_kwargs)))
+        return [remote.recv() for remote in target_remotes]
+
+    def env_is_wrapped(self, wrapper_class: Type[gym.Wrapper], indices: VecEnvIndices = None) -> List[bool]:
+        """Check if worker environments are wrapped with a given wrapper"""
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("is_wrapped", wrapper_class))
+        return [remote.recv() for remote in target_remotes]
+
+    def _get_target_remotes(self, indices: VecEnvIndices) -> List[Any]:
+        indices = self._get_indices(indices)
+        return [self.remotes[i] for i in indices]
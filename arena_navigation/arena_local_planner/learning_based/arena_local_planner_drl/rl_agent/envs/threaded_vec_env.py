@@ -0,0 +1,43 @@
+#! /usr/bin/env python
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from typing import Callable, List
+
+import gym
+import numpy as np
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+
+class ThreadedVecEnv(DummyVecEnv):
+    """
+    Runs several FlatlandEnvs, each bound to its own simulation instance, in the current process. Unlike the
+    DummyVecEnv the envs are stepped concurrently: step_async starts the steps (incl. the reset at the end of an
+    episode) of all envs in their background threads (see FlatlandEnv.step_async) and step_wait collects the
+    results. Most of the step time is spent waiting for the simulation (service calls and sensor msgs), which
+    doesn't hold the GIL, so the waits of the envs overlap with each other and with the work of the caller
+    between step_async and step_wait.
+
+    :param env_fns: functions that return FlatlandEnvs, all in the same ros node but with different namespaces
+    """
+
+    def __init__(self, env_fns: List[Callable[[], gym.Env]]):
+        super(ThreadedVecEnv, self).__init__(env_fns)
+        for env in self.envs:
+            assert hasattr(env, "step_async") and hasattr(env, "step_wait"), \
+                "ThreadedVecEnv needs envs with step_async and step_wait (FlatlandEnv, not wrapped)"
+
+    def step_async(self, actions: np.ndarray) -> None:
+        for env, action in zip(self.envs, actions):
+            env.step_async(action, reset_on_done=True)
+
+    def step_wait(self):
+        for env_idx, env in enumerate(self.envs):
+            obs, self.buf_rews[env_idx], self.buf_dones[env_idx], self.buf_infos[env_idx] = env.step_wait()
+            self._save_obs(env_idx, obs)
+        return (self._obs_from_buf(), np.copy(self.buf_rews), np.copy(self.buf_dones), deepcopy(self.buf_infos))
+
+    def reset(self):
+        with ThreadPoolExecutor(max_workers=self.num_envs) as executor:
+            for env_idx, obs in enumerate(executor.map(lambda env: env.reset(), self.envs)):
+                self._save_obs(env_idx, obs)
+        return self._obs_from_buf()
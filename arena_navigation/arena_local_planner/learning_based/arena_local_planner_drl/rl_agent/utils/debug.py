@@ -1,5 +1,22 @@
+import csv
+import os
 import time
 from functools import wraps
+
+import numpy as np
+
+
+def _append_summary_csv(csv_path: str, summary: dict):
+    # one row per value
+    write_header = not os.path.isfile(csv_path)
+    t_now = time.time()
+    with open(csv_path, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(["time", "name", "value"])
+        writer.writerows([t_now, name, value] for name, value in summary.items())
+
+
 def timeit(f):
     @wraps(f)
     def timed(*args, **kw):
@@ -12,4 +29,185 @@ def timeit(f):
           (f.__name__, args, kw, te-ts))
         return result
 
-    return timed
\ No newline at end of file
+    return timed
+
+
+class StepProfiler():
+    def __init__(self, window: int = 1000, csv_path: str = None, max_samples_per_step: int = 4):
+        """ collects the wall time of the phases of a step and counters (e.g. sync iterations). The samples are
+        stored in preallocated arrays and aggregated every 'window' steps, the aggregation can be read with
+        get_summary and is optionally appended to a csv file.
+
+        Usage:
+            t = profiler.tic()
+            ...
+            t = profiler.toc("get_observation", t)
+            ...
+            profiler.toc("reward", t)
+            profiler.count("sync_iterations", i)
+            profiler.step_done()
+
+        Args:
+            window (int, optional): number of steps per aggregation. Defaults to 1000.
+            csv_path (str, optional): csv file the aggregations are appended to. Defaults to None.
+            max_samples_per_step (int, optional): a phase recorded more often within the window than
+                max_samples_per_step*window is only counted. Defaults to 4.
+        """
+        self.window = window
+        self.csv_path = csv_path
+        self._capacity = window * max_samples_per_step
+        # name -> [preallocated samples, number of samples, sum of all samples incl. the ones not stored]
+        self._samples = {}
+        self._steps = 0
+        self._t_window_start = time.perf_counter()
+        self._summary = {}
+
+    @staticmethod
+    def tic() -> float:
+        return time.perf_counter()
+
+    def toc(self, name: str, t_start: float) -> float:
+        """record the time since t_start (returned by tic) in ms for the phase 'name'. Returns the current time,
+        so that it can be used as start of the next phase.
+        """
+        t_now = time.perf_counter()
+        self._add(name, (t_now - t_start) * 1000)
+        return t_now
+
+    def count(self, name: str, value: float = 1):
+        self._add(name, value)
+
+    def _add(self, name: str, value: float):
+        entry = self._samples.get(name)
+        if entry is None:
+            entry = self._samples[name] = [np.empty(self._capacity), 0, 0.0]
+        if entry[1] < self._capacity:
+            entry[0][entry[1]] = value
+        entry[1] += 1
+        entry[2] += value
+
+    def step_done(self):
+        self._steps += 1
+        if self._steps >= self.window:
+            self._aggregate()
+
+    def _aggregate(self):
+        t_now = time.perf_counter()
+        summary = {"steps_per_sec": self._steps / (t_now - self._t_window_start)}
+        for name, (samples, n, total) in self._samples.items():
+            summary[f"{name}/per_step"] = total / self._steps
+            if n == 0:
+                continue
+            values = samples[:min(n, self._capacity)]
+            p50, p95 = np.percentile(values, [50, 95])
+            summary[f"{name}/mean"] = total / n
+            summary[f"{name}/p50"] = float(p50)
+            summary[f"{name}/p95"] = float(p95)
+            summary[f"{name}/max"] = float(values.max())
+            self._samples[name][1] = 0
+            self._samples[name][2] = 0.0
+        self._summary = summary
+        self._steps = 0
+        self._t_window_start = t_now
+        if self.csv_path is not None:
+            self._write_csv(summary)
+
+    def _write_csv(self, summary: dict):
+        # phases may show up only in later windows (e.g. task_reset)
+        _append_summary_csv(self.csv_path, summary)
+
+    def get_summary(self) -> dict:
+        """ the last aggregation, times are given in ms. Keys are '{phase}/mean', '{phase}/p50', '{phase}/p95',
+        '{phase}/max', '{phase}/per_step' (sum per env step) and 'steps_per_sec'.
+        """
+        return self._summary
+
+
+class LatencyHistogram():
+    def __init__(self, bin_width: float = 0.1, max_latency: float = 200.0, window: int = 1000, csv_path: str = None):
+        """ histograms of latencies in ms with fixed bins, recording a sample is O(1) and doesn't allocate. Every
+        'window' samples of the first recorded name the percentiles of the window are aggregated (see
+        get_summary), optionally appended to a csv file. The histograms over the whole run can be saved with save.
+
+        Usage:
+            histogram.add("compute", (time.perf_counter() - t_start) * 1000)
+
+        Args:
+            bin_width (float, optional): width of the bins in ms. Defaults to 0.1.
+            max_latency (float, optional): samples above are counted in the last bin, their maximum is still
+                exact. Defaults to 200.0.
+            window (int, optional): number of samples per aggregation. Defaults to 1000.
+            csv_path (str, optional): csv file the aggregations are appended to. Defaults to None.
+        """
+        self.bin_width = bin_width
+        self.window = window
+        self.csv_path = csv_path
+        self._num_bins = int(np.ceil(max_latency / bin_width)) + 1
+        # name -> [counts of the window, counts of the run, number of samples of the window, sum of the window,
+        #          max of the window, max of the run]
+        self._histograms = {}
+        self._window_name = None
+        self._summary = {}
+
+    def add(self, name: str, latency: float):
+        entry = self._histograms.get(name)
+        if entry is None:
+            entry = self._histograms[name] = [np.zeros(self._num_bins, dtype=np.int64),
+                                              np.zeros(self._num_bins, dtype=np.int64), 0, 0.0, 0.0, 0.0]
+            if self._window_name is None:
+                self._window_name = name
+        # negative latencies (e.g. clock offsets between the machines) are counted in the first bin
+        i = min(max(int(latency / self.bin_width), 0), self._num_bins - 1)
+        entry[0][i] += 1
+        entry[1][i] += 1
+        entry[2] += 1
+        entry[3] += latency
+        if latency > entry[4]:
+            entry[4] = latency
+            if latency > entry[5]:
+                entry[5] = latency
+        if name == self._window_name and entry[2] >= self.window:
+            self._aggregate()
+
+    def _percentiles(self, counts: np.ndarray, qs: list) -> list:
+        # upper edge of the bin containing the q-th percentile
+        cumulative = np.cumsum(counts)
+        indices = np.searchsorted(cumulative, np.asarray(qs) / 100 * cumulative[-1])
+        return [round(float((i + 1) * self.bin_width), 6) for i in indices]
+
+    def _aggregate(self):
+        summary = {}
+        for name, entry in self._histograms.items():
+            counts, n = entry[0], entry[2]
+            if n == 0:
+                continue
+            p50, p95, p99 = self._percentiles(counts, [50, 95, 99])
+            summary[f"{name}/count"] = n
+            summary[f"{name}/mean"] = entry[3] / n
+            summary[f"{name}/p50"] = p50
+            summary[f"{name}/p95"] = p95
+            summary[f"{name}/p99"] = p99
+            summary[f"{name}/max"] = entry[4]
+            counts[:] = 0
+            entry[2] = 0
+            entry[3] = 0.0
+            entry[4] = 0.0
+        self._summary = summary
+        if self.csv_path is not None:
+            _append_summary_csv(self.csv_path, summary)
+
+    def get_summary(self) -> dict:
+        """ the last aggregation in ms. Keys are '{name}/count', '{name}/mean', '{name}/p50', '{name}/p95',
+        '{name}/p99' and '{name}/max', the percentiles are given as upper edge of their bin.
+        """
+        return self._summary
+
+    def save(self, path: str):
+        """ save the histograms of the whole run as npz file: 'bin_edges' and per name '{name}' (counts) and
+        '{name}_max'.
+        """
+        arrays = {"bin_edges": np.arange(self._num_bins + 1) * self.bin_width}
+        for name, entry in self._histograms.items():
+            arrays[name] = entry[1]
+            arrays[f"{name}_max"] = entry[5]
+        np.savez(path, **arrays)
@@ -0,0 +1,93 @@
+import json
+import os
+from typing import Union
+
+import numpy as np
+
+# name of the metadata stored in the torchscript artifacts by tools/agent_export.py
+METADATA_FILE = "metadata.json"
+
+
+class ExportedPolicy():
+    def __init__(self, path: str, num_threads: int = 1, warmup_steps: int = 10):
+        """runs an agent exported with tools/agent_export.py (best_model.pt or best_model.onnx) on the cpu,
+        neither stable-baselines3 nor a gym env are needed. The normalization of the observations is part of the
+        artifact. Every observation is copied into a preallocated input tensor, the thread settings are fixed
+        once when the artifact is loaded.
+
+        Args:
+            path (str): path of the torchscript (.pt) or onnx (.onnx) artifact
+            num_threads (int, optional): number of threads used for the inference of a single observation.
+                Defaults to 1.
+            warmup_steps (int, optional): number of inferences run after loading, the first inferences are slower
+                (e.g. optimization passes of the torchscript executor). Defaults to 10.
+        """
+        self.path = path
+        if os.path.splitext(path)[1] == '.onnx':
+            self._load_onnx(num_threads)
+        else:
+            self._load_torchscript(num_threads)
+        zero_obs = np.zeros(self.observation_size, dtype=np.float32)
+        for _ in range(warmup_steps):
+            self.predict(zero_obs)
+
+    def _load_torchscript(self, num_threads: int):
+        import torch as th
+        th.set_num_threads(num_threads)
+        try:
+            th.set_num_interop_threads(1)
+        except RuntimeError:
+            # can only be set once, before any inter-op parallel work
+            pass
+        extra_files = {METADATA_FILE: ''}
+        module = th.jit.load(self.path, map_location='cpu', _extra_files=extra_files)
+        module.eval()
+        metadata = json.loads(extra_files[METADATA_FILE])
+        self.observation_size = metadata['observation_size']
+        self.discrete_action_space = metadata['discrete_action_space']
+
+        # the numpy array shares the memory of the input tensor
+        input_tensor = th.zeros((1, self.observation_size), dtype=th.float32)
+        self._input = input_tensor.numpy()
+
+        def run() -> np.ndarray:
+            with th.no_grad():
+                return module(input_tensor)[0].numpy()
+        self._run = run
+
+    def _load_onnx(self, num_threads: int):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        session = ort.InferenceSession(self.path, options, providers=['CPUExecutionProvider'])
+        input_meta, output_meta = session.get_inputs()[0], session.get_outputs()[0]
+        self.observation_size = input_meta.shape[1]
+        # the action indices are int64, continuous actions float32
+        self.discrete_action_space = output_meta.type == 'tensor(int64)'
+
+        self._input = np.zeros((1, self.observation_size), dtype=np.float32)
+        inputs = {input_meta.name: self._input}
+        output_names = [output_meta.name]
+
+        def run() -> np.ndarray:
+            return session.run(output_names, inputs)[0][0]
+        self._run = run
+
+    def predict(self, obs: np.ndarray) -> Union[int, np.ndarray]:
+        """the deterministic action of the agent.
+
+        Args:
+            obs (np.ndarray): the observation (observation_size,) like returned by the FlatlandEnv, not normalized
+
+        Returns:
+            Union[int, np.ndarray]: the index of the action for discrete action spaces, otherwise the action
+                clipped to the action space
+        """
+        np.copyto(self._input[0], obs, casting='unsafe')
+        action = self._run()
+        if self.discrete_action_space:
+            return int(action)
+        return action
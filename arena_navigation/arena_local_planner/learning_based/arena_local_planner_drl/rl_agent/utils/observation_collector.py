@@ -1,5 +1,7 @@
 #! /usr/bin/env python
 from typing import Tuple
+from collections import OrderedDict
+from threading import Condition
 
 from numpy.core.numeric import normalize_axis_tuple
 import rospy
@@ -10,6 +12,7 @@ import time # for debuging
 
 # observation msgs
 from sensor_msgs.msg import LaserScan
+from rospy.numpy_msg import numpy_msg
 from geometry_msgs.msg import Pose2D,PoseStamped, PoseWithCovarianceStamped
 from geometry_msgs.msg import Twist
 from arena_plan_msgs.msg import RobotState,RobotStateStamped
@@ -27,50 +30,96 @@ from tf.transformations import *
 from gym import spaces
 import numpy as np
 
+from rl_agent.utils.observation_reducer import ObservationReducer
+
 
 
 
 class ObservationCollector():
-    def __init__(self,num_lidar_beams:int,lidar_range:float):
+    def __init__(self,num_lidar_beams:int,lidar_range:float, ns: str = None, lockstep: bool = False, sim_time_per_obs: float = None, lockstep_timeout: float = 0.05, reducer: ObservationReducer = None):
         """ a class to collect and merge observations
 
         Args:
             num_lidar_beams (int): [description]
             lidar_range (float): [description]
+            ns (str, optional): namespace of the simulation instance the observations are collected from.
+                Defaults to None (global namespace).
+            lockstep (bool, optional): only used in train mode. If True, every call of get_observations advances
+                the simulation once and returns the laser scan and the robot state of exactly that tick, matched by
+                their sim-time stamps. Otherwise the simulation is stepped until the approximate time synchronizer
+                delivers a new pair. Defaults to False.
+            sim_time_per_obs (float, optional): sim time to be advanced by a single step request in lockstep mode,
+                normally the update period of the laser. Only used if the step service supports a required time,
+                otherwise a single default step is taken. Defaults to None.
+            lockstep_timeout (float, optional): wall time in seconds to wait for the sensor data of a tick, before
+                the simulation is stepped again (counted as extra sim step). Defaults to 0.05.
+            reducer (ObservationReducer, optional): reduces the scan in the observation, obs_dict["laser_scan"]
+                still contains the full scan. Defaults to None (full scan).
         """
+        self.ns_prefix = "" if ns is None or ns == "" else "/"+ns+"/"
+        if reducer is None:
+            reducer = ObservationReducer(num_lidar_beams, lidar_range)
+        self._reducer = reducer
         # define observation_space
         self.observation_space = ObservationCollector._stack_spaces((
-            spaces.Box(low=0, high=lidar_range, shape=(num_lidar_beams,), dtype=np.float32),
+            reducer.get_space(),
             spaces.Box(low=0, high=10, shape=(1,), dtype=np.float32) ,
             spaces.Box(low=-np.pi, high=np.pi, shape=(1,), dtype=np.float32) 
         ))
 
         # flag of new sensor info
         self._flag_all_received=False
-
-        self._scan = LaserScan()
+        # number of sim steps which were needed in addition to the first one to get the last observation
+        self.num_extra_sim_steps = 0
+        # optional StepProfiler, set by the env
+        self.profiler = None
+
+        # the last received scan msg, its ranges are deserialized as numpy array and converted in get_observations
+        self._scan_msg = numpy_msg(LaserScan)()
+        # preallocated observation [reduced scan, rho, theta]. Without reduction the full scan is a view of it,
+        # otherwise it has its own buffer.
+        self._obs = np.zeros(reducer.num_outputs+2, dtype=np.float32)
+        if reducer.is_identity:
+            self._scan = self._obs[:num_lidar_beams]
+        else:
+            self._scan = np.zeros(num_lidar_beams, dtype=np.float32)
         self._robot_pose = Pose2D()
         self._robot_vel = Twist()
         self._subgoal =  Pose2D()
         
 
-        # message_filter subscriber: laserscan, robot_pose
-        self._scan_sub = message_filters.Subscriber("scan", LaserScan)
-        self._robot_state_sub = message_filters.Subscriber('plan_manager/robot_state', RobotStateStamped)
-        
-        # message_filters.TimeSynchronizer: call callback only when all sensor info are ready
-        self.ts = message_filters.ApproximateTimeSynchronizer([self._scan_sub, self._robot_state_sub], 100,slop=0.05)#,allow_headerless=True)
-        self.ts.registerCallback(self.callback_observation_received)
+        # service clients
+        self._is_train_mode = rospy.get_param("train_mode")
+        self._is_lockstep = lockstep and self._is_train_mode
+
+        if self._is_lockstep:
+            # raw subscriber, the sensor msgs of a tick are matched by their stamps in get_observations
+            self._lockstep_con = Condition()
+            self._lockstep_timeout = lockstep_timeout
+            self._lockstep_step_time = sim_time_per_obs
+            self._lockstep_scan_msg = None
+            # the last few robot states, indexed by their stamp in nsec
+            self._lockstep_robot_states = OrderedDict()
+            self._last_tick_stamp = -1
+            self._scan_sub = rospy.Subscriber(f"{self.ns_prefix}scan", numpy_msg(LaserScan), self.callback_scan_lockstep)
+            self._robot_state_sub = rospy.Subscriber(
+                f"{self.ns_prefix}plan_manager/robot_state", RobotStateStamped, self.callback_robot_state_lockstep)
+        else:
+            # message_filter subscriber: laserscan, robot_pose
+            self._scan_sub = message_filters.Subscriber(f"{self.ns_prefix}scan", numpy_msg(LaserScan))
+            self._robot_state_sub = message_filters.Subscriber(f"{self.ns_prefix}plan_manager/robot_state", RobotStateStamped)
+            
+            # message_filters.TimeSynchronizer: call callback only when all sensor info are ready
+            self.ts = message_filters.ApproximateTimeSynchronizer([self._scan_sub, self._robot_state_sub], 100,slop=0.05)#,allow_headerless=True)
+            self.ts.registerCallback(self.callback_observation_received)
         
         # topic subscriber: subgoal
         #TODO should we synchoronize it with other topics
-        self._subgoal_sub = message_filters.Subscriber('plan_manager/subgoal', PoseStamped) #self._subgoal_sub = rospy.Subscriber("subgoal", PoseStamped, self.callback_subgoal)
+        self._subgoal_sub = message_filters.Subscriber(f"{self.ns_prefix}plan_manager/subgoal", PoseStamped) #self._subgoal_sub = rospy.Subscriber("subgoal", PoseStamped, self.callback_subgoal)
         self._subgoal_sub.registerCallback(self.callback_subgoal)
         
-        # service clients
-        self._is_train_mode = rospy.get_param("train_mode")
         if self._is_train_mode:
-            self._service_name_step='step_world'
+            self._service_name_step=f"{self.ns_prefix}step_world"
             self._sim_step_client = rospy.ServiceProxy(self._service_name_step, StepWorld)
 
 
@@ -79,22 +128,45 @@ class ObservationCollector():
         return self.observation_space
 
     def get_observations(self):
-        # reset flag 
-        self._flag_all_received=False
-        if self._is_train_mode: 
-        # sim a step forward until all sensor msg uptodate
-            i=0
-            while(self._flag_all_received==False):
-                self.call_service_takeSimStep()
-                i+=1
+        """
+        Returns:
+            merged_obs (np.ndarray): float32 array [scan, rho, theta], the scan is reduced by the reducer.
+                merged_obs and obs_dict["laser_scan"] are views of preallocated buffers, which are overwritten by
+                the next call.
+            obs_dict (dict): laser_scan and goal_in_robot_frame
+        """
+        profiler = self.profiler
+        if profiler is not None:
+            t = profiler.tic()
+        if self._is_lockstep:
+            self._sync_lockstep()
+        else:
+            # reset flag 
+            self._flag_all_received=False
+            if self._is_train_mode: 
+            # sim a step forward until all sensor msg uptodate
+                i=0
+                while(self._flag_all_received==False):
+                    self.call_service_takeSimStep()
+                    i+=1
+                self.num_extra_sim_steps = i-1
+        if profiler is not None:
+            t = profiler.toc("sync", t)
+            profiler.count("sync_iterations", self.num_extra_sim_steps+1)
         # rospy.logdebug(f"Current observation takes {i} steps for Synchronization")
         #print(f"Current observation takes {i} steps for Synchronization")
-        scan=self._scan.ranges.astype(np.float32)
+        scan=self.process_scan_msg(self._scan_msg)
         rho, theta = ObservationCollector._get_goal_pose_in_robot_frame(self._subgoal,self._robot_pose)
-        merged_obs = np.hstack([scan, np.array([rho,theta])])
+        merged_obs = self._obs
+        if not self._reducer.is_identity:
+            self._reducer.reduce(scan, out=merged_obs[:-2])
+        merged_obs[-2] = rho
+        merged_obs[-1] = theta
         obs_dict = {}
         obs_dict["laser_scan"] = scan
         obs_dict['goal_in_robot_frame'] = [rho,theta]
+        if profiler is not None:
+            profiler.toc("obs_conversion", t)
         return merged_obs, obs_dict
     
     @staticmethod
@@ -106,33 +178,78 @@ class ObservationCollector():
          return rho,theta
 
 
-    def call_service_takeSimStep(self):
+    def _sync_lockstep(self):
+        """advance the simulation by one tick and take over the laser scan and the robot state with exactly the
+        sim-time of that tick. Only if no matching pair arrives within the timeout (e.g. the sensors are not
+        updated every tick), the simulation is stepped again.
+        """
+        i = 0
+        while True:
+            self.call_service_takeSimStep(self._lockstep_step_time)
+            i += 1
+            with self._lockstep_con:
+                if self._lockstep_con.wait_for(self._is_new_tick_received, timeout=self._lockstep_timeout):
+                    scan_msg = self._lockstep_scan_msg
+                    stamp = scan_msg.header.stamp.to_nsec()
+                    robot_state_msg = self._lockstep_robot_states[stamp]
+                    self._last_tick_stamp = stamp
+                    break
+        self.num_extra_sim_steps = i-1
+        self._scan_msg = scan_msg
+        self._robot_pose,self._robot_vel = self.process_robot_state_msg(robot_state_msg)
+
+    def _is_new_tick_received(self):
+        if self._lockstep_scan_msg is None:
+            return False
+        stamp = self._lockstep_scan_msg.header.stamp.to_nsec()
+        return stamp > self._last_tick_stamp and stamp in self._lockstep_robot_states
+
+    def call_service_takeSimStep(self, t: float = None):
         request=StepWorldRequest()
+        # only newer versions of the step service can advance the simulation by an arbitrary time
+        if t is not None and 'required_time' in request.__slots__:
+            request.required_time = t
+        if self.profiler is not None:
+            t = self.profiler.tic()
         try:
             response=self._sim_step_client(request)
             rospy.logdebug("step service=",response)
         except rospy.ServiceException as e:
             rospy.logdebug("step Service call failed: %s"%e)
+        if self.profiler is not None:
+            self.profiler.toc("sim_step", t)
 
     def callback_subgoal(self,msg_Subgoal):
         self._subgoal=self.process_subgoal_msg(msg_Subgoal)
         
         return
         
+    def callback_scan_lockstep(self,msg_LaserScan):
+        with self._lockstep_con:
+            self._lockstep_scan_msg = msg_LaserScan
+            self._lockstep_con.notify()
+
+    def callback_robot_state_lockstep(self,msg_RobotStateStamped):
+        with self._lockstep_con:
+            self._lockstep_robot_states[msg_RobotStateStamped.header.stamp.to_nsec()] = msg_RobotStateStamped
+            if len(self._lockstep_robot_states) > 10:
+                self._lockstep_robot_states.popitem(last=False)
+            self._lockstep_con.notify()
+
     def callback_observation_received(self,msg_LaserScan,msg_RobotStateStamped):
         # process sensor msg
-        self._scan=self.process_scan_msg(msg_LaserScan)
+        self._scan_msg=msg_LaserScan
         self._robot_pose,self._robot_vel=self.process_robot_state_msg(msg_RobotStateStamped)
         # ask subgoal service
         #self._subgoal=self.call_service_askForSubgoal()
         self._flag_all_received=True
         
     def process_scan_msg(self, msg_LaserScan):
-        # remove_nans_from_scan
-        scan = np.array(msg_LaserScan.ranges)
-        scan[np.isnan(scan)] = msg_LaserScan.range_max
-        msg_LaserScan.ranges = scan
-        return msg_LaserScan
+        # copy the ranges into the preallocated buffer and remove nans in place
+        scan = self._scan
+        np.copyto(scan, msg_LaserScan.ranges, casting='unsafe')
+        np.nan_to_num(scan, copy=False, nan=msg_LaserScan.range_max, posinf=np.inf, neginf=-np.inf)
+        return scan
     
     def process_robot_state_msg(self,msg_RobotStateStamped):
         state=msg_RobotStateStamped.state
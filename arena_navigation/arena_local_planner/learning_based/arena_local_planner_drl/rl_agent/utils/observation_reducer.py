@@ -0,0 +1,79 @@
+import numpy as np
+from gym import spaces
+
+
+class ObservationReducer():
+    def __init__(self, num_beams: int, max_range: float, mode: str = 'none', stride: int = 1, num_sectors: int = None,
+                 log_range: bool = False):
+        """reduces the laser scan before it's added to the observation, the reward is still calculated with the
+        full scan.
+
+        Args:
+            num_beams (int): number of beams of the laser scan
+            max_range (float): range of the laser
+            mode (str, optional): 'none' - all beams, 'stride' - every stride-th beam, 'sector_min' - the minimum of
+                each of the num_sectors sectors. Defaults to 'none'.
+            stride (int, optional): used by mode 'stride'. Defaults to 1.
+            num_sectors (int, optional): used by mode 'sector_min', sectors have (almost) the same number of
+                beams. Defaults to None.
+            log_range (bool, optional): the ranges r are replaced by log(1+min(r, max_range)) after the reduction.
+                Defaults to False.
+        """
+        self.num_beams = num_beams
+        self.max_range = max_range
+        self.mode = mode
+        self.log_range = log_range
+        if mode == 'none':
+            self.num_outputs = num_beams
+        elif mode == 'stride':
+            if stride < 1:
+                raise ValueError("stride must be at least 1")
+            self.stride = stride
+            self.num_outputs = len(range(0, num_beams, stride))
+        elif mode == 'sector_min':
+            if num_sectors is None or not 1 <= num_sectors <= num_beams:
+                raise ValueError(f"num_sectors must be between 1 and the number of beams ({num_beams})")
+            # index of the first beam of every sector
+            self._sector_starts = np.linspace(0, num_beams, num_sectors + 1).astype(np.int64)[:-1]
+            self.num_outputs = num_sectors
+        else:
+            raise ValueError(f"observation reduction mode '{mode}' is not supported, supported modes 'none', "
+                             "'stride' OR 'sector_min'")
+
+    @staticmethod
+    def from_settings(settings: dict, num_beams: int, max_range: float) -> 'ObservationReducer':
+        """create the reducer from the 'observation' entry of the settings yaml file, missing entries mean no
+        reduction.
+        """
+        settings = settings or {}
+        reduction = settings.get('laser_reduction', None) or {}
+        return ObservationReducer(num_beams, max_range, mode=reduction.get('mode', 'none'),
+                                  stride=reduction.get('stride', 1), num_sectors=reduction.get('num_sectors', None),
+                                  log_range=settings.get('log_range', False))
+
+    @property
+    def is_identity(self) -> bool:
+        return self.mode == 'none' and not self.log_range
+
+    def get_space(self) -> spaces.Box:
+        high = np.log1p(self.max_range) if self.log_range else self.max_range
+        return spaces.Box(low=0, high=high, shape=(self.num_outputs,), dtype=np.float32)
+
+    def reduce(self, scan: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        Args:
+            scan (np.ndarray): the full scan (num_beams,) without nans
+            out (np.ndarray, optional): float32 buffer (num_outputs,) the result is written to. Defaults to None.
+        """
+        if out is None:
+            out = np.empty(self.num_outputs, dtype=np.float32)
+        if self.mode == 'none':
+            np.copyto(out, scan, casting='unsafe')
+        elif self.mode == 'stride':
+            np.copyto(out, scan[::self.stride], casting='unsafe')
+        else:
+            np.minimum.reduceat(scan, self._sector_starts, out=out)
+        if self.log_range:
+            np.minimum(out, self.max_range, out=out)
+            np.log1p(out, out=out)
+        return out
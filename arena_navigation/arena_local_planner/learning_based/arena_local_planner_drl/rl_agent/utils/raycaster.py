@@ -0,0 +1,167 @@
+#! /usr/bin/env python
+"""Batched lidar raycasting against an occupancy grid and dynamic obstacle primitives.
+
+The static map is preprocessed once into a distance field, the rays of all poses are then marched together
+by sphere tracing, i.e. every ray advances by the distance to the closest occupied cell, and by exact cell
+traversal close to occupied cells. Circles and polygon edges are intersected analytically, so moving obstacles
+don't require any preprocessing.
+
+Example:
+    caster = LidarRaycaster(occupied, resolution, origin, -1.5707963267948966, 0.017453292, 360, 3.5)
+    scans = caster.scan(poses, circles=np.array([[x, y, r]]), polygons=[vertices])   # (len(poses), 360)
+"""
+from typing import List, Tuple
+
+import numpy as np
+from scipy import ndimage
+
+
+class LidarRaycaster:
+    def __init__(self, occupied: np.ndarray, resolution: float, origin: Tuple[float, float], angle_min: float,
+                 angle_increment: float, num_beams: int, max_range: float, max_rays_per_batch: int = 200000):
+        """
+        Args:
+            occupied (np.ndarray): 2D bool array of the static map, row 0 is the row with the smallest y-coordinate
+            resolution (float): size of a cell in meters
+            origin (Tuple[float, float]): position of the lower left corner of the grid in meters
+            angle_min (float): angle of the first beam relative to the sensor heading
+            angle_increment (float): angle between two beams
+            num_beams (int): number of beams of a scan
+            max_range (float): range of the lidar, beams without hit return this value
+            max_rays_per_batch (int, optional): upper bound of the rays processed together, which limits the
+                memory used by the intermediate arrays. Defaults to 200000.
+        """
+        self.resolution = float(resolution)
+        self.origin = np.array(origin[:2], dtype=np.float64)
+        self.max_range = float(max_range)
+        self.num_beams = int(num_beams)
+        self.beam_angles = angle_min + np.arange(self.num_beams) * angle_increment
+        self.max_rays_per_batch = max_rays_per_batch
+
+        # the area outside of the map is considered as occupied, therefore the grid is padded by one cell
+        occupied = np.pad(np.asarray(occupied, dtype=bool), 1, constant_values=True)
+        self._occupied = occupied
+        self._height, self._width = occupied.shape
+        # distance from the center of a free cell to the closest center of an occupied cell. A point inside the cell
+        # is at most half a diagonal away from its center and the occupied cell extends half a diagonal around its
+        # center, which gives a conservative step size for the sphere tracing.
+        self._safe_step = (ndimage.distance_transform_edt(~occupied) * self.resolution -
+                           np.sqrt(2) * self.resolution).astype(np.float32)
+        # a ray crosses at most two cell borders per cell length
+        self._max_iterations = 2 * int(np.ceil(self.max_range / self.resolution)) + 4
+        self._eps = 1e-6 * self.resolution
+
+    def _cast_static(self, ox: np.ndarray, oy: np.ndarray, dx: np.ndarray, dy: np.ndarray) -> np.ndarray:
+        """trace the rays with the origins (ox,oy) and the unit directions (dx,dy) through the grid. Every ray
+        either jumps by the distance field or, close to occupied cells, to the border of the current cell, so
+        that no cell on the ray is skipped.
+        """
+        ranges = np.full(ox.shape, self.max_range)
+        t = np.zeros(ox.shape)
+        # grid coordinates of the origins, in cells
+        gx = (ox - self.origin[0]) / self.resolution + 1
+        gy = (oy - self.origin[1]) / self.resolution + 1
+        with np.errstate(divide='ignore'):
+            inv_dx = np.where(dx != 0, self.resolution / np.abs(dx), np.inf)
+            inv_dy = np.where(dy != 0, self.resolution / np.abs(dy), np.inf)
+        active = np.arange(ox.shape[0])
+        for _ in range(self._max_iterations):
+            if active.size == 0:
+                break
+            t_active = t[active]
+            px = gx[active] + dx[active] * t_active / self.resolution
+            py = gy[active] + dy[active] * t_active / self.resolution
+            col = np.clip(np.floor(px).astype(np.int64), 0, self._width - 1)
+            row = np.clip(np.floor(py).astype(np.int64), 0, self._height - 1)
+            hit = self._occupied[row, col]
+            ranges[active[hit]] = t_active[hit]
+            # distance along the ray to the border of the current cell
+            fx = px - np.floor(px)
+            fy = py - np.floor(py)
+            exit_x = np.where(dx[active] > 0, 1 - fx, fx) * inv_dx[active]
+            exit_y = np.where(dy[active] > 0, 1 - fy, fy) * inv_dy[active]
+            step = np.minimum(exit_x, exit_y) + self._eps
+            t_active += np.maximum(self._safe_step[row, col], step)
+            t[active] = t_active
+            active = active[~hit & (t_active < self.max_range)]
+        return ranges
+
+    @staticmethod
+    def _cast_circles(ox, oy, dx, dy, circles: np.ndarray) -> np.ndarray:
+        """distance along the rays to the closest circle, inf if no circle is hit. Like box2d's raycast a circle
+        containing the origin isn't hit.
+        """
+        ocx = ox[:, None] - circles[:, 0]
+        ocy = oy[:, None] - circles[:, 1]
+        b = dx[:, None] * ocx + dy[:, None] * ocy
+        disc = b * b - (ocx * ocx + ocy * ocy - circles[:, 2]**2)
+        t = -b - np.sqrt(np.maximum(disc, 0))
+        return np.where((disc >= 0) & (t >= 0), t, np.inf).min(axis=1)
+
+    @staticmethod
+    def _cast_segments(ox, oy, dx, dy, segments: np.ndarray) -> np.ndarray:
+        """distance along the rays to the closest segment (x0,y0,x1,y1), inf if no segment is hit.
+        """
+        ex = segments[:, 2] - segments[:, 0]
+        ey = segments[:, 3] - segments[:, 1]
+        aox = segments[:, 0] - ox[:, None]
+        aoy = segments[:, 1] - oy[:, None]
+        denom = dx[:, None] * ey - dy[:, None] * ex
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t = (aox * ey - aoy * ex) / denom
+            u = (aox * dy[:, None] - aoy * dx[:, None]) / denom
+        valid = (np.abs(denom) > 1e-12) & (t >= 0) & (u >= 0) & (u <= 1)
+        return np.where(valid, t, np.inf).min(axis=1)
+
+    @staticmethod
+    def polygons_to_segments(polygons: List[np.ndarray]) -> np.ndarray:
+        """convert closed polygons, each given by its vertices with the shape (K,2), to an array of segments
+        with the shape (S,4).
+        """
+        if not polygons:
+            return np.zeros((0, 4))
+        segments = [np.hstack([p, np.roll(p, -1, axis=0)]) for p in map(np.asarray, polygons)]
+        return np.vstack(segments).astype(np.float64)
+
+    def scan(self, poses: np.ndarray, circles: np.ndarray = None, polygons: List[np.ndarray] = None,
+             segments: np.ndarray = None) -> np.ndarray:
+        """compute the laser scans of all sensor poses.
+
+        Args:
+            poses (np.ndarray): sensor poses (x,y,theta) with the shape (N,3) or (3,)
+            circles (np.ndarray, optional): circles (x,y,radius) with the shape (M,3). Defaults to None.
+            polygons (List[np.ndarray], optional): closed polygons, each given by its vertices (K,2).
+                Defaults to None.
+            segments (np.ndarray, optional): additional line segments (x0,y0,x1,y1) with the shape (S,4).
+                Defaults to None.
+
+        Returns:
+            np.ndarray: float32 ranges with the shape (N,num_beams), (num_beams,) for a single pose
+        """
+        poses = np.asarray(poses, dtype=np.float64)
+        single_pose = poses.ndim == 1
+        poses = poses.reshape(-1, 3)
+        circles = np.zeros((0, 3)) if circles is None else np.asarray(circles, dtype=np.float64).reshape(-1, 3)
+        all_segments = [self.polygons_to_segments(polygons or [])]
+        if segments is not None:
+            all_segments.append(np.asarray(segments, dtype=np.float64).reshape(-1, 4))
+        segments = np.vstack(all_segments)
+
+        result = np.empty((poses.shape[0], self.num_beams), dtype=np.float32)
+        # the pairwise arrays of rays and primitives are the largest intermediate results
+        rays_per_pose = self.num_beams * max(1, circles.shape[0], segments.shape[0])
+        poses_per_batch = max(1, self.max_rays_per_batch // rays_per_pose)
+        for start in range(0, poses.shape[0], poses_per_batch):
+            batch = poses[start:start+poses_per_batch]
+            angles = (batch[:, 2:3] + self.beam_angles).ravel()
+            dx, dy = np.cos(angles), np.sin(angles)
+            ox = np.repeat(batch[:, 0], self.num_beams)
+            oy = np.repeat(batch[:, 1], self.num_beams)
+            ranges = self._cast_static(ox, oy, dx, dy)
+            if circles.shape[0]:
+                np.minimum(ranges, self._cast_circles(ox, oy, dx, dy, circles), out=ranges)
+            if segments.shape[0]:
+                np.minimum(ranges, self._cast_segments(ox, oy, dx, dy, segments), out=ranges)
+            result[start:start+batch.shape[0]] = ranges.reshape(batch.shape[0], self.num_beams)
+        np.minimum(result, self.max_range, out=result)
+        return result[0] if single_pose else result
@@ -1,6 +1,4 @@
 import numpy as np
-from numpy.lib.utils import safe_eval
-import rospy
 from typing import Tuple
 
 class RewardCalculator():
@@ -24,6 +22,11 @@ class RewardCalculator():
             'rule_01': RewardCalculator._cal_reward_rule_01
             }
         self.cal_func = self._cal_funcs[rule]
+        # weights (for approaching, moving away) and punishment for not moving of the batch goal approach reward
+        self._batch_goal_approached_params = {
+            'rule_00': (0.25, 0.25, 0.0001),
+            'rule_01': (0.25, 0.4, 0.01)
+            }[rule]
 
     def reset(self):
         """reset variables related to the episode
@@ -49,6 +52,52 @@ class RewardCalculator():
         return self.curr_reward, self.info
 
 
+    def get_reward_batch(self, laser_scans: np.ndarray, goals_in_robot_frame: np.ndarray, last_goal_dists: np.ndarray):
+        """vectorized version of get_reward for many environments, the results are identical to calling
+        get_reward for every environment with the goal as python floats (like returned by the ObservationCollector).
+
+        Args:
+            laser_scans (np.ndarray): scans with the shape (n_envs, n_beams)
+            goals_in_robot_frame (np.ndarray): positions (rho, theta) of the goals with the shape (n_envs, 2)
+            last_goal_dists (np.ndarray): float64 array (n_envs,) holding the goal distances of the previous step,
+                nan if there is none (first step of an episode). It's updated in place, to reset env i set
+                last_goal_dists[i] = np.nan.
+
+        Returns:
+            rewards (np.ndarray): float64 (n_envs,)
+            dones (np.ndarray): bool (n_envs,)
+            done_reasons (np.ndarray): int (n_envs,), 1 - collision, 2 - goal reached, -1 - not done
+        """
+        laser_scans = np.asarray(laser_scans)
+        rho = np.asarray(goals_in_robot_frame, dtype=np.float64)[:, 0]
+        scan_min = laser_scans.min(axis=1)
+        # compare in the same precision as the scalar 'laser_scan.min() <= radius' of get_reward
+        cmp_dtype = np.asarray(laser_scans.dtype.type(0) - self.robot_radius).dtype
+        scan_min = scan_min.astype(cmp_dtype, copy=False)
+
+        rewards = np.zeros(rho.shape[0])
+        done_reasons = np.full(rho.shape[0], -1)
+        # goal reached
+        is_goal_reached = rho < self.goal_radius
+        rewards[is_goal_reached] = 15
+        done_reasons[is_goal_reached] = 2
+        # safe dist
+        rewards[scan_min < np.asarray(self.safe_dist, dtype=cmp_dtype)] -= 0.15
+        # collision
+        is_collision = scan_min <= np.asarray(self.robot_radius, dtype=cmp_dtype)
+        rewards[is_collision] -= 10
+        done_reasons[is_collision] = 1
+        # goal approached
+        w_approach, w_away, punishment = self._batch_goal_approached_params
+        has_last = ~np.isnan(last_goal_dists)
+        diff = last_goal_dists[has_last] - rho[has_last]
+        approach_reward = _round_like_python(np.where(diff < 0, w_away, w_approach) * diff, 3)
+        approach_reward[diff == 0] = -punishment
+        rewards[has_last] += approach_reward
+        last_goal_dists[:] = rho
+
+        return rewards, done_reasons > 0, done_reasons
+
     def _cal_reward_rule_00(self, laser_scan: np.ndarray, goal_in_robot_frame: Tuple[float,float],*args,**kwargs):
 
         self._reward_goal_reached(goal_in_robot_frame)
@@ -128,8 +177,15 @@ class RewardCalculator():
     def _reward_safe_dist(self, laser_scan, punishment = 0.15):
         if laser_scan.min() < self.safe_dist:
             self.curr_reward -= punishment
-    
-
 
 
-        
\ No newline at end of file
+def _round_like_python(x: np.ndarray, ndigits: int) -> np.ndarray:
+    """np.round scales by 10**ndigits, which can differ from python's correctly rounded round() for values
+    close to a tie. Those values are rounded by python.
+    """
+    result = np.round(x, ndigits)
+    scaled = x * 10**ndigits
+    near_tie = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_tie):
+        result[i] = round(float(x[i]), ndigits)
+    return result
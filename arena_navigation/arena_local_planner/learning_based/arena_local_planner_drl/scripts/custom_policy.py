@@ -1,29 +1,13 @@
-import os
 from typing import Callable, Dict, List, Optional, Tuple, Type, Union
 
 import gym
-import rospkg
 import torch as th
-import yaml
 
 from torch import nn
 from stable_baselines3.common.policies import ActorCriticPolicy
 from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
 
-_RS = 2  # robot state size
-
-ROBOT_SETTING_PATH = rospkg.RosPack().get_path('simulator_setup')
-yaml_ROBOT_SETTING_PATH = os.path.join(ROBOT_SETTING_PATH, 'robot', 'myrobot.model.yaml')
-
-with open(yaml_ROBOT_SETTING_PATH, 'r') as fd:
-    robot_data = yaml.safe_load(fd)
-    for plugin in robot_data['plugins']:
-        if plugin['type'] == 'Laser':
-            laser_angle_min = plugin['angle']['min']
-            laser_angle_max = plugin['angle']['max']
-            laser_angle_increment = plugin['angle']['increment']
-            _L = int(round((laser_angle_max - laser_angle_min) / laser_angle_increment) + 1)  # num of laser beams
-            break
+_RS = 2  # robot state size, the rest of the observation is the (possibly reduced) laser scan
 
 
 class MLP_ARENA2D(nn.Module):
@@ -120,6 +104,7 @@ class DRL_LOCAL_PLANNER(BaseFeaturesExtractor):
 
     def __init__(self, observation_space: gym.spaces.Box, features_dim: int = 128):
         super(DRL_LOCAL_PLANNER, self).__init__(observation_space, features_dim)
+        num_beams = observation_space.shape[0] - _RS
 
         self.cnn = nn.Sequential(
             nn.Conv1d(1, 32, 5, 2),
@@ -132,7 +117,7 @@ class DRL_LOCAL_PLANNER(BaseFeaturesExtractor):
         # Compute shape by doing one forward pass
         with th.no_grad():
             # tensor_forward = th.as_tensor(observation_space.sample()[None]).float()
-            tensor_forward = th.randn(1, 1, _L)
+            tensor_forward = th.randn(1, 1, num_beams)
             n_flatten = self.cnn(tensor_forward).shape[1]
 
         self.fc_1 = nn.Sequential(
@@ -181,6 +166,7 @@ class CNN_NAVREP(BaseFeaturesExtractor):
 
     def __init__(self, observation_space: gym.spaces.Box, features_dim: int = 32):
         super(CNN_NAVREP, self).__init__(observation_space, features_dim)
+        num_beams = observation_space.shape[0] - _RS
 
         self.cnn = nn.Sequential(
             nn.Conv1d(1, 32, 8, 4),
@@ -196,7 +182,7 @@ class CNN_NAVREP(BaseFeaturesExtractor):
 
         # Compute shape by doing one forward pass
         with th.no_grad():
-            tensor_forward = th.randn(1, 1, _L)
+            tensor_forward = th.randn(1, 1, num_beams)
             n_flatten = self.cnn(tensor_forward).shape[1]
 
         self.fc = nn.Sequential(
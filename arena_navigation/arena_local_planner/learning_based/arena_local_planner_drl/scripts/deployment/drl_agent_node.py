@@ -0,0 +1,178 @@
+import os
+import time
+
+import numpy as np
+import rospkg
+import rospy
+import yaml
+
+from arena_plan_msgs.msg import RobotStateStamped
+from geometry_msgs.msg import PoseStamped, Twist
+from rospy.numpy_msg import numpy_msg
+from sensor_msgs.msg import LaserScan
+
+from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.rl_agent.utils.debug import LatencyHistogram
+from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.rl_agent.utils.exported_policy import ExportedPolicy
+from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.rl_agent.utils.observation_collector import ObservationCollector
+from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.rl_agent.utils.observation_reducer import ObservationReducer
+from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.tools.argsparser import parse_deployment_node_args
+from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.tools.train_agent_utils import *
+
+
+class DRLAgentNode():
+    def __init__(self, policy: ExportedPolicy, robot_yaml_path: str, settings_yaml_path: str, discrete_action_space: bool,
+                 ns: str = None, latency_histogram: LatencyHistogram = None):
+        """drives the robot with an exported agent (see tools/agent_export.py) without the gym env and the task.
+        The observation is built in the callback of every laser scan with the same layout as the ObservationCollector
+        [reduced scan, rho, theta], using the last robot state and subgoal of the plan manager. The action is
+        published on cmd_vel right away.
+
+        The latencies are recorded in ms: 'transport' from the stamp of the scan to its callback, 'compute' from the
+        callback to the published action and 'end_to_end' from the stamp of the scan to the published action.
+
+        Args:
+            policy (ExportedPolicy): the exported agent
+            robot_yaml_path (str): flatland model of the robot, contains the laser settings
+            settings_yaml_path (str): action spaces and observation reduction the agent has been trained with
+            discrete_action_space (bool): whether the agent has been trained with the discrete action space
+            ns (str, optional): namespace of the robot. Defaults to None (global namespace).
+            latency_histogram (LatencyHistogram, optional): records the latencies. Defaults to None.
+        """
+        self.ns_prefix = "" if ns is None or ns == "" else "/"+ns+"/"
+        self._policy = policy
+        self._latency_histogram = latency_histogram
+        self._setup_by_configuration(robot_yaml_path, settings_yaml_path, discrete_action_space)
+        if policy.discrete_action_space != discrete_action_space:
+            raise ValueError("The action space of the exported agent doesn't match the hyperparameters")
+        if policy.observation_size != self._reducer.num_outputs + 2:
+            raise ValueError(f"The exported agent expects {policy.observation_size} observations, the laser of the "
+                             f"robot and the observation settings yield {self._reducer.num_outputs + 2}")
+
+        # preallocated observation [reduced scan, rho, theta] and full scan, like in the ObservationCollector
+        self._obs = np.zeros(self._reducer.num_outputs + 2, dtype=np.float32)
+        if self._reducer.is_identity:
+            self._scan = self._obs[:self._num_beams]
+        else:
+            self._scan = np.zeros(self._num_beams, dtype=np.float32)
+        # replaced as a whole by their callbacks, None until the first msg
+        self._robot_pose = None
+        self._subgoal = None
+        self.num_skipped_scans = 0
+
+        self._cmd_vel_pub = rospy.Publisher(f"{self.ns_prefix}cmd_vel", Twist, queue_size=1, tcp_nodelay=True)
+        self._robot_state_sub = rospy.Subscriber(
+            f"{self.ns_prefix}plan_manager/robot_state", RobotStateStamped, self.callback_robot_state, queue_size=1,
+            tcp_nodelay=True)
+        self._subgoal_sub = rospy.Subscriber(
+            f"{self.ns_prefix}plan_manager/subgoal", PoseStamped, self.callback_subgoal, queue_size=1)
+        # a single scan is queued, older ones are dropped while the policy is running. The buffer has to hold a
+        # whole scan, otherwise rospy doesn't drop the outdated msgs.
+        self._scan_sub = rospy.Subscriber(
+            f"{self.ns_prefix}scan", numpy_msg(LaserScan), self.callback_scan, queue_size=1, buff_size=2**20,
+            tcp_nodelay=True)
+
+    def _setup_by_configuration(self, robot_yaml_path: str, settings_yaml_path: str, discrete_action_space: bool):
+        """laser, observation reduction and actions like in FlatlandEnv.setup_by_configuration"""
+        with open(robot_yaml_path, 'r') as fd:
+            robot_data = yaml.safe_load(fd)
+        for plugin in robot_data['plugins']:
+            if plugin['type'] == 'Laser':
+                self._num_beams = int(
+                    round((plugin['angle']['max']-plugin['angle']['min'])/plugin['angle']['increment'])+1)
+                self._laser_max_range = plugin['range']
+
+        with open(settings_yaml_path, 'r') as fd:
+            setting_data = yaml.safe_load(fd)
+        self._reducer = ObservationReducer.from_settings(
+            setting_data.get('observation', None), self._num_beams, self._laser_max_range)
+        self._discrete_action_space = discrete_action_space
+        if discrete_action_space:
+            discrete_actions = setting_data['robot']['discrete_actions']
+            self._discrete_linear = [float(action['linear']) for action in discrete_actions]
+            self._discrete_angular = [float(action['angular']) for action in discrete_actions]
+
+    def callback_robot_state(self, msg_RobotStateStamped):
+        self._robot_pose = ObservationCollector.pose3D_to_pose2D(msg_RobotStateStamped.state.pose)
+
+    def callback_subgoal(self, msg_Subgoal):
+        self._subgoal = ObservationCollector.pose3D_to_pose2D(msg_Subgoal.pose)
+
+    def callback_scan(self, msg_LaserScan):
+        t_start = time.perf_counter()
+        robot_pose, subgoal = self._robot_pose, self._subgoal
+        if robot_pose is None or subgoal is None:
+            self.num_skipped_scans += 1
+            return
+        if self._latency_histogram is not None:
+            self._latency_histogram.add("transport", (rospy.get_rostime() - msg_LaserScan.header.stamp).to_sec() * 1000)
+
+        # observation
+        scan = self._scan
+        np.copyto(scan, msg_LaserScan.ranges, casting='unsafe')
+        np.nan_to_num(scan, copy=False, nan=msg_LaserScan.range_max, posinf=np.inf, neginf=-np.inf)
+        obs = self._obs
+        if not self._reducer.is_identity:
+            self._reducer.reduce(scan, out=obs[:-2])
+        obs[-2], obs[-1] = ObservationCollector._get_goal_pose_in_robot_frame(subgoal, robot_pose)
+
+        # action
+        action = self._policy.predict(obs)
+        action_msg = Twist()
+        if self._discrete_action_space:
+            action_msg.linear.x = self._discrete_linear[action]
+            action_msg.angular.z = self._discrete_angular[action]
+        else:
+            action_msg.linear.x = action[0]
+            action_msg.angular.z = action[1]
+        self._cmd_vel_pub.publish(action_msg)
+
+        if self._latency_histogram is not None:
+            self._latency_histogram.add("compute", (time.perf_counter() - t_start) * 1000)
+            self._latency_histogram.add(
+                "end_to_end", (rospy.get_rostime() - msg_LaserScan.header.stamp).to_sec() * 1000)
+
+    def stop(self):
+        self._scan_sub.unregister()
+        self._cmd_vel_pub.publish(Twist())
+
+
+if __name__ == "__main__":
+    args, _ = parse_deployment_node_args()
+
+    rospy.init_node("drl_agent_node")
+
+    # get paths
+    dir = rospkg.RosPack().get_path('arena_local_planner_drl')
+    PATHS = {
+        'model': os.path.join(dir, 'agents', args.load),
+        'robot_setting': os.path.join(rospkg.RosPack().get_path('simulator_setup'), 'robot', 'myrobot.model.yaml'),
+        'robot_as': os.path.join(rospkg.RosPack().get_path('arena_local_planner_drl'), 'configs', 'default_settings.yaml'),
+    }
+    artifact_path = args.artifact or os.path.join(PATHS['model'], 'best_model.pt')
+    assert os.path.isfile(artifact_path), \
+        "No exported agent found at %s, export it with 'export_agent.py --load %s'" % (artifact_path, args.load)
+
+    params = load_hyperparameters_json(agent_hyperparams, PATHS)
+
+    latency_histogram = None
+    if args.latency_log is not None:
+        latency_histogram = LatencyHistogram(window=args.latency_window, csv_path=args.latency_log + ".csv")
+
+    policy = ExportedPolicy(artifact_path, num_threads=args.num_threads)
+    node = DRLAgentNode(policy, PATHS['robot_setting'], PATHS['robot_as'], params['discrete_action_space'],
+                        ns=args.ns, latency_histogram=latency_histogram)
+    rospy.loginfo("DRL agent %s is running (%s)" % (params['agent_name'], artifact_path))
+
+    last_summary = None
+    while not rospy.is_shutdown():
+        try:
+            rospy.sleep(1.0)
+        except rospy.ROSInterruptException:
+            break
+        if latency_histogram is not None and latency_histogram.get_summary() is not last_summary:
+            last_summary = latency_histogram.get_summary()
+            rospy.loginfo("end to end latency [ms]: p50 %.1f, p95 %.1f, p99 %.1f, max %.1f" % tuple(
+                last_summary.get("end_to_end/" + key, np.nan) for key in ["p50", "p95", "p99", "max"]))
+    node.stop()
+    if latency_histogram is not None:
+        latency_histogram.save(args.latency_log + ".npz")
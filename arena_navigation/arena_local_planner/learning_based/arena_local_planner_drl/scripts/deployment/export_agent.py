@@ -0,0 +1,24 @@
+import os
+import rospkg
+
+from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.tools.argsparser import parse_export_agent_args
+from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.tools.agent_export import export_agent
+from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.tools.train_agent_utils import *
+
+
+if __name__ == "__main__":
+    args, _ = parse_export_agent_args()
+
+    # get paths
+    dir = rospkg.RosPack().get_path('arena_local_planner_drl')
+    PATHS = {
+        'model': os.path.join(dir, 'agents', args.load),
+    }
+    assert os.path.isfile(
+        os.path.join(PATHS['model'], 'best_model.zip')), "No model file found in %s" % PATHS['model']
+
+    params = load_hyperparameters_json(agent_hyperparams, PATHS)
+
+    export_path = export_agent(PATHS['model'], params['normalize'], export_format=args.format,
+                               export_path=args.output, agent_name=params['agent_name'])
+    print("EXPORTED AGENT %s TO:    %s" % (params['agent_name'], export_path))
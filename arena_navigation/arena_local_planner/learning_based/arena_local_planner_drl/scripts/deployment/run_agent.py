@@ -12,6 +12,7 @@ from task_generator.task_generator.tasks import get_predefined_task
 from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.rl_agent.envs.flatland_gym_env import FlatlandEnv
 from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.tools.argsparser import parse_run_agent_args
 from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.tools.train_agent_utils import *
+from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.tools.async_eval_callback import VEC_NORMALIZE_FILE
 
 
 if __name__ == "__main__":
@@ -39,12 +40,19 @@ if __name__ == "__main__":
     print_hyperparameters(params)
 
     # initialize task manager
-    task_manager = get_predefined_task(mode='ScenerioTask', PATHS=PATHS)
+    task_manager = get_predefined_task(mode='ScenerioTask', PATHS=PATHS, prefetch_scenerios=args.prefetch)
     # initialize gym env
     env = DummyVecEnv([lambda: FlatlandEnv(
         task_manager, PATHS.get('robot_setting'), PATHS.get('robot_as'), params['reward_fnc'], params['discrete_action_space'], goal_radius=0.50, max_steps_per_episode=350)])
     if params['normalize']:
-        env = VecNormalize(env, training=False, norm_obs=True, norm_reward=False, clip_reward=15)
+        vec_normalize_path = os.path.join(PATHS['model'], VEC_NORMALIZE_FILE)
+        if os.path.isfile(vec_normalize_path):
+            # the statistics the best model has been evaluated with
+            env = VecNormalize.load(vec_normalize_path, env)
+            env.training = False
+        else:
+            print("No normalization statistics found in %s" % PATHS['model'])
+            env = VecNormalize(env, training=False, norm_obs=True, norm_reward=False, clip_reward=15)
 
     # load agent
     agent = PPO.load(os.path.join(PATHS['model'], "best_model.zip"), env)
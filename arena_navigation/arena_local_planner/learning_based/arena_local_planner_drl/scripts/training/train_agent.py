@@ -1,20 +1,24 @@
 import os
 import rospy
+import rospkg
 
 from datetime import datetime as dt
 
 from stable_baselines3 import PPO
 from stable_baselines3.common.vec_env import SubprocVecEnv, DummyVecEnv, VecNormalize
 from stable_baselines3.common.monitor import Monitor
-from stable_baselines3.common.callbacks import EvalCallback
 
 from task_generator.task_generator.tasks import get_predefined_task
 from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.scripts.custom_policy import *
 from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.rl_agent.envs.flatland_gym_env import FlatlandEnv
+from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.rl_agent.envs.threaded_vec_env import ThreadedVecEnv
 from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.tools.argsparser import parse_training_args
 from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.tools.train_agent_utils import *
 from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.tools.custom_mlp_utils import *
-from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.tools.staged_train_callback import InitiateNewTrainStage
+from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.tools.staged_train_callback import InitiateNewTrainStage, TrainStageOnSuccessRate
+from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.tools.profiling_callback import StepProfilingCallback
+from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.tools.async_eval_callback import AsyncEvalCallback, EvalCallbackWithNormalization
+from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.rl_agent.utils.debug import StepProfiler
 
 ##### HYPERPARAMETER #####
 """ will be used upon initializing new agent """
@@ -56,6 +60,64 @@ def get_agent_name(args):
     return args.load
 
 
+def make_profiler(PATHS: dict, profile_window: int, ns: str = None):
+    """ Utility function to create the step profiler of an env, None if profiling is disabled
+
+    :param PATHS: dictionary containing model specific paths
+    :param profile_window: number of steps per aggregation
+    :param ns: namespace of the simulation instance, used as name of the csv file
+    """
+    if profile_window is None:
+        return None
+    return StepProfiler(profile_window, csv_path=os.path.join(PATHS.get('profiling'), "%s.csv" % (ns or "env")))
+
+
+def make_env(PATHS: dict, params: dict, ns: str = None, rank: int = 0, max_steps_per_episode: int = 200, seed: int = 0, lockstep: bool = False, profile_window: int = None, reshuffle_rate: float = 1):
+    """ Utility function to create a FlatlandEnv bound to its own simulation instance
+
+    The task (and therefore its obstacles) of the environment is created inside the function, so that every
+    environment owns an independent task. When the function is executed in a subprocess (SubprocVecEnv) a new
+    ros node will be initialized for it, in the training process (ThreadedVecEnv) the node of the process is used.
+
+    :param PATHS: dictionary containing model specific paths
+    :param params: dictionary containing the hyperparameters
+    :param ns: namespace of the simulation instance, e.g. 'sim_1'
+    :param rank: index of the subprocess
+    :param max_steps_per_episode: maximum number of steps per episode
+    :param seed: the inital seed for RNG
+    :param lockstep: advance the simulation exactly one sensor update per step
+    :param profile_window: enables step profiling, aggregated every profile_window steps
+    :param reshuffle_rate: fraction of the static obstacles which get a new position every episode
+    """
+    def _init():
+        if not rospy.core.is_initialized():
+            rospy.init_node("train_env_%d" % rank, disable_signals=True)
+        task_manager = get_predefined_task(params['task_mode'], params['curr_stage'], PATHS, ns=ns, reshuffle_rate=reshuffle_rate)
+        env = FlatlandEnv(
+            task_manager, PATHS.get('robot_setting'), PATHS.get('robot_as'), params['reward_fnc'], params['discrete_action_space'], 
+            goal_radius=1.00, max_steps_per_episode=max_steps_per_episode, ns=ns, lockstep=lockstep,
+            profiler=make_profiler(PATHS, profile_window, ns))
+        env.seed(seed + rank)
+        return env
+    return _init
+
+
+def make_eval_env(PATHS: dict, params: dict, ns: str = "eval_sim"):
+    """ Utility function to create the eval env of an 'AsyncEvalCallback' inside its worker process
+
+    :param PATHS: dictionary containing model specific paths
+    :param params: dictionary containing the hyperparameters
+    :param ns: namespace of the simulation instance reserved for the evaluation
+    """
+    def _init():
+        rospy.init_node("eval_env", disable_signals=True)
+        task_manager = get_predefined_task(params['task_mode'], params['curr_stage'], PATHS, ns=ns)
+        return Monitor(FlatlandEnv(
+            task_manager, PATHS.get('robot_setting'), PATHS.get('robot_as'), params['reward_fnc'], params['discrete_action_space'], goal_radius=1.00, max_steps_per_episode=250,
+            ns=ns), PATHS.get('eval'), info_keywords=("done_reason",))
+    return _init
+
+
 def get_paths(agent_name: str, args) -> dict:
     """ Function to generate agent specific paths 
     
@@ -70,7 +132,8 @@ def get_paths(agent_name: str, args) -> dict:
         'eval' : os.path.join(dir, 'training_logs', 'train_eval_log', agent_name),
         'robot_setting' : os.path.join(rospkg.RosPack().get_path('simulator_setup'), 'robot', robot + '.model.yaml'),
         'robot_as' : os.path.join(rospkg.RosPack().get_path('arena_local_planner_drl'), 'configs', 'default_settings.yaml'),
-        'curriculum' : os.path.join(rospkg.RosPack().get_path('arena_local_planner_drl'), 'configs', 'training_curriculum.yaml')
+        'curriculum' : os.path.join(rospkg.RosPack().get_path('arena_local_planner_drl'), 'configs', 'training_curriculum.yaml'),
+        'profiling' : os.path.join(dir, 'training_logs', 'profiling', agent_name)
     }
     # check for mode
     if args.load is None:
@@ -90,6 +153,12 @@ def get_paths(agent_name: str, args) -> dict:
             os.makedirs(PATHS.get('tb'))
     else:
         PATHS['tb'] = None
+    # step profiling enabled
+    if args.profile is not None:
+        if not os.path.exists(PATHS.get('profiling')):
+            os.makedirs(PATHS.get('profiling'))
+    else:
+        PATHS['profiling'] = None
 
     return PATHS
 
@@ -112,23 +181,55 @@ if __name__ == "__main__":
     params = initialize_hyperparameters(agent_name=AGENT_NAME, PATHS=PATHS, hyperparams_obj=hyperparams_obj, load_target=args.load)
 
     # instantiate gym environment
-    n_envs = 1
-    task_manager = get_predefined_task(params['task_mode'], params['curr_stage'], PATHS)
-    env = DummyVecEnv(
-        [lambda: FlatlandEnv(task_manager, PATHS.get('robot_setting'), PATHS.get('robot_as'), params['reward_fnc'], params['discrete_action_space'], goal_radius=1.00, max_steps_per_episode=200)] * n_envs)
+    n_envs = args.n_envs
+    if n_envs == 1:
+        # single simulation instance in the global namespace, shared with the eval env
+        task_manager = get_predefined_task(params['task_mode'], params['curr_stage'], PATHS, reshuffle_rate=args.reshuffle_rate)
+        env = DummyVecEnv(
+            [lambda: FlatlandEnv(task_manager, PATHS.get('robot_setting'), PATHS.get('robot_as'), params['reward_fnc'], params['discrete_action_space'], goal_radius=1.00, max_steps_per_episode=200, lockstep=args.lockstep,
+                                 profiler=make_profiler(PATHS, args.profile))])
+    else:
+        # every env runs in its own process against the simulation instance 'sim_{rank+1}'
+        # (see arena_bringup/launch/start_training.launch), the eval env gets the instance 'eval_sim'
+        # with '--shared_mem' the observations are passed through a shared memory ring buffer instead of pipes,
+        # with '--threaded' the envs share the node of this process and are stepped concurrently in threads
+        env_fns = [make_env(PATHS, params, ns="sim_%d" % (i + 1), rank=i, lockstep=args.lockstep, profile_window=args.profile, reshuffle_rate=args.reshuffle_rate) for i in range(n_envs)]
+        if args.threaded:
+            env = ThreadedVecEnv(env_fns)
+        else:
+            if args.shared_mem:
+                # multiprocessing.shared_memory needs python 3.8
+                from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.rl_agent.envs.shared_mem_vec_env import SharedMemVecEnv
+                vec_env_cls = SharedMemVecEnv
+            else:
+                vec_env_cls = SubprocVecEnv
+            env = vec_env_cls(env_fns, start_method='forkserver')
+        if not args.async_eval:
+            task_manager = get_predefined_task(params['task_mode'], params['curr_stage'], PATHS, ns="eval_sim")
     if params['normalize']:
         env = VecNormalize(env, training=True, norm_obs=True, norm_reward=False, clip_reward=15)
 
     # instantiate eval environment
-    trainstage_cb = InitiateNewTrainStage(TaskManager=task_manager, TreshholdType="rew", rew_threshold=14.5, task_mode=params['task_mode'], verbose=1)
-    eval_env = Monitor(FlatlandEnv(
-        task_manager, PATHS.get('robot_setting'), PATHS.get('robot_as'), params['reward_fnc'], params['discrete_action_space'], goal_radius=1.00, max_steps_per_episode=250),
-        PATHS.get('eval'), info_keywords=("done_reason",))
-    eval_env = DummyVecEnv([lambda: eval_env])
-    if params['normalize']:
-        eval_env = VecNormalize(eval_env, training=False, norm_obs=True, norm_reward=False, clip_reward=15)
-    eval_cb = EvalCallback(
-        eval_env, n_eval_episodes=20, eval_freq=15000, log_path=PATHS.get('eval'), best_model_save_path=PATHS.get('model'), deterministic=True, callback_on_new_best=trainstage_cb)
+    # with '--train_success_window' the stage is advanced by the success rate of the training episodes instead
+    advance_stage_on_eval = args.train_success_window is None
+    if args.async_eval:
+        # the eval env lives in the worker process of the callback, which also advances the stage of its task
+        trainstage_cb = InitiateNewTrainStage(
+            TaskManager=None, TreshholdType="rew", rew_threshold=14.5, task_mode=params['task_mode'], sync_training_envs=True, verbose=1)
+        eval_cb = AsyncEvalCallback(
+            make_eval_env(PATHS, params, ns="eval_sim"), n_eval_episodes=20, eval_freq=15000, log_path=PATHS.get('eval'), best_model_save_path=PATHS.get('model'), deterministic=True, start_method='forkserver', callback_on_new_best=trainstage_cb if advance_stage_on_eval else None)
+    else:
+        trainstage_cb = InitiateNewTrainStage(
+            TaskManager=task_manager, TreshholdType="rew", rew_threshold=14.5, task_mode=params['task_mode'], sync_training_envs=(n_envs > 1), verbose=1)
+        eval_env = Monitor(FlatlandEnv(
+            task_manager, PATHS.get('robot_setting'), PATHS.get('robot_as'), params['reward_fnc'], params['discrete_action_space'], goal_radius=1.00, max_steps_per_episode=250,
+            ns=None if n_envs == 1 else "eval_sim"),
+            PATHS.get('eval'), info_keywords=("done_reason",))
+        eval_env = DummyVecEnv([lambda: eval_env])
+        if params['normalize']:
+            eval_env = VecNormalize(eval_env, training=False, norm_obs=True, norm_reward=False, clip_reward=15)
+        eval_cb = EvalCallbackWithNormalization(
+            eval_env, n_eval_episodes=20, eval_freq=15000, log_path=PATHS.get('eval'), best_model_save_path=PATHS.get('model'), deterministic=True, callback_on_new_best=trainstage_cb if advance_stage_on_eval else None)
 
     # determine mode
     if args.custom_mlp:
@@ -168,7 +269,15 @@ if __name__ == "__main__":
         n_timesteps = args.n
 
     # start training
-    model.learn(total_timesteps = n_timesteps, callback=eval_cb, reset_num_timesteps = False)
+    callbacks = [eval_cb]
+    if not advance_stage_on_eval:
+        # with a single env the training and eval env share the task, otherwise the eval task is advanced as well
+        callbacks.append(TrainStageOnSuccessRate(
+            TaskManager=task_manager if n_envs == 1 else None, succ_per_threshold=0.8, window_size=args.train_success_window, task_mode=params['task_mode'],
+            extra_task_managers=[] if n_envs == 1 else [eval_cb if args.async_eval else task_manager], verbose=1))
+    if args.profile is not None:
+        callbacks.append(StepProfilingCallback(log_freq=args.profile, verbose=1))
+    model.learn(total_timesteps = n_timesteps, callback=callbacks, reset_num_timesteps = False)
 
     # update the timesteps the model has trained in total
     update_total_timesteps_json(hyperparams_obj, n_timesteps, PATHS)
@@ -0,0 +1,77 @@
+import multiprocessing as mp
+import threading
+
+import numpy as np
+import pytest
+
+pytest.importorskip("stable_baselines3")
+import gym
+import torch as th
+
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper
+
+from tools import async_eval_callback
+from tools.async_eval_callback import _eval_worker
+
+# done reasons of the stub episodes: collision, goal reached, timeout (no done reason)
+DONE_REASONS = [1, 2, None]
+
+
+class StubEnv(gym.Env):
+    observation_space = gym.spaces.Box(-1, 1, (2,), dtype=np.float32)
+    action_space = gym.spaces.Discrete(2)
+
+    def reset(self):
+        return np.zeros(2, dtype=np.float32)
+
+    def step(self, action):
+        return np.zeros(2, dtype=np.float32), 0.0, False, {}
+
+
+def step_locals(version: str, done: bool, info: dict) -> dict:
+    """the locals evaluate_policy passes to its callback after a step of a vec env with a single env"""
+    if version == "0.10":
+        return dict(obs=None, reward=np.zeros(1), done=np.array([done]), _info=[info])
+    if version == "1.0":
+        return dict(obs=None, reward=np.zeros(1), done=np.array([done]), info=[info])
+    # later versions loop over the envs of the step
+    return dict(observations=None, rewards=np.zeros(1), dones=np.array([done]), infos=[info], i=0,
+                reward=0.0, done=done, info=info)
+
+
+def make_stub_evaluate_policy(version: str):
+    def evaluate_policy(model, env, n_eval_episodes=10, deterministic=True, render=False, callback=None,
+                        reward_threshold=None, return_episode_rewards=False):
+        for episode in range(n_eval_episodes):
+            for step in range(3):
+                done = step == 2
+                info = {}
+                if done and DONE_REASONS[episode % 3] is not None:
+                    info["done_reason"] = DONE_REASONS[episode % 3]
+                callback(step_locals(version, done, info), {})
+        return [float(episode) for episode in range(n_eval_episodes)], [3] * n_eval_episodes
+    return evaluate_policy
+
+
+@pytest.mark.parametrize("version", ["0.10", "1.0", "later"])
+def test_eval_worker_reports_done_reasons(monkeypatch, version):
+    monkeypatch.setattr(async_eval_callback, "evaluate_policy", make_stub_evaluate_policy(version))
+    policy = th.nn.Linear(2, 2)
+    remote, work_remote = mp.Pipe()
+    args = (work_remote, remote, CloudpickleWrapper(StubEnv), CloudpickleWrapper(policy), 6, True, False)
+    # closing the parent end of the pipe only makes sense in another process
+    monkeypatch.setattr(remote, "close", lambda: None)
+    worker = threading.Thread(target=_eval_worker, args=args, daemon=True)
+    worker.start()
+
+    remote.send(("evaluate", ("tag", policy.state_dict(), None)))
+    assert remote.poll(10), "the eval worker didn't report a result"
+    tag, episode_rewards, episode_lengths, done_reasons = remote.recv()
+    assert tag == "tag"
+    assert episode_rewards == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0]
+    assert episode_lengths == [3] * 6
+    assert done_reasons == DONE_REASONS * 2
+
+    remote.send(("close", None))
+    worker.join(10)
+    assert not worker.is_alive()
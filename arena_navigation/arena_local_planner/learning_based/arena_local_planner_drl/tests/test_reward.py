@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from rl_agent.utils.reward import RewardCalculator, _round_like_python
+
+ROBOT_RADIUS, SAFE_DIST, GOAL_RADIUS = 0.2, 0.35, 0.25
+
+
+def run_episodes(rule: str, n_envs: int = 16, n_steps: int = 200, num_beams: int = 36, seed: int = 0):
+    """steps n_envs environments with random scans and goal distances through the scalar and the batch reward
+    and compares them after every step. An environment is reset once it's done like in the FlatlandEnv."""
+    rng = np.random.default_rng(seed)
+    calculators = [RewardCalculator(ROBOT_RADIUS, SAFE_DIST, GOAL_RADIUS, rule) for _ in range(n_envs)]
+    batch_calculator = RewardCalculator(ROBOT_RADIUS, SAFE_DIST, GOAL_RADIUS, rule)
+    last_goal_dists = np.full(n_envs, np.nan)
+    rho = rng.uniform(0, 5, n_envs).round(3)
+    num_collisions = num_goals_reached = 0
+    for _ in range(n_steps):
+        # the scans are float32 like the observations, some of them closer to the obstacles than the safe dist or
+        # the robot radius
+        laser_scans = rng.uniform(0.4, 3.5, (n_envs, num_beams)).astype(np.float32)
+        close = rng.random(n_envs) < 0.2
+        laser_scans[close, rng.integers(num_beams, size=close.sum())] = rng.uniform(0.1, 0.4, close.sum())
+        # the goal distances are on a grid of 2mm, so there are ties for the rounding and steps without movement
+        rho = np.maximum(rho + rng.integers(-50, 50, n_envs) * 0.002, 0).round(3)
+        rho[rng.random(n_envs) < 0.1] = 0.1
+        goals = np.stack([rho, rng.uniform(-np.pi, np.pi, n_envs)], axis=1)
+
+        rewards, dones, done_reasons = batch_calculator.get_reward_batch(laser_scans, goals, last_goal_dists)
+        for i, calculator in enumerate(calculators):
+            # the ObservationCollector returns the goal as python floats
+            reward, info = calculator.get_reward(laser_scans[i], tuple(goals[i].tolist()))
+            assert rewards[i] == reward
+            assert dones[i] == info['is_done']
+            if info['is_done']:
+                assert done_reasons[i] == info['done_reason']
+                calculator.reset()
+            else:
+                assert done_reasons[i] == -1
+        num_collisions += (done_reasons == 1).sum()
+        num_goals_reached += (done_reasons == 2).sum()
+        last_goal_dists[dones] = np.nan
+        rho[dones] = rng.uniform(0, 5, dones.sum()).round(3)
+    return num_collisions, num_goals_reached
+
+
+@pytest.mark.parametrize("rule", ["rule_00", "rule_01"])
+def test_get_reward_batch_matches_get_reward(rule):
+    num_collisions, num_goals_reached = run_episodes(rule)
+    # both terminal cases have been covered
+    assert num_collisions > 0
+    assert num_goals_reached > 0
+
+
+def test_round_like_python():
+    rng = np.random.default_rng(0)
+    x = np.concatenate([rng.uniform(-1, 1, 1000), rng.integers(-2000, 2000, 1000) * 0.0005])
+    assert _round_like_python(x, 3).tolist() == [round(value, 3) for value in x.tolist()]
@@ -0,0 +1,147 @@
+import json
+import os
+import pickle
+import warnings
+from typing import Optional
+
+import numpy as np
+import torch as th
+from gym import spaces
+from torch import nn
+
+from stable_baselines3 import PPO
+from stable_baselines3.common.policies import ActorCriticPolicy
+
+from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.rl_agent.utils.exported_policy import METADATA_FILE
+from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.tools.async_eval_callback import VEC_NORMALIZE_FILE
+
+EXPORT_FORMATS = {"torchscript": ".pt", "onnx": ".onnx"}
+
+
+class DeterministicPolicy(nn.Module):
+    """
+    The deterministic action path of a trained ActorCriticPolicy as a standalone module: observation normalization
+    (VecNormalize statistics), features extractor (e.g. MLP_ARENA2D, DRL_LOCAL_PLANNER or CNN_NAVREP), latent policy
+    network and action net. The value network isn't part of it.
+    Input: raw observations (batch, observation size) float32. Output: action indices (batch,) int64 for discrete
+    action spaces, actions (batch, action size) clipped to the action space otherwise.
+
+    :param policy: the policy of the trained PPO model
+    :param obs_mean: mean of the observations, None if the observations aren't normalized
+    :param obs_var: variance of the observations
+    :param clip_obs: max absolute value of the normalized observations
+    :param epsilon: added to the variance to avoid division by zero
+    """
+
+    def __init__(self, policy: ActorCriticPolicy, obs_mean: Optional[np.ndarray] = None,
+                 obs_var: Optional[np.ndarray] = None, clip_obs: float = 10.0, epsilon: float = 1e-8):
+        super(DeterministicPolicy, self).__init__()
+        self.features_extractor = policy.features_extractor
+        mlp_extractor = policy.mlp_extractor
+        # MlpExtractor of stable-baselines3 (custom mlp, CnnPolicy) or MLP_ARENA2D
+        shared_net = getattr(mlp_extractor, "shared_net", getattr(mlp_extractor, "body_net", None))
+        if shared_net is None or not hasattr(mlp_extractor, "policy_net"):
+            raise ValueError(f"mlp extractor {type(mlp_extractor).__name__} is not supported")
+        self.latent_pi_net = nn.Sequential(shared_net, mlp_extractor.policy_net)
+        self.action_net = policy.action_net
+
+        self.normalize = obs_mean is not None
+        self.clip_obs = float(clip_obs)
+        if self.normalize:
+            self.register_buffer("obs_mean", th.as_tensor(obs_mean, dtype=th.float32))
+            self.register_buffer("obs_std", th.as_tensor(np.sqrt(obs_var + epsilon), dtype=th.float32))
+
+        self.discrete = isinstance(policy.action_space, spaces.Discrete)
+        if not self.discrete:
+            self.register_buffer("action_low", th.as_tensor(policy.action_space.low, dtype=th.float32))
+            self.register_buffer("action_high", th.as_tensor(policy.action_space.high, dtype=th.float32))
+
+    def forward(self, observations: th.Tensor) -> th.Tensor:
+        if self.normalize:
+            observations = th.clamp((observations - self.obs_mean) / self.obs_std, -self.clip_obs, self.clip_obs)
+        action_logits = self.action_net(self.latent_pi_net(self.features_extractor(observations)))
+        if self.discrete:
+            # mode of the categorical distribution
+            return th.argmax(action_logits, dim=1)
+        # mean of the gaussian, clipped like in 'predict'
+        return th.max(th.min(action_logits, self.action_high), self.action_low)
+
+
+def load_normalization(model_dir: str, normalize: bool) -> Optional[dict]:
+    """
+    Load the VecNormalize statistics saved next to the best model.
+
+    :param model_dir: directory of the agent
+    :param normalize: whether the agent has been trained with normalized observations
+    :return: dict with obs_mean, obs_var, clip_obs and epsilon, None if the observations aren't normalized
+    """
+    if not normalize:
+        return None
+    path = os.path.join(model_dir, VEC_NORMALIZE_FILE)
+    if not os.path.isfile(path):
+        warnings.warn(f"No normalization statistics found in {model_dir}, the observations are only clipped "
+                      "(like by a new VecNormalize)")
+        return dict(obs_mean=np.zeros(1), obs_var=np.ones(1), clip_obs=10.0, epsilon=1e-8)
+    with open(path, "rb") as file:
+        # the VecNormalize without its venv, see VecNormalize.save
+        vec_normalize = pickle.load(file)
+    return dict(obs_mean=vec_normalize.obs_rms.mean, obs_var=vec_normalize.obs_rms.var,
+                clip_obs=vec_normalize.clip_obs, epsilon=vec_normalize.epsilon)
+
+
+def export_agent(model_dir: str, normalize: bool, export_format: str = "torchscript",
+                 export_path: Optional[str] = None, agent_name: str = None) -> str:
+    """
+    Export the best model of an agent together with its normalization statistics into a self-contained
+    artifact, which can be run by ExportedPolicy (rl_agent/utils/exported_policy.py) without stable-baselines3.
+    The artifact is checked against 'predict' of the loaded model on random observations.
+
+    :param model_dir: directory of the agent containing best_model.zip
+    :param normalize: whether the agent has been trained with normalized observations
+    :param export_format: 'torchscript' or 'onnx'
+    :param export_path: path of the artifact, defaults to best_model.pt or best_model.onnx in model_dir
+    :param agent_name: stored in the metadata of the artifact
+    :return: the path of the artifact
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"export format '{export_format}' is not supported, supported formats "
+                         f"{' OR '.join(EXPORT_FORMATS)}")
+    if export_path is None:
+        export_path = os.path.join(model_dir, "best_model" + EXPORT_FORMATS[export_format])
+
+    # the schedules aren't needed for inference and may not be unpicklable with other python versions
+    custom_objects = dict(learning_rate=0.0, lr_schedule=lambda _: 0.0, clip_range=lambda _: 0.0)
+    model = PPO.load(os.path.join(model_dir, "best_model.zip"), device="cpu", custom_objects=custom_objects)
+    normalization = load_normalization(model_dir, normalize)
+    module = DeterministicPolicy(model.policy, **(normalization or {}))
+    module.eval()
+
+    observation_size = model.observation_space.shape[0]
+    example_obs = th.zeros((1, observation_size), dtype=th.float32)
+    with th.no_grad():
+        if export_format == "torchscript":
+            traced = th.jit.trace(module, example_obs)
+            metadata = dict(agent_name=agent_name, observation_size=observation_size,
+                            discrete_action_space=module.discrete, normalize=normalization is not None)
+            th.jit.save(traced, export_path, _extra_files={METADATA_FILE: json.dumps(metadata)})
+        else:
+            th.onnx.export(module, example_obs, export_path, input_names=["observation"], output_names=["action"],
+                           dynamic_axes={"observation": {0: "batch"}, "action": {0: "batch"}}, opset_version=11)
+
+    # the saved torchscript module is checked, onnx artifacts need onnxruntime which may not be installed here
+    _check_export(model, th.jit.load(export_path) if export_format == "torchscript" else module, normalization)
+    return export_path
+
+
+def _check_export(model: PPO, module: nn.Module, normalization: Optional[dict], num_samples: int = 64):
+    """compare the actions of the exported module with 'predict' of the model (on the normalized observations)"""
+    observations = np.stack([model.observation_space.sample() for _ in range(num_samples)]).astype(np.float32)
+    with th.no_grad():
+        actions = module(th.as_tensor(observations)).numpy()
+    if normalization is not None:
+        observations = np.clip((observations - normalization["obs_mean"]) /
+                               np.sqrt(normalization["obs_var"] + normalization["epsilon"]),
+                               -normalization["clip_obs"], normalization["clip_obs"]).astype(np.float32)
+    expected_actions, _ = model.predict(observations, deterministic=True)
+    if not np.allclose(actions, expected_actions, atol=1e-4):
+        raise RuntimeError("The actions of the exported policy differ from the actions of the model")
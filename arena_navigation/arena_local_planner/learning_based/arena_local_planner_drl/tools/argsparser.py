@@ -1,5 +1,6 @@
 import argparse
 import os
+import sys
 
 from arena_navigation.arena_local_planner.learning_based.arena_local_planner_drl.tools.custom_mlp_utils import get_net_arch
 
@@ -15,6 +16,14 @@ def training_args(parser):
     parser.add_argument('--n', type=int, help='timesteps in total to be generated for training')
     parser.add_argument('-log', '--eval_log', action='store_true', help='enables storage of evaluation data')
     parser.add_argument('--tb', action='store_true', help='enables tensorboard logging')
+    parser.add_argument('--n_envs', type=int, default=1, help='number of parallel environments, each bound to its own simulation instance')
+    parser.add_argument('--lockstep', action='store_true', help='advance the simulation exactly one sensor update per step instead of stepping until the sensors are synchronized')
+    parser.add_argument('--shared_mem', action='store_true', help='parallel environments (n_envs > 1) return their observations through shared memory instead of pipes')
+    parser.add_argument('--threaded', action='store_true', help='parallel environments (n_envs > 1) run in threads of the training process and are stepped concurrently')
+    parser.add_argument('--async_eval', action='store_true', help='with n_envs > 1 the evaluation runs in a separate process on the simulation instance eval_sim while the training goes on')
+    parser.add_argument('--train_success_window', type=int, metavar="[n episodes]", help='advance the training curriculum as soon as 80%% of the last n training episodes were successful instead of by the evaluation')
+    parser.add_argument('--reshuffle_rate', type=float, default=1.0, metavar="[rate]", help='fraction of the static obstacles which get a new position every episode, the others keep their position')
+    parser.add_argument('--profile', type=int, metavar="[n steps]", help='enables step profiling, aggregated every n steps per env and written to csv (and tensorboard if enabled)')
 
 
 def run_agent_args(parser):
@@ -22,6 +31,22 @@ def run_agent_args(parser):
     parser.add_argument('--load', type=str, metavar="[agent name]", help='agent to be loaded for training')
     parser.add_argument('-s', '--scenario', type=str, metavar="[scenario name]", default='scenario1', help='name of scenario file for deployment')
     parser.add_argument('-v', '--verbose', choices=['0', '1'], default='1')
+    parser.add_argument('--prefetch', action='store_true', help='prepare the next scenario while the current one is running')
+
+
+def export_agent_args(parser):
+    parser.add_argument('--load', type=str, metavar="[agent name]", help='agent to be exported')
+    parser.add_argument('--format', type=str, choices=['torchscript', 'onnx'], default='torchscript', help='format of the exported artifact')
+    parser.add_argument('-o', '--output', type=str, metavar="[path]", help='path of the exported artifact, defaults to best_model.pt / best_model.onnx in the agent directory')
+
+
+def deployment_node_args(parser):
+    parser.add_argument('--load', type=str, metavar="[agent name]", help='agent to be deployed')
+    parser.add_argument('--artifact', type=str, metavar="[path]", help='exported agent (.pt or .onnx), defaults to best_model.pt in the agent directory')
+    parser.add_argument('--num_threads', type=int, default=1, help='number of threads used for the inference')
+    parser.add_argument('--ns', type=str, metavar="[namespace]", help='namespace of the robot')
+    parser.add_argument('--latency_log', type=str, metavar="[path]", help='records the latencies, the window aggregations are written to [path].csv and the histograms to [path].npz on shutdown')
+    parser.add_argument('--latency_window', type=int, default=1000, metavar="[n scans]", help='number of scans per aggregation of the latencies')
 
 
 def custom_mlp_args(parser):
@@ -44,6 +69,20 @@ def custom_mlp_args(parser):
 
 def process_training_args(parsed_args):
     """ argument check function """
+    if parsed_args.n_envs < 1:
+        raise Exception("Number of environments must be at least 1!")
+    if parsed_args.shared_mem and parsed_args.threaded:
+        raise Exception("'--shared_mem' and '--threaded' can't be combined!")
+    if parsed_args.shared_mem and sys.version_info < (3, 8):
+        raise Exception("'--shared_mem' needs python 3.8 or newer (multiprocessing.shared_memory)!")
+    if parsed_args.async_eval and parsed_args.n_envs < 2:
+        raise Exception("'--async_eval' needs at least 2 environments, with a single env the evaluation shares its simulation!")
+    if parsed_args.train_success_window is not None and parsed_args.train_success_window < 1:
+        raise Exception("The window of training episodes must contain at least 1 episode!")
+    if not 0 <= parsed_args.reshuffle_rate <= 1:
+        raise Exception("The reshuffle rate must be between 0 and 1!")
+    if parsed_args.profile is not None and parsed_args.profile < 1:
+        raise Exception("Profiling window must be at least 1 step!")
     if parsed_args.no_gpu:
         os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
     if parsed_args.custom_mlp:
@@ -64,6 +103,20 @@ def process_run_agent_args(parsed_args):
         raise Exception("No agent name was given!")
 
 
+def process_export_agent_args(parsed_args):
+    if parsed_args.load is None:
+        raise Exception("No agent name was given!")
+
+
+def process_deployment_node_args(parsed_args):
+    if parsed_args.load is None:
+        raise Exception("No agent name was given!")
+    if parsed_args.num_threads < 1:
+        raise Exception("Number of threads must be at least 1!")
+    if parsed_args.latency_window < 1:
+        raise Exception("Latency window must be at least 1 scan!")
+
+
 def parse_training_args(args=None, ignore_unknown=False):
     """ parser for training script """
     arg_populate_funcs = [training_args, custom_mlp_args]
@@ -80,6 +133,22 @@ def parse_run_agent_args(args=None, ignore_unknown=False):
     return parse_various_args(args, arg_populate_funcs, arg_check_funcs, ignore_unknown)
 
 
+def parse_export_agent_args(args=None, ignore_unknown=False):
+    """ parser for export script """
+    arg_populate_funcs = [export_agent_args]
+    arg_check_funcs = [process_export_agent_args]
+
+    return parse_various_args(args, arg_populate_funcs, arg_check_funcs, ignore_unknown)
+
+
+def parse_deployment_node_args(args=None, ignore_unknown=False):
+    """ parser for deployment node """
+    arg_populate_funcs = [deployment_node_args]
+    arg_check_funcs = [process_deployment_node_args]
+
+    return parse_various_args(args, arg_populate_funcs, arg_check_funcs, ignore_unknown)
+
+
 def parse_various_args(args, arg_populate_funcs, arg_check_funcs, ignore_unknown):
     """ generic arg parsing function """
     parser = argparse.ArgumentParser()
@@ -0,0 +1,260 @@
+import multiprocessing as mp
+import os
+from copy import deepcopy
+from typing import Callable, Optional
+
+import gym
+import numpy as np
+import torch as th
+
+from stable_baselines3.common.callbacks import BaseCallback, EvalCallback, EventCallback
+from stable_baselines3.common.evaluation import evaluate_policy
+from stable_baselines3.common.vec_env import DummyVecEnv, VecEnvWrapper, VecNormalize
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper
+
+# the VecNormalize statistics the best model has been evaluated with, saved next to it
+VEC_NORMALIZE_FILE = "vec_normalize.pkl"
+
+
+def _get_done_reason(locals_: dict) -> Optional[int]:
+    """done reason of the episode which has finished in the current step of evaluate_policy, None if the episode
+    goes on. The names of the locals passed to the callback differ between the versions of stable-baselines3: the
+    infos of the step are bound to '_info' (0.10), 'info' (1.0) or 'infos' (later versions, 'info' is then the
+    info of a single env). The eval env has a single env."""
+    if not locals_["done"]:
+        return None
+    infos = locals_["_info"] if "_info" in locals_ else locals_["infos"] if "infos" in locals_ else locals_["info"]
+    return infos[0].get("done_reason")
+
+
+def _eval_worker(remote, parent_remote, env_fn_wrapper: CloudpickleWrapper, policy_wrapper: CloudpickleWrapper,
+                 n_eval_episodes: int, deterministic: bool, normalize: bool) -> None:
+    parent_remote.close()
+    # the worker shares the machine with the training, one thread is enough for the inference of single observations
+    th.set_num_threads(1)
+    policy = policy_wrapper.var
+    policy.eval()
+    eval_env = DummyVecEnv([env_fn_wrapper.var])
+    if normalize:
+        eval_env = VecNormalize(eval_env, training=False, norm_obs=True, norm_reward=False, clip_reward=15)
+
+    def log_done_reason(locals_, globals_):
+        if locals_["done"]:
+            done_reasons.append(_get_done_reason(locals_))
+
+    while True:
+        try:
+            cmd, data = remote.recv()
+            if cmd == "evaluate":
+                tag, policy_params, obs_rms = data
+                policy.load_state_dict(policy_params)
+                if normalize:
+                    eval_env.obs_rms = obs_rms
+                done_reasons = []
+                episode_rewards, episode_lengths = evaluate_policy(
+                    policy, eval_env, n_eval_episodes=n_eval_episodes, deterministic=deterministic,
+                    return_episode_rewards=True, callback=log_done_reason)
+                remote.send((tag, episode_rewards, episode_lengths, done_reasons))
+            elif cmd == "env_method":
+                eval_env.env_method(data[0], *data[1], **data[2])
+            elif cmd == "close":
+                eval_env.close()
+                remote.close()
+                break
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the eval worker")
+        except EOFError:
+            break
+
+
+class AsyncEvalCallback(EventCallback):
+    """
+    Like EvalCallback, but the evaluation runs in a worker process on its own simulation instance while the
+    training goes on. Every eval_freq calls a snapshot of the policy weights and of the VecNormalize statistics
+    of the training env is sent to the worker. The results are handled as soon as they arrive. They are logged
+    like the results of EvalCallback, the evaluated snapshot is saved as best model (together with its
+    normalization statistics, see EvalCallbackWithNormalization), and callback_on_new_best
+    (e.g. InitiateNewTrainStage) is triggered. An evaluation is skipped if the previous one is still running.
+
+    The results of evaluations started before the stage was advanced (see next_stage) are dropped.
+
+    :param eval_env_fn: creates the eval env (wrapped in a Monitor) inside the worker process, bound to a
+        simulation instance which isn't used by the training envs
+    :param callback_on_new_best: Callback to trigger when there is a new best model according to the mean reward
+    :param n_eval_episodes: The number of episodes to test the agent
+    :param eval_freq: Evaluate the agent every eval_freq call of the callback.
+    :param log_path: Path to a folder where the evaluations (``evaluations.npz``) will be saved.
+    :param best_model_save_path: Path to a folder where the best model according to performance on the eval env
+        will be saved.
+    :param deterministic: Whether the evaluation should use a stochastic or deterministic actions.
+    :param start_method: method used to start the worker process (see SubprocVecEnv)
+    :param verbose:
+    """
+
+    def __init__(self, eval_env_fn: Callable[[], gym.Env], callback_on_new_best: Optional[BaseCallback] = None,
+                 n_eval_episodes: int = 5, eval_freq: int = 10000, log_path: str = None,
+                 best_model_save_path: str = None, deterministic: bool = True, start_method: str = None,
+                 verbose: int = 1):
+        super(AsyncEvalCallback, self).__init__(callback_on_new_best, verbose=verbose)
+        self.eval_env_fn = eval_env_fn
+        self.n_eval_episodes = n_eval_episodes
+        self.eval_freq = eval_freq
+        self.best_mean_reward = -np.inf
+        self.last_mean_reward = -np.inf
+        self.deterministic = deterministic
+        self.start_method = start_method
+        self.best_model_save_path = best_model_save_path
+        # Logs will be written in ``evaluations.npz``
+        if log_path is not None:
+            log_path = os.path.join(log_path, "evaluations")
+        self.log_path = log_path
+        self.evaluations_results = []
+        self.evaluations_timesteps = []
+        self.evaluations_length = []
+        self.evaluations_successes = []
+        # successes of the last evaluation, named like in EvalCallback (see InitiateNewTrainStage)
+        self._is_success_buffer = []
+
+        self.remote = None
+        self.process = None
+        # (num_timesteps, stage, policy weights, normalization statistics) of the evaluation in progress
+        self._pending = None
+        self._stage = 0
+
+    def _init_callback(self) -> None:
+        # Create folders if needed
+        if self.best_model_save_path is not None:
+            os.makedirs(self.best_model_save_path, exist_ok=True)
+        if self.log_path is not None:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+
+        start_method = self.start_method
+        if start_method is None:
+            forkserver_available = "forkserver" in mp.get_all_start_methods()
+            start_method = "forkserver" if forkserver_available else "spawn"
+        ctx = mp.get_context(start_method)
+        self.remote, work_remote = ctx.Pipe()
+        # the worker gets a cpu copy of the policy once, afterwards only the weights are sent
+        policy = deepcopy(self.model.policy).to("cpu")
+        args = (work_remote, self.remote, CloudpickleWrapper(self.eval_env_fn), CloudpickleWrapper(policy),
+                self.n_eval_episodes, self.deterministic, self._get_vec_normalize() is not None)
+        # daemon=True: if the main process crashes, we should not cause things to hang
+        self.process = ctx.Process(target=_eval_worker, args=args, daemon=True)
+        self.process.start()
+        work_remote.close()
+
+    def _get_vec_normalize(self) -> Optional[VecNormalize]:
+        env = self.training_env
+        while isinstance(env, VecEnvWrapper):
+            if isinstance(env, VecNormalize):
+                return env
+            env = env.venv
+        return None
+
+    def _snapshot_policy(self) -> dict:
+        return {key: value.detach().cpu().clone() for key, value in self.model.policy.state_dict().items()}
+
+    def next_stage(self) -> None:
+        """advance the training curriculum of the eval env, evaluations which are still running are dropped"""
+        self._stage += 1
+        self.remote.send(("env_method", ("next_stage", (), {})))
+
+    def _on_step(self) -> bool:
+        continue_training = True
+        if self._pending is not None and self.remote.poll():
+            continue_training = self._on_eval_result(*self.remote.recv())
+
+        if self.eval_freq > 0 and self.n_calls % self.eval_freq == 0:
+            if self._pending is not None:
+                if self.verbose > 0:
+                    print(f"Eval num_timesteps={self.num_timesteps} skipped, the previous evaluation is still running")
+            else:
+                vec_normalize = self._get_vec_normalize()
+                obs_rms = deepcopy(vec_normalize.obs_rms) if vec_normalize is not None else None
+                policy_params = self._snapshot_policy()
+                self._pending = (self.num_timesteps, self._stage, policy_params, obs_rms)
+                self.remote.send(("evaluate", (self.num_timesteps, policy_params, obs_rms)))
+        return continue_training
+
+    def _on_eval_result(self, num_timesteps: int, episode_rewards: list, episode_lengths: list,
+                        done_reasons: list) -> bool:
+        _, stage, policy_params, obs_rms = self._pending
+        self._pending = None
+        if stage != self._stage:
+            if self.verbose > 0:
+                print(f"Eval num_timesteps={num_timesteps} dropped, it was started before the stage changed")
+            return True
+        # done reason 2: the goal has been reached
+        successes = [done_reason == 2 for done_reason in done_reasons]
+        self._is_success_buffer = successes
+
+        if self.log_path is not None:
+            self.evaluations_timesteps.append(num_timesteps)
+            self.evaluations_results.append(episode_rewards)
+            self.evaluations_length.append(episode_lengths)
+            self.evaluations_successes.append(successes)
+            np.savez(
+                self.log_path,
+                timesteps=self.evaluations_timesteps,
+                results=self.evaluations_results,
+                ep_lengths=self.evaluations_length,
+                successes=self.evaluations_successes,
+            )
+
+        mean_reward, std_reward = np.mean(episode_rewards), np.std(episode_rewards)
+        mean_ep_length, std_ep_length = np.mean(episode_lengths), np.std(episode_lengths)
+        self.last_mean_reward = mean_reward
+
+        if self.verbose > 0:
+            print(f"Eval num_timesteps={num_timesteps}, " f"episode_reward={mean_reward:.2f} +/- {std_reward:.2f}")
+            print(f"Episode length: {mean_ep_length:.2f} +/- {std_ep_length:.2f}")
+            print(f"Success rate: {100 * np.mean(successes):.2f}%")
+        # Add to current Logger
+        self.logger.record("eval/mean_reward", float(mean_reward))
+        self.logger.record("eval/mean_ep_length", mean_ep_length)
+        self.logger.record("eval/success_rate", np.mean(successes))
+
+        if mean_reward > self.best_mean_reward:
+            if self.verbose > 0:
+                print("New best mean reward!")
+            if self.best_model_save_path is not None:
+                # save the evaluated weights, the policy has been trained further meanwhile
+                current_params = self._snapshot_policy()
+                self.model.policy.load_state_dict(policy_params)
+                self.model.save(os.path.join(self.best_model_save_path, "best_model"))
+                self.model.policy.load_state_dict(current_params)
+                vec_normalize = self._get_vec_normalize()
+                if vec_normalize is not None:
+                    current_obs_rms = vec_normalize.obs_rms
+                    vec_normalize.obs_rms = obs_rms
+                    vec_normalize.save(os.path.join(self.best_model_save_path, VEC_NORMALIZE_FILE))
+                    vec_normalize.obs_rms = current_obs_rms
+            self.best_mean_reward = mean_reward
+            # Trigger callback if needed
+            if self.callback is not None:
+                return self._on_event()
+        return True
+
+    def _on_training_end(self) -> None:
+        if self.process is not None:
+            self.remote.send(("close", None))
+            self.process.join()
+            self.process = None
+
+
+class EvalCallbackWithNormalization(EvalCallback):
+    """
+    EvalCallback which additionally saves the VecNormalize statistics of the eval env next to the best model
+    (VEC_NORMALIZE_FILE). The eval env is synchronized with the training env before every evaluation, the
+    statistics are the ones the best model has been evaluated with and are needed to run or export it.
+    """
+
+    def _on_step(self) -> bool:
+        best_mean_reward = self.best_mean_reward
+        continue_training = super(EvalCallbackWithNormalization, self)._on_step()
+        # the best mean reward may have been reset by callback_on_new_best (e.g. InitiateNewTrainStage)
+        is_new_best = self.eval_freq > 0 and self.n_calls % self.eval_freq == 0 \
+            and self.last_mean_reward > best_mean_reward
+        if is_new_best and self.best_model_save_path is not None and isinstance(self.eval_env, VecNormalize):
+            self.eval_env.save(os.path.join(self.best_model_save_path, VEC_NORMALIZE_FILE))
+        return continue_training
@@ -0,0 +1,25 @@
+import numpy as np
+
+from stable_baselines3.common.callbacks import BaseCallback
+
+class StepProfilingCallback(BaseCallback):
+    """
+    Collects the step profiling summaries of the training envs (see StepProfiler) and records their mean
+    over all envs to the logger of the model, i.e. to tensorboard if enabled ('--tb').
+
+    :param log_freq (int): number of calls (of the vectorized env step) between two collections
+    :param verbose:
+    """
+    def __init__(self, log_freq: int = 1000, verbose = 0):
+        super(StepProfilingCallback, self).__init__(verbose = verbose)
+        self.log_freq = log_freq
+
+    def _on_step(self) -> bool:
+        if self.n_calls % self.log_freq == 0:
+            summaries = [summary for summary in self.training_env.env_method("get_profile_summary") if summary]
+            keys = set().union(*summaries) if summaries else set()
+            for key in sorted(keys):
+                self.logger.record("profiling/" + key, np.mean([summary[key] for summary in summaries if key in summary]))
+            if self.verbose > 0 and summaries:
+                print("steps per second per env: %.1f" % np.mean([summary["steps_per_sec"] for summary in summaries]))
+        return True
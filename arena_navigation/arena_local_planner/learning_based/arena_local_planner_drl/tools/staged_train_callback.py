@@ -1,20 +1,25 @@
+import numpy as np
+
 from stable_baselines3.common.callbacks import BaseCallback
 from task_generator.task_generator.tasks import StagedRandomTask
 
 class InitiateNewTrainStage(BaseCallback):
     """
     Introduces new training stage when threshhold reached.
-    It must be used with "EvalCallback".
+    It must be used with "EvalCallback" or "AsyncEvalCallback".
 
-    :param TaskManager (obj, StagedRandomTask): holds task specific methods and stages
+    :param TaskManager (obj, StagedRandomTask): holds task specific methods and stages, None if the eval env runs in
+        the worker process of an "AsyncEvalCallback", its stage is then advanced through the callback
     :param TheshholdType (str): checks threshhold for either percentage of successful episodes (succ_per) or mean reward (rew)
     :param StartAt (int): stage to start training with
     :param rew_threshold (int): mean reward threshold to trigger new stage
     :param succ_per_threshold (float): threshold percentage of succesful episodes to trigger new stage
     :param task_mode (str): training task mode, if not 'staged' callback won't be called
+    :param sync_training_envs (bool): additionally advance the stage of the training envs via 'env_method',
+        needed when the training envs own their tasks (e.g. running in subprocesses)
     :param verbose:
     """
-    def __init__(self, TaskManager: StagedRandomTask, TreshholdType: str, rew_threshold: float = 10, succ_per_threshold: float = 0.8, task_mode: str = "staged", verbose = 0):
+    def __init__(self, TaskManager: StagedRandomTask, TreshholdType: str, rew_threshold: float = 10, succ_per_threshold: float = 0.8, task_mode: str = "staged", sync_training_envs: bool = False, verbose = 0):
         super(InitiateNewTrainStage, self).__init__(verbose = verbose)
         self.task_manager = TaskManager
         self.threshhold_type = TreshholdType
@@ -22,17 +27,117 @@ class InitiateNewTrainStage(BaseCallback):
         self.succ_per_threshold = succ_per_threshold
         self.verbose = verbose
         self.activated = bool(task_mode == "staged")
+        self.sync_training_envs = sync_training_envs
 
     def _on_step(self) -> bool:
-        assert self.parent is not None, "'InitiateNewTrainStage' callback must be used " "with an 'EvalCallback'"
-        
+        assert self.parent is not None, "'InitiateNewTrainStage' callback must be used " "with an 'EvalCallback' or 'AsyncEvalCallback'"
+
         if self.activated:
             if self.parent.n_eval_episodes < 10:
                 raise Warning("Only %d evaluation episodes considered for threshold monitoring" % self.parent.n_eval_episodes)
 
-            #TODO: access eval episodes to calculate percentage (consider editing EvalCallBack of stablebaselines3)
-            if (self.threshhold_type == "rew" and self.parent.best_mean_reward > self.rew_threshold) or (self.threshhold_type == "succ_per" and 99 > self.succ_per_threshold):
-                self.task_manager.next_stage()
+            # the success buffer of the last evaluation, filled from the 'is_success' info of the eval env
+            success_buffer = self.parent._is_success_buffer
+            if (self.threshhold_type == "rew" and self.parent.best_mean_reward > self.rew_threshold) or (self.threshhold_type == "succ_per" and len(success_buffer) > 0 and np.mean(success_buffer) >= self.succ_per_threshold):
+                if self.task_manager is not None:
+                    self.task_manager.next_stage()
+                else:
+                    self.parent.next_stage()
+                if self.sync_training_envs:
+                    self.training_env.env_method("next_stage")
                 self.parent.best_mean_reward = 0
 
-        return True
\ No newline at end of file
+        return True
+
+
+class EpisodeOutcomeTracker():
+    """
+    Rates of the episode outcomes (done reasons of the FlatlandEnv) over the last window_size episodes. The outcomes
+    are kept in a ring buffer together with their counts, adding an episode is O(1).
+
+    :param window_size (int): number of episodes
+    """
+    # done reasons of the FlatlandEnv
+    OUTCOMES = {0: "timeout", 1: "collision", 2: "success"}
+
+    def __init__(self, window_size: int = 100):
+        self.window_size = window_size
+        self._outcomes = np.zeros(window_size, dtype=np.int8)
+        self._counts = np.zeros(len(self.OUTCOMES), dtype=np.int64)
+        self._next = 0
+        self.num_episodes = 0
+
+    def add(self, done_reason: int):
+        if self.num_episodes == self.window_size:
+            self._counts[self._outcomes[self._next]] -= 1
+        else:
+            self.num_episodes += 1
+        self._outcomes[self._next] = done_reason
+        self._counts[done_reason] += 1
+        self._next = (self._next + 1) % self.window_size
+
+    def reset(self):
+        self._counts[:] = 0
+        self._next = 0
+        self.num_episodes = 0
+
+    @property
+    def is_full(self) -> bool:
+        return self.num_episodes == self.window_size
+
+    def get_rate(self, done_reason: int) -> float:
+        return float(self._counts[done_reason] / self.num_episodes) if self.num_episodes > 0 else float("nan")
+
+    def get_rates(self) -> dict:
+        """rates of all outcomes, e.g. {'success_rate': 0.6, 'collision_rate': 0.3, 'timeout_rate': 0.1}"""
+        return {name + "_rate": self.get_rate(done_reason) for done_reason, name in self.OUTCOMES.items()}
+
+
+class TrainStageOnSuccessRate(BaseCallback):
+    """
+    Tracks the outcomes of the training episodes (the 'done_reason' in the infos of the training envs) over a rolling
+    window and introduces a new training stage as soon as the success rate of a full window reaches the threshold,
+    without waiting for an evaluation. The rates are recorded every log_freq calls (to tensorboard if enabled).
+
+    :param TaskManager (obj, StagedRandomTask): the task of the training env if it lives in this process, None if
+        the training envs own their tasks (they are always advanced via 'env_method')
+    :param succ_per_threshold (float): threshold percentage of succesful episodes to trigger new stage
+    :param window_size (int): number of training episodes the rates are calculated over
+    :param task_mode (str): training task mode, if not 'staged' no new stage is introduced
+    :param extra_task_managers (list): tasks of other envs to be advanced as well, e.g. the eval task
+    :param log_freq (int): number of calls between two records of the rates
+    :param verbose:
+    """
+    def __init__(self, TaskManager: StagedRandomTask = None, succ_per_threshold: float = 0.8, window_size: int = 100,
+                 task_mode: str = "staged", extra_task_managers: list = None, log_freq: int = 1000, verbose = 0):
+        super(TrainStageOnSuccessRate, self).__init__(verbose = verbose)
+        self.task_manager = TaskManager
+        self.succ_per_threshold = succ_per_threshold
+        self.activated = bool(task_mode == "staged")
+        self.extra_task_managers = extra_task_managers or []
+        self.log_freq = log_freq
+        self.tracker = EpisodeOutcomeTracker(window_size)
+
+    def _on_step(self) -> bool:
+        for done, info in zip(self.locals["dones"], self.locals["infos"]):
+            if done and "done_reason" in info:
+                self.tracker.add(info["done_reason"])
+
+        if self.n_calls % self.log_freq == 0 and self.tracker.num_episodes > 0:
+            for key, rate in self.tracker.get_rates().items():
+                self.logger.record("rollout/" + key, rate)
+
+        if self.activated and self.tracker.is_full and \
+                self.tracker.get_rate(2) >= self.succ_per_threshold:
+            if self.verbose > 0:
+                print("Success rate of the last %d training episodes: %.2f%%, next stage!" %
+                      (self.tracker.window_size, 100 * self.tracker.get_rate(2)))
+            if self.task_manager is not None:
+                self.task_manager.next_stage()
+            else:
+                self.training_env.env_method("next_stage")
+            for task_manager in self.extra_task_managers:
+                task_manager.next_stage()
+            # the episodes of the last stage don't count for the new one
+            self.tracker.reset()
+        return True
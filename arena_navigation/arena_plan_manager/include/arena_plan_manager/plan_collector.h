@@ -39,6 +39,7 @@ private:
 
     double look_ahead_distance_;
     double tolerance_approach_;
+    std::string global_frame_id_;
 
 
 
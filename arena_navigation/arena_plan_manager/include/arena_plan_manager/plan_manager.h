@@ -65,6 +65,7 @@ private:
     double look_ahead_distance_;
     double tolerance_approach_;
     double timeout_goal_,timeout_subgoal_;
+    std::string global_frame_id_;
 
 
     
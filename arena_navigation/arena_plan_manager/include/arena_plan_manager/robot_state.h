@@ -60,11 +60,11 @@ struct RobotState
         w=wz;
     }
 
-    geometry_msgs::PoseStamped to_PoseStampted(){
+    geometry_msgs::PoseStamped to_PoseStampted(const std::string& frame_id = "map"){
         geometry_msgs::PoseStamped pose_stamped;
        
         pose_stamped.header.stamp=ros::Time::now();
-        pose_stamped.header.frame_id = "map";
+        pose_stamped.header.frame_id = frame_id;
         pose_stamped.pose.position.x=pose2d(0);
         pose_stamped.pose.position.y=pose2d(1);
         pose_stamped.pose.position.z=0.0;
@@ -75,12 +75,12 @@ struct RobotState
         return pose_stamped;
     }
 
-    arena_plan_msgs::RobotStateStamped toRobotStateStamped(){
+    arena_plan_msgs::RobotStateStamped toRobotStateStamped(const std::string& frame_id = "map"){
         arena_plan_msgs::RobotStateStamped state_stamped;
         arena_plan_msgs::RobotState state;
         //header
         state_stamped.header.stamp=ros::Time::now();
-        state_stamped.header.frame_id = "map";
+        state_stamped.header.frame_id = frame_id;
         
         // pose
         state.pose.position.x=pose2d(0);
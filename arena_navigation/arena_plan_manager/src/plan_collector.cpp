@@ -10,19 +10,23 @@ void PlanCollector::initPlanModules(ros::NodeHandle &nh){
 
     goal_=geometry_msgs::PoseStamped();
     
-    std::string global_plan_service_name = "/move_base/NavfnROS/make_plan";  
-    global_plan_client_= nh.serviceClient<nav_msgs::GetPlan>(global_plan_service_name);
+    // resolved in the namespace of the node, so that several simulation instances can run side by side
+    ros::NodeHandle n;
+    std::string global_plan_service_name = "move_base/NavfnROS/make_plan";  
+    global_plan_client_= n.serviceClient<nav_msgs::GetPlan>(global_plan_service_name);
 
     // get plan parameter
     nh.param("look_ahead_distance", look_ahead_distance_, 1.5);
     nh.param("tolerance_approach", tolerance_approach_, 0.5);  
+    // frame of the map, namespaced if several simulation instances run side by side
+    nh.param<std::string>("global_frame_id", global_frame_id_, "map");
 }
 
 bool PlanCollector::generate_global_plan(RobotState &start_state,RobotState &end_state){
     nav_msgs::GetPlan srv;
     
-    srv.request.start=start_state.to_PoseStampted();
-    srv.request.goal=end_state.to_PoseStampted();
+    srv.request.start=start_state.to_PoseStampted(global_frame_id_);
+    srv.request.goal=end_state.to_PoseStampted(global_frame_id_);
     srv.request.tolerance=0.3;
     if (global_plan_client_.call(srv))
     {   
@@ -45,7 +49,7 @@ nav_msgs::Path global_path, double obstacle_info, double sensor_info){
     
     // find safe place
     if(dist_to_goal<look_ahead_distance_){
-        subgoal_=end_state->to_PoseStampted();
+        subgoal_=end_state->to_PoseStampted(global_frame_id_);
         return true;
     }
 
@@ -19,6 +19,7 @@ void PlanManager::init(ros::NodeHandle& nh) {
 
     nh.param("timeout_goal", timeout_goal_, 300.);         //sec
     nh.param("timeout_subgoal", timeout_subgoal_, 60.);    //sec
+    nh.param<std::string>("global_frame_id", global_frame_id_, "map");
 
 
 
@@ -42,8 +43,9 @@ void PlanManager::init(ros::NodeHandle& nh) {
     //safety_timer_ = nh.createTimer(ros::Duration(0.05), &PlanManager::checkCollisionCallback, this);
 
     // subscriber
-    goal_sub_ =nh.subscribe("/goal", 1, &PlanManager::goalCallback, this);
-    odom_sub_ = nh.subscribe("/odometry/ground_truth", 1, &PlanManager::odometryCallback, this); // odom  //odometry/ground_truth
+    // resolved in the namespace of the node, so that several simulation instances can run side by side
+    goal_sub_ =n.subscribe("goal", 1, &PlanManager::goalCallback, this);
+    odom_sub_ = n.subscribe("odometry/ground_truth", 1, &PlanManager::odometryCallback, this); // odom  //odometry/ground_truth
 
     // publisher
     subgoal_pub_  = nh.advertise<geometry_msgs::PoseStamped>("subgoal",10);// relative name:/ns/node_name/subgoal
@@ -79,7 +81,7 @@ void PlanManager::goalCallback(const geometry_msgs::PoseStampedPtr& msg) {
     // set have_goal
     cout << "Goal set!" << endl;
     have_goal_ = true;
-    visualization_->drawGoal(end_state_->to_PoseStampted(), 0.5, Eigen::Vector4d(1, 1, 1, 1.0));
+    visualization_->drawGoal(end_state_->to_PoseStampted(global_frame_id_), 0.5, Eigen::Vector4d(1, 1, 1, 1.0));
 
     // init start_time for this task
     start_time_=ros::Time::now();
@@ -89,8 +91,11 @@ void PlanManager::odometryCallback(const nav_msgs::OdometryConstPtr& msg){
   // get robot state according to odometry msg
   cur_state_= new RobotState(*msg);
 
-  // publish robot state
-  robot_state_pub_.publish(cur_state_->toRobotStateStamped());
+  // publish robot state, stamped with the sim-time of the odometry so that it can be matched exactly
+  // with the laser scan of the same simulation tick
+  arena_plan_msgs::RobotStateStamped state_stamped = cur_state_->toRobotStateStamped(global_frame_id_);
+  state_stamped.header.stamp = msg->header.stamp;
+  robot_state_pub_.publish(state_stamped);
 
   // set have_odom(means localization system is ready)
   have_odom_ = true;
@@ -233,8 +238,8 @@ void PlanManager::execFSMCallback(const ros::TimerEvent& e) {
 
     case REPLAN_MID: {
       if(mode_==TRAIN){
-        subgoal_pub_.publish(end_state_->to_PoseStampted());
-        visualization_->drawSubgoal(end_state_->to_PoseStampted(), 0.3, Eigen::Vector4d(0, 0, 0, 1.0));
+        subgoal_pub_.publish(end_state_->to_PoseStampted(global_frame_id_));
+        visualization_->drawSubgoal(end_state_->to_PoseStampted(global_frame_id_), 0.3, Eigen::Vector4d(0, 0, 0, 1.0));
         cout<<"MID_REPLAN Success"<<endl;
         changeFSMExecState(EXEC_LOCAL, "FSM");
         return;
@@ -0,0 +1,64 @@
+#! /usr/bin/env python
+"""spawns the robot of a simulation instance. The frames of the robot model (bodies, laser, odom and ground truth
+frame) are prefixed with the namespace of the instance, so that several instances can broadcast their transforms
+on the global /tf side by side.
+
+usage: spawn_robot.py --yaml_path <robot model> --name <model name> --ns <namespace>
+"""
+import argparse
+import copy
+import os
+
+import rospy
+import yaml
+from flatland_msgs.srv import SpawnModel, SpawnModelRequest
+
+from task_generator.obstacles_manager import write_model_yaml
+
+
+def namespace_robot_model(model: dict, frame_prefix: str) -> dict:
+    """copy of the robot model whose frames are prefixed with frame_prefix, e.g. 'sim_1/'"""
+    model = copy.deepcopy(model)
+    body_names = set()
+    for body in model.get('bodies', []):
+        body_names.add(body['name'])
+        body['name'] = frame_prefix + body['name']
+    for plugin in model.get('plugins', []):
+        for key in ('body', 'reference'):
+            if plugin.get(key) in body_names:
+                plugin[key] = frame_prefix + plugin[key]
+        if 'exclude' in plugin:
+            plugin['exclude'] = [frame_prefix + name if name in body_names else name for name in plugin['exclude']]
+        if plugin['type'] == 'DiffDrive':
+            plugin['odom_frame_id'] = frame_prefix + plugin.get('odom_frame_id', 'odom')
+            plugin['ground_truth_frame_id'] = frame_prefix + plugin.get('ground_truth_frame_id', 'map')
+        elif plugin['type'] == 'Laser':
+            plugin['frame'] = frame_prefix + plugin.get('frame', plugin['name'])
+    return model
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--yaml_path', type=str, required=True, help='model file of the robot')
+    parser.add_argument('--name', type=str, default='myrobot', help='name of the robot model')
+    parser.add_argument('--ns', type=str, default='', help='namespace of the simulation instance')
+    args, _ = parser.parse_known_args(rospy.myargv()[1:])
+
+    rospy.init_node('spawn_robot', anonymous=True)
+    ns = args.ns.strip('/')
+    yaml_path = args.yaml_path
+    if ns:
+        with open(yaml_path) as f:
+            model = yaml.safe_load(f)
+        model_name = os.path.basename(yaml_path).split('.')[0]
+        yaml_path = write_model_yaml(namespace_robot_model(model, ns + '/'), f'{ns}_{model_name}')
+
+    service_name = f'/{ns}/spawn_model' if ns else '/spawn_model'
+    rospy.wait_for_service(service_name)
+    spawn_request = SpawnModelRequest()
+    spawn_request.yaml_path = yaml_path
+    spawn_request.name = args.name
+    spawn_request.ns = f'/{ns}' if ns else ''
+    response = rospy.ServiceProxy(service_name, SpawnModel)(spawn_request)
+    if not response.success:
+        rospy.logerr(f"can't spawn the robot {args.name}: {response.message}")
@@ -1,6 +1,11 @@
+import functools
+import hashlib
 import math
 import random
-from typing import Union
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Union
 import re
 import yaml
 import os
@@ -15,7 +20,88 @@ from std_msgs.msg import Empty
 import rospy
 import rospkg
 import shutil
-from .utils import generate_freespace_indices, get_random_pos_on_map
+from .utils import get_map_index
+
+# upper bound of the generated model files kept in the cache folder
+MAX_CACHED_MODEL_FILES = 500
+# files used within this time span (in seconds) are never evicted, another process might be spawning them
+MODEL_FILE_MIN_AGE = 600
+
+
+@functools.lru_cache(maxsize=1024)
+def get_model_radius(model_yaml_file_path: str) -> float:
+    """radius of the bounding circle of all footprints of a model file around the origin of the model"""
+    with open(model_yaml_file_path) as f:
+        model = yaml.safe_load(f)
+    radius = 0.0
+    for body in model.get('bodies', []):
+        body_offset = math.hypot(*body.get('pose', [0, 0, 0])[:2])
+        for footprint in body.get('footprints', []):
+            if footprint['type'] == 'circle':
+                extent = math.hypot(*footprint.get('center', [0, 0])) + footprint['radius']
+            else:
+                extent = max((math.hypot(*point) for point in footprint.get('points', [])), default=0.0)
+            radius = max(radius, body_offset + extent)
+    return radius
+
+
+@functools.lru_cache(maxsize=None)
+def get_model_cache_folder() -> str:
+    """folder of the generated model yaml files, the package path is only looked up once per process"""
+    folder_path = os.path.join(rospkg.RosPack().get_path('simulator_setup'), 'tmp_random_obstacles')
+    os.makedirs(folder_path, exist_ok=True)
+    return folder_path
+
+
+def write_model_yaml(dict_file: dict, model_name: str) -> str:
+    """write the model to the cache folder, the file name contains a hash of the model so that a model with the
+    same geometry and plugin parameters reuses the existing file. The least recently used files are evicted once
+    there are more than MAX_CACHED_MODEL_FILES.
+
+    Args:
+        dict_file (dict): the model
+        model_name (str): name of the model, the file name has the format {model_name}.{hash}.model.yaml
+
+    Returns:
+        str: absolute path of the model yaml file
+    """
+    content = yaml.dump(dict_file)
+    digest = hashlib.sha1(content.encode()).hexdigest()[:16]
+    yaml_path = os.path.join(get_model_cache_folder(), f"{model_name}.{digest}.model.yaml")
+    if os.path.isfile(yaml_path):
+        # mark the file as recently used
+        os.utime(yaml_path)
+        return yaml_path
+    # the folder is shared by all simulation instances, write to a temporary file and rename it atomically, so
+    # that no other process reads a partial file
+    tmp_path = f"{yaml_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as fd:
+        fd.write(content)
+    os.replace(tmp_path, yaml_path)
+    _evict_model_files()
+    return yaml_path
+
+
+def _evict_model_files():
+    folder_path = get_model_cache_folder()
+    file_names = [name for name in os.listdir(folder_path) if name.endswith('.model.yaml')]
+    if len(file_names) <= MAX_CACHED_MODEL_FILES:
+        return
+    mtimes = {}
+    for name in file_names:
+        try:
+            mtimes[name] = os.path.getmtime(os.path.join(folder_path, name))
+        except FileNotFoundError:
+            # evicted by another process
+            pass
+    now = time.time()
+    for name in sorted(mtimes, key=mtimes.get)[:len(mtimes) - MAX_CACHED_MODEL_FILES]:
+        if now - mtimes[name] < MODEL_FILE_MIN_AGE:
+            break
+        try:
+            os.remove(os.path.join(folder_path, name))
+        except FileNotFoundError:
+            pass
 
 
 class ObstaclesManager:
@@ -23,42 +109,63 @@ class ObstaclesManager:
     A manager class using flatland provided services to spawn, move and delete obstacles.
     """
 
-    def __init__(self, map_: OccupancyGrid, is_training=True):
+    def __init__(self, map_: OccupancyGrid, is_training=True, ns: str = None, max_parallel_calls: int = 8):
         """
         Args:
             map_ (OccupancyGrid):
             is_training (bool, optional): is it training or testing. Defaults to True.
+            ns (str, optional): namespace of the simulation instance. Defaults to None (global namespace).
+            max_parallel_calls (int, optional): maximum number of service calls of a batch (spawn, move or delete
+                many obstacles) which are in flight at the same time. Defaults to 8.
             plugin_name: The name of the plugin which is used to control the movement of the obstacles, Currently we use "RandomMove" for training and Tween2 for evaluation.
                 The Plugin Tween2 can move the the obstacle along a trajectory which can be assigned by multiple waypoints with a constant velocity.Defaults to "RandomMove".
         """
+        self.ns = ns
+        self.ns_prefix = "" if ns is None or ns == "" else "/"+ns+"/"
         # a list of publisher to move the obstacle to the start pos.
         self._move_all_obstacles_start_pos_pubs = []
 
         # setup proxy to handle  services provided by flatland
-        rospy.wait_for_service('move_model', timeout=20)
-        rospy.wait_for_service('delete_model', timeout=20)
-        rospy.wait_for_service('spawn_model', timeout=20)
+        rospy.wait_for_service(f'{self.ns_prefix}move_model', timeout=20)
+        rospy.wait_for_service(f'{self.ns_prefix}delete_model', timeout=20)
+        rospy.wait_for_service(f'{self.ns_prefix}spawn_model', timeout=20)
         if is_training:
-            rospy.wait_for_service('step_world', timeout=20)
+            rospy.wait_for_service(f'{self.ns_prefix}step_world', timeout=20)
         # allow for persistent connections to services
         self._srv_move_model = rospy.ServiceProxy(
-            'move_model', MoveModel, persistent=True)
+            f'{self.ns_prefix}move_model', MoveModel, persistent=True)
         self._srv_delete_model = rospy.ServiceProxy(
-            'delete_model', DeleteModel, persistent=True)
+            f'{self.ns_prefix}delete_model', DeleteModel, persistent=True)
         self._srv_spawn_model = rospy.ServiceProxy(
-            'spawn_model', SpawnModel, persistent=True)
+            f'{self.ns_prefix}spawn_model', SpawnModel, persistent=True)
         # self._srv_sim_step = rospy.ServiceProxy('step_world', StepWorld, persistent=True)
+        # the calls of a batch are issued from a thread pool, a persistent connection can't be shared between
+        # threads, therefore every thread owns its proxies.
+        self._max_parallel_calls = max_parallel_calls
+        self._batch_executor = None
+        self._thread_local = threading.local()
 
         self.update_map(map_)
         self.obstacle_name_list = []
+        # static obstacles which have been moved out of the map and stay there until they are activated again
+        self._static_obstacle_names = set()
+        self._parked_obstacle_names = set()
+        # obstacles which can be placed in the map by reset_pos_obstacles_random, None means all
+        self._enabled_obstacle_names = None
+        # radius of the bounding circle of every obstacle, used to place them without overlaps
+        self._obstacle_radii = {}
+        # last pose (x,y,theta) requested for every obstacle, dynamic obstacles have moved on since then
+        self._last_poses = {}
+        # obstacles placed in the map by the last call of reset_pos_obstacles_random
+        self._active_obstacle_names = set()
         self._obstacle_name_prefix = 'obstacle'
         # remove all existing obstacles generated before create an instance of this class
         self.remove_obstacles()
 
     def update_map(self, new_map: OccupancyGrid):
         self.map = new_map
-        # a tuple stores the indices of the non-occupied spaces. format ((y,....),(x,...)
-        self._free_space_indices = generate_freespace_indices(self.map)
+        # free space of the map for sampling the positions of the obstacles
+        self._map_index = get_map_index(self.map)
 
     def register_obstacles(self, num_obstacles: int, model_yaml_file_path: str, start_pos: list = []):
         """register the obstacles defined by a yaml file and request flatland to respawn the them.
@@ -78,52 +185,121 @@ class ObstaclesManager:
         """
         assert os.path.isabs(
             model_yaml_file_path), "The yaml file path must be absolute path, otherwise flatland can't find it"
+        return self._register_obstacles([model_yaml_file_path] * num_obstacles, start_pos)
 
-        # the name of the model yaml file have the format {model_name}.model.yaml
-        model_name = os.path.basename(model_yaml_file_path).split('.')[0]
-        name_prefix = self._obstacle_name_prefix + '_' + model_name
-        count_same_type = sum(
-            1 if obstacle_name.startswith(name_prefix) else 0
-            for obstacle_name in self.obstacle_name_list)
-
-        for instance_idx in range(count_same_type, count_same_type + num_obstacles):
-            max_num_try = 2
-            i_curr_try = 0
-            while i_curr_try < max_num_try:
-                spawn_request = SpawnModelRequest()
-                spawn_request.yaml_path = model_yaml_file_path
-                spawn_request.name = f'{name_prefix}_{instance_idx:02d}'
-                spawn_request.ns = rospy.get_namespace()
-                # x, y, theta = get_random_pos_on_map(self._free_space_indices, self.map,)
-                # set the postion of the obstacle out of the map to hidden them
-                if len(start_pos) == 0:
-                    x = self.map.info.origin.position.x - 3 * \
-                        self.map.info.resolution * self.map.info.height
-                    y = self.map.info.origin.position.y - 3 * \
-                        self.map.info.resolution * self.map.info.width
-                    theta = theta = random.uniform(-math.pi, math.pi)
-                else:
-                    assert len(start_pos) == 3
-                    x = start_pos[0]
-                    y = start_pos[1]
-                    theta = start_pos[2]
-                spawn_request.pose.x = x
-                spawn_request.pose.y = y
-                spawn_request.pose.theta = theta
-                # try to call service
-                response = self._srv_spawn_model.call(spawn_request)
-                if not response.success:  # if service not succeeds, do something and redo service
-                    rospy.logwarn(
-                        f"spawn object {spawn_request.name} failed! trying again... [{i_curr_try+1}/{max_num_try} tried]")
-                    rospy.logwarn(response.message)
-                    i_curr_try += 1
-                else:
-                    self.obstacle_name_list.append(spawn_request.name)
-                    break
-            if i_curr_try == max_num_try:
-                raise rospy.ServiceException(f" failed to register obstacles")
+    def _register_obstacles(self, model_yaml_file_paths: List[str], start_pos: list = [], is_static: bool = False):
+        return self.register_obstacles_batch(model_yaml_file_paths, [start_pos] * len(model_yaml_file_paths), is_static)
+
+    def register_obstacles_batch(self, model_yaml_file_paths: List[str], start_poses: List[list], is_static: bool = False):
+        """spawn one obstacle per yaml file in a single batch.
+
+        Args:
+            model_yaml_file_paths (List[str]): absolute model file paths, the same file can be given repeatedly.
+            start_poses (List[list]): per obstacle a three-elementary list or an empty list, if it is empty, the
+                obstacle will be moved to the outside of the map.
+            is_static (bool, optional): the obstacles are static, parking them once is enough. Defaults to False.
+
+        Raises:
+            rospy.ServiceException: at least one obstacle couldn't be spawned, the others are registered.
+
+        Returns:
+            self.
+        """
+        assert len(model_yaml_file_paths) == len(start_poses)
+        spawn_requests = []
+        for model_yaml_file_path, start_pos in zip(model_yaml_file_paths, start_poses):
+            # the name of the model yaml file have the format {model_name}.model.yaml
+            model_name = os.path.basename(model_yaml_file_path).split('.')[0]
+            name_prefix = self._obstacle_name_prefix + '_' + model_name
+            instance_idx = sum(
+                1 if obstacle_name.startswith(name_prefix) else 0
+                for obstacle_name in self.obstacle_name_list + [request.name for request in spawn_requests])
+
+            spawn_request = SpawnModelRequest()
+            spawn_request.yaml_path = model_yaml_file_path
+            spawn_request.name = f'{name_prefix}_{instance_idx:02d}'
+            spawn_request.ns = self.ns_prefix if self.ns_prefix else rospy.get_namespace()
+            # set the postion of the obstacle out of the map to hidden them
+            if len(start_pos) == 0:
+                x = self.map.info.origin.position.x - 3 * \
+                    self.map.info.resolution * self.map.info.height
+                y = self.map.info.origin.position.y - 3 * \
+                    self.map.info.resolution * self.map.info.width
+                theta = random.uniform(-math.pi, math.pi)
+            else:
+                assert len(start_pos) == 3
+                x = start_pos[0]
+                y = start_pos[1]
+                theta = start_pos[2]
+            spawn_request.pose.x = x
+            spawn_request.pose.y = y
+            spawn_request.pose.theta = theta
+            spawn_requests.append(spawn_request)
+
+        failures = self._call_service_batch('spawn_model', SpawnModel, spawn_requests)
+        for spawn_request, start_pos in zip(spawn_requests, start_poses):
+            if spawn_request.name not in failures:
+                self.obstacle_name_list.append(spawn_request.name)
+                self._obstacle_radii[spawn_request.name] = get_model_radius(spawn_request.yaml_path)
+                self._last_poses[spawn_request.name] = (
+                    spawn_request.pose.x, spawn_request.pose.y, spawn_request.pose.theta)
+                if is_static:
+                    self._static_obstacle_names.add(spawn_request.name)
+                    if len(start_pos) == 0:
+                        self._parked_obstacle_names.add(spawn_request.name)
+        if failures:
+            raise rospy.ServiceException(f" failed to register obstacles: {failures}")
         return self
 
+    def _get_thread_service_proxy(self, service_name: str, service_class):
+        """persistent proxy of the service owned by the calling thread"""
+        proxies = self._thread_local.__dict__.setdefault('proxies', {})
+        if service_name not in proxies:
+            proxies[service_name] = rospy.ServiceProxy(
+                f'{self.ns_prefix}{service_name}', service_class, persistent=True)
+        return proxies[service_name]
+
+    def _call_service_batch(self, service_name: str, service_class, requests: list, max_num_try: int = 2) -> Dict[str, str]:
+        """call a flatland model service (spawn_model, move_model or delete_model) once per request. The calls
+        are issued concurrently, every request is retried up to max_num_try times like a single call.
+
+        Args:
+            service_name (str): name of the service without namespace
+            service_class: service type
+            requests (list): requests, the names of the models must be unique
+            max_num_try (int, optional): number of tries per request. Defaults to 2.
+
+        Returns:
+            Dict[str, str]: the names of the models whose requests failed in all tries mapped to the message of
+                the last try, empty if all requests succeeded.
+        """
+        def call(request):
+            message = ""
+            for i_curr_try in range(max_num_try):
+                try:
+                    response = self._get_thread_service_proxy(service_name, service_class).call(request)
+                except rospy.ServiceException as e:
+                    # the connection might be broken, the next try reconnects
+                    self._get_thread_service_proxy(service_name, service_class).close()
+                    del self._thread_local.proxies[service_name]
+                    message = repr(e)
+                else:
+                    if response.success:
+                        return None
+                    message = response.message
+                rospy.logwarn(
+                    f"{service_name} {request.name} failed! trying again... [{i_curr_try+1}/{max_num_try} tried]")
+                rospy.logwarn(message)
+            return message
+
+        if len(requests) > 1:
+            if self._batch_executor is None:
+                self._batch_executor = ThreadPoolExecutor(max_workers=self._max_parallel_calls)
+            messages = list(self._batch_executor.map(call, requests))
+        else:
+            messages = [call(request) for request in requests]
+        return {request.name: message for request, message in zip(requests, messages) if message is not None}
+
     def register_random_obstacles(self, num_obstacles: int, p_dynamic=0.5):
         """register static or dynamic obstacles.
 
@@ -153,12 +329,11 @@ class ObstaclesManager:
             min_obstacle_radius (float, optional): the minimum radius of the obstacle. Defaults to 0.5.
             max_obstacle_radius (float, optional): the maximum radius of the obstacle. Defaults to 0.5.
         """
-        for _ in range(num_obstacles):
-            model_path = self._generate_random_obstacle_yaml(
-                True, linear_velocity=linear_velocity, angular_velocity_max=angular_velocity_max,
-                min_obstacle_radius=min_obstacle_radius, max_obstacle_radius=max_obstacle_radius)
-            self.register_obstacles(1, model_path)
-            os.remove(model_path)
+        model_paths = [self._generate_random_obstacle_yaml(
+            True, linear_velocity=linear_velocity, angular_velocity_max=angular_velocity_max,
+            min_obstacle_radius=min_obstacle_radius, max_obstacle_radius=max_obstacle_radius)
+            for _ in range(num_obstacles)]
+        self._register_obstacles(model_paths)
 
     def register_random_static_obstacles(self, num_obstacles: int, num_vertices_min=3, num_vertices_max=6, min_obstacle_radius=0.5, max_obstacle_radius=2):
         """register static obstacles with polygon shape.
@@ -170,12 +345,11 @@ class ObstaclesManager:
             min_obstacle_radius (float, optional): the minimum radius of the obstacle. Defaults to 0.5.
             max_obstacle_radius (float, optional): the maximum radius of the obstacle. Defaults to 2.
         """
-        for _ in range(num_obstacles):
-            num_vertices = random.randint(num_vertices_min, num_vertices_max)
-            model_path = self._generate_random_obstacle_yaml(
-                False, num_vertices=num_vertices, min_obstacle_radius=min_obstacle_radius, max_obstacle_radius=max_obstacle_radius)
-            self.register_obstacles(1, model_path)
-            os.remove(model_path)
+        model_paths = [self._generate_random_obstacle_yaml(
+            False, num_vertices=random.randint(num_vertices_min, num_vertices_max),
+            min_obstacle_radius=min_obstacle_radius, max_obstacle_radius=max_obstacle_radius)
+            for _ in range(num_obstacles)]
+        self._register_obstacles(model_paths, is_static=True)
 
     def register_static_obstacle_polygon(self, vertices: np.ndarray):
         """register static obstacle with polygon shape
@@ -186,13 +360,11 @@ class ObstaclesManager:
         assert vertices.ndim == 2 and vertices.shape[0] >= 3 and vertices.shape[1] == 2
         model_path, start_pos = self._generate_static_obstacle_polygon_yaml(
             vertices)
-        self.register_obstacles(1, model_path, start_pos)
-        os.remove(model_path)
+        self._register_obstacles([model_path], start_pos, is_static=True)
 
     def register_static_obstacle_circle(self,x,y,circle):
         model_path= self._generate_static_obstacle_circle_yaml(circle)
-        self.register_obstacles(1, model_path, [x,y,0])
-        os.remove(model_path)
+        self._register_obstacles([model_path], [x,y,0], is_static=True)
 
     def register_dynamic_obstacle_circle_tween2(self, obstacle_name: str, obstacle_radius: float, linear_velocity: float, start_pos: Pose2D, waypoints: list, is_waypoint_relative: bool = True,  mode: str = "yoyo", trigger_zones: list = []):
         """register dynamic obstacle with circle shape. The trajectory of the obstacle is defined with the help of the plugin "tween2"
@@ -208,11 +380,30 @@ class ObstaclesManager:
             trigger_zones (list): a list of 3-elementary, every element (x,y,r) represent a circle zone with the center (x,y) and radius r. if its empty,
                 then the dynamic obstacle will keeping moving once it is spawned. Defaults to True.
         """
-        model_path, move_to_start_pub = self._generate_dynamic_obstacle_yaml_tween2(
+        model_path, move_to_start_pos_topic = self._generate_dynamic_obstacle_yaml_tween2(
             obstacle_name, obstacle_radius, linear_velocity, waypoints, is_waypoint_relative,  mode, trigger_zones)
-        self._move_all_obstacles_start_pos_pubs.append(move_to_start_pub)
+        self.add_move_to_start_pos_publisher(move_to_start_pos_topic)
         self.register_obstacles(1, model_path, start_pos)
-        os.remove(model_path)
+
+    def add_move_to_start_pos_publisher(self, move_to_start_pos_topic: str):
+        """create the publisher which moves an obstacle controlled by the plugin Tween2 to its start position (see
+        move_all_obstacles_to_start_pos_tween2)
+
+        Args:
+            move_to_start_pos_topic (str): the topic set in the model file, relative to the namespace
+        """
+        move_to_start_pos_pub = rospy.Publisher(
+            self.ns_prefix + move_to_start_pos_topic, Empty, queue_size=1)
+        self._move_all_obstacles_start_pos_pubs.append(move_to_start_pos_pub)
+        return move_to_start_pos_pub
+
+    def clear_move_to_start_pos_publishers(self):
+        """unregister the publishers created by add_move_to_start_pos_publisher, e.g. after their obstacles have been
+        deleted
+        """
+        for move_to_start_pos_pub in self._move_all_obstacles_start_pos_pubs:
+            move_to_start_pos_pub.unregister()
+        self._move_all_obstacles_start_pos_pubs = []
 
     def move_all_obstacles_to_start_pos_tween2(self):
         for move_obstacle_start_pos_pub in self._move_all_obstacles_start_pos_pubs:
@@ -239,18 +430,84 @@ class ObstaclesManager:
         srv_request.pose.theta = theta
 
         self._srv_move_model(srv_request)
+        self._parked_obstacle_names.discard(obstacle_name)
+        self._last_poses[obstacle_name] = (x, y, theta)
 
-    def reset_pos_obstacles_random(self, active_obstacle_rate: float = 1, forbidden_zones: Union[list, None] = None):
+    def move_obstacles(self, obstacle_names: List[str], poses: List[Pose2D]) -> Dict[str, str]:
+        """move many obstacles in a single batch, failed moves are retried once.
+
+        Args:
+            obstacle_names (List[str]): names of the obstacles
+            poses (List[Pose2D]): target poses, one per obstacle
+
+        Returns:
+            Dict[str, str]: the names of the obstacles which couldn't be moved mapped to the error message, empty if
+                all obstacles have been moved.
+        """
+        assert len(obstacle_names) == len(poses)
+        assert set(obstacle_names) <= set(self.obstacle_name_list), \
+            "can't move the obstacles because they have not spawned in the flatland"
+        move_requests = []
+        for obstacle_name, pose in zip(obstacle_names, poses):
+            move_request = MoveModelRequest()
+            move_request.name = obstacle_name
+            move_request.pose = pose
+            move_requests.append(move_request)
+        failures = self._call_service_batch('move_model', MoveModel, move_requests)
+        self._parked_obstacle_names.difference_update(set(obstacle_names) - set(failures))
+        for obstacle_name, pose in zip(obstacle_names, poses):
+            if obstacle_name not in failures:
+                self._last_poses[obstacle_name] = (pose.x, pose.y, pose.theta)
+        return failures
+
+    def set_enabled_obstacles(self, obstacle_names: Union[list, None] = None):
+        """restrict the obstacles which are placed in the map by reset_pos_obstacles_random, the other obstacles
+        stay parked outside of the map. This allows to change the number of obstacles without spawning or deleting
+        any of them.
+
+        Args:
+            obstacle_names (Union[list, None], optional): names of the enabled obstacles, None enables all
+                obstacles. Defaults to None.
+        """
+        if obstacle_names is None:
+            self._enabled_obstacle_names = None
+        else:
+            assert set(obstacle_names) <= set(self.obstacle_name_list), \
+                "can't enable the obstacles because they have not spawned in the flatland"
+            self._enabled_obstacle_names = set(obstacle_names)
+
+    def reset_pos_obstacles_random(self, active_obstacle_rate: float = 1, forbidden_zones: Union[list, None] = None,
+                                   reshuffle_rate: float = 1):
         """randomly set the position of all the obstacles. In order to dynamically control the number of the obstacles within the
         map while keep the efficiency. we can set the parameter active_obstacle_rate so that the obstacles non-active will moved to the
         outside of the map
 
+        Only the obstacles whose state changes are moved, i.e. static obstacles which are already parked outside of
+        the map stay there and with reshuffle_rate < 1 a part of the static obstacles keeps its position.
+
         Args:
-            active_obstacle_rate (float): a parameter change the number of the obstacles within the map
+            active_obstacle_rate (float): a parameter change the number of the obstacles within the map, it's
+                relative to the enabled obstacles (see set_enabled_obstacles).
             forbidden_zones (list): a list of tuples with the format (x,y,r),where the the obstacles should not be reset.
+                The obstacles are placed without overlapping the forbidden zones or each other (see
+                MapIndex.sample_separated_positions).
+            reshuffle_rate (float, optional): fraction of the static obstacles which were already active in the last
+                episode that get a new position, the others stay where they are unless they overlap the forbidden
+                zones. The obstacles which were active are preferably kept active. Dynamic obstacles always get a new
+                position since they have moved meanwhile. Defaults to 1.
         """
-        active_obstacle_names = random.sample(self.obstacle_name_list, int(
-            len(self.obstacle_name_list) * active_obstacle_rate))
+        enabled_obstacle_names = [name for name in self.obstacle_name_list
+                                  if self._enabled_obstacle_names is None or name in self._enabled_obstacle_names]
+        num_active_obstacles = int(len(enabled_obstacle_names) * active_obstacle_rate)
+        if reshuffle_rate < 1:
+            # keep the active obstacles active as far as possible, switching them costs two moves
+            were_active = [name for name in enabled_obstacle_names if name in self._active_obstacle_names]
+            were_non_active = [name for name in enabled_obstacle_names if name not in self._active_obstacle_names]
+            random.shuffle(were_active)
+            random.shuffle(were_non_active)
+            active_obstacle_names = (were_active + were_non_active)[:num_active_obstacles]
+        else:
+            active_obstacle_names = random.sample(enabled_obstacle_names, num_active_obstacles)
         non_active_obstacle_names = set(
             self.obstacle_name_list) - set(active_obstacle_names)
 
@@ -261,24 +518,46 @@ class ObstaclesManager:
             resolution * self.map.info.width
         pos_non_active_obstacle.y = self.map.info.origin.position.y - \
             resolution * self.map.info.width
-
-        for obstacle_name in active_obstacle_names:
-            move_model_request = MoveModelRequest()
-            move_model_request.name = obstacle_name
-            # TODO 0.2 is the obstacle radius. it should be set automatically in future.
-            move_model_request.pose.x, move_model_request.pose.y, move_model_request.pose.theta = get_random_pos_on_map(
-                self._free_space_indices, self.map, 0.2, forbidden_zones)
-
-            self._srv_move_model(move_model_request)
-
-        for non_active_obstacle_name in non_active_obstacle_names:
-            move_model_request = MoveModelRequest()
-            move_model_request.name = non_active_obstacle_name
-            move_model_request.pose = pos_non_active_obstacle
-            self._srv_move_model(move_model_request)
-
-    def _generate_dynamic_obstacle_yaml_tween2(self, obstacle_name: str, obstacle_radius: float, linear_velocity: float, waypoints: list, is_waypoint_relative: bool,  mode: str, trigger_zones: list):
-        """generate a yaml file in which the movement of the obstacle is controller by the plugin tween2
+        # static obstacles which are already outside of the map don't need to be moved again, dynamic ones
+        # are moved back since they keep walking around.
+        non_active_obstacle_names = [name for name in self.obstacle_name_list
+                                     if name in non_active_obstacle_names and name not in self._parked_obstacle_names]
+
+        # static obstacles which stay at their position of the last episode
+        kept_obstacle_names = []
+        if reshuffle_rate < 1:
+            forbidden_zones_array = np.asarray(forbidden_zones or [], dtype=np.float64).reshape(-1, 3)
+            keep_candidates = []
+            for name in active_obstacle_names:
+                if name not in self._static_obstacle_names or name not in self._active_obstacle_names:
+                    continue
+                x, y, _ = self._last_poses[name]
+                if np.all(np.hypot(forbidden_zones_array[:, 0] - x, forbidden_zones_array[:, 1] - y) >=
+                          forbidden_zones_array[:, 2] + self._obstacle_radii[name]):
+                    keep_candidates.append(name)
+            kept_obstacle_names = random.sample(
+                keep_candidates, int(round(len(keep_candidates) * (1 - reshuffle_rate))))
+        kept_obstacle_name_set = set(kept_obstacle_names)
+        moved_obstacle_names = [name for name in active_obstacle_names if name not in kept_obstacle_name_set]
+
+        # the obstacles keep a distance of their radius to the walls, the forbidden zones and each other
+        radii = [self._obstacle_radii.get(name, 0.2) for name in moved_obstacle_names]
+        placed_obstacles = [self._last_poses[name][:2] + (self._obstacle_radii[name],) for name in kept_obstacle_names]
+        poses = [Pose2D(*pos) for pos in self._map_index.sample_separated_positions(
+            radii, forbidden_zones, placed_obstacles=placed_obstacles).tolist()]
+        poses += [pos_non_active_obstacle] * len(non_active_obstacle_names)
+
+        failures = self.move_obstacles(moved_obstacle_names + non_active_obstacle_names, poses)
+        self._parked_obstacle_names.update(
+            set(non_active_obstacle_names) & self._static_obstacle_names - set(failures))
+        self._active_obstacle_names = set(active_obstacle_names) - set(failures)
+        if failures:
+            raise rospy.ServiceException(f"failed to reset the obstacles: {failures}")
+
+    @staticmethod
+    def _generate_dynamic_obstacle_yaml_tween2(obstacle_name: str, obstacle_radius: float, linear_velocity: float, waypoints: list, is_waypoint_relative: bool,  mode: str, trigger_zones: list):
+        """generate a yaml file in which the movement of the obstacle is controller by the plugin tween2, the file
+        doesn't depend on the namespace of the simulation.
 
         Args:
             obstacle_name (str): [description]
@@ -290,17 +569,12 @@ class ObstaclesManager:
             trigger_zones (list): a list of 3-elementary, every element (x,y,r) represent a circle zone with the center (x,y) and radius r. if its empty,
                 then the dynamic obstacle will keeping moving once it is spawned. Defaults to True.
         Returns:
-            [type]: [description]
+            yaml_path, move_to_start_pos_topic
         """
         for i, way_point in enumerate(waypoints):
             if len(way_point) != 3:
                 raise ValueError(
                     f"ways points must a list of 3-elementary list, However the {i}th way_point is {way_point}")
-        tmp_folder_path = os.path.join(rospkg.RosPack().get_path(
-            'simulator_setup'), 'tmp_random_obstacles')
-        os.makedirs(tmp_folder_path, exist_ok=True)
-        tmp_model_name = "dynamic_with_traj.model.yaml"
-        yaml_path = os.path.join(tmp_folder_path, tmp_model_name)
         # define body
         body = {}
         body["name"] = "object_with_traj"
@@ -331,8 +605,6 @@ class ObstaclesManager:
         # we can not use the flatland provided service to move the object, othewise the Tween2 will not work properly.
         move_with_traj['move_to_start_pos_topic'] = obstacle_name + \
             '/move_to_start_pos'
-        move_to_start_pos_pub = rospy.Publisher(
-            move_with_traj['move_to_start_pos_topic'], Empty, queue_size=1)
         move_with_traj['waypoints'] = waypoints
         move_with_traj['is_waypoint_relative'] = is_waypoint_relative
         move_with_traj['mode'] = mode
@@ -341,17 +613,12 @@ class ObstaclesManager:
         move_with_traj['robot_odom_topic'] = 'odom'
         dict_file['plugins'].append(move_with_traj)
 
-        with open(yaml_path, 'w') as fd:
-            yaml.dump(dict_file, fd)
-        return yaml_path, move_to_start_pos_pub
-
-    def _generate_static_obstacle_polygon_yaml(self, vertices):
-        # since flatland  can only config the model by parsing the yaml file, we need to create a file for every random obstacle
-        tmp_folder_path = os.path.join(rospkg.RosPack().get_path(
-            'simulator_setup'), 'tmp_random_obstacles')
-        os.makedirs(tmp_folder_path, exist_ok=True)
-        tmp_model_name = "polygon_static.model.yaml"
-        yaml_path = os.path.join(tmp_folder_path, tmp_model_name)
+        yaml_path = write_model_yaml(dict_file, "dynamic_with_traj")
+        return yaml_path, move_with_traj['move_to_start_pos_topic']
+
+    @staticmethod
+    def _generate_static_obstacle_polygon_yaml(vertices):
+        # since flatland  can only config the model by parsing the yaml file, every model needs a (cached) file
         # define body
         body = {}
         body["name"] = "static_object"
@@ -380,17 +647,12 @@ class ObstaclesManager:
         body["footprints"].append(f)
         # define dict_file
         dict_file = {'bodies': [body]}
-        with open(yaml_path, 'w') as fd:
-            yaml.dump(dict_file, fd)
+        yaml_path = write_model_yaml(dict_file, "polygon_static")
         return yaml_path, obstacle_center
 
-    def _generate_static_obstacle_circle_yaml(self,radius):
-        # since flatland  can only config the model by parsing the yaml file, we need to create a file for every random obstacle
-        tmp_folder_path = os.path.join(rospkg.RosPack().get_path(
-            'simulator_setup'), 'tmp_random_obstacles')
-        os.makedirs(tmp_folder_path, exist_ok=True)
-        tmp_model_name = "circle_static.model.yaml"
-        yaml_path = os.path.join(tmp_folder_path, tmp_model_name)
+    @staticmethod
+    def _generate_static_obstacle_circle_yaml(radius):
+        # since flatland  can only config the model by parsing the yaml file, every model needs a (cached) file
         # define body
         body = {}
         body["name"] = "static_object"
@@ -411,9 +673,7 @@ class ObstaclesManager:
         body["footprints"].append(f)
         # define dict_file
         dict_file = {'bodies': [body]}
-        with open(yaml_path, 'w') as fd:
-            yaml.dump(dict_file, fd)
-        return yaml_path
+        return write_model_yaml(dict_file, "circle_static")
 
     def _generate_random_obstacle_yaml(self,
                                        is_dynamic=False,
@@ -436,15 +696,7 @@ class ObstaclesManager:
             max_obstacle_radius (float, optional): Defaults to 1.5.
         """
 
-        # since flatland  can only config the model by parsing the yaml file, we need to create a file for every random obstacle
-        tmp_folder_path = os.path.join(rospkg.RosPack().get_path(
-            'simulator_setup'), 'tmp_random_obstacles')
-        os.makedirs(tmp_folder_path, exist_ok=True)
-        if is_dynamic:
-            tmp_model_name = "random_dynamic.model.yaml"
-        else:
-            tmp_model_name = "random_static.model.yaml"
-        yaml_path = os.path.join(tmp_folder_path, tmp_model_name)
+        # since flatland  can only config the model by parsing the yaml file, every model needs a (cached) file
         # define body
         body = {}
         body["name"] = "random"
@@ -497,9 +749,7 @@ class ObstaclesManager:
             random_move['body'] = 'random'
             dict_file['plugins'].append(random_move)
 
-        with open(yaml_path, 'w') as fd:
-            yaml.dump(dict_file, fd)
-        return yaml_path
+        return write_model_yaml(dict_file, "random_dynamic" if is_dynamic else "random_static")
 
     def remove_obstacle(self, name: str):
         if len(self.obstacle_name_list) != 0:
@@ -514,6 +764,36 @@ class ObstaclesManager:
         else:
             rospy.logdebug(f"Removed the obstacle with the name {name}")
 
+    def delete_obstacles(self, names: List[str]) -> Dict[str, str]:
+        """delete many obstacles in a single batch, failed deletions are retried once. The deleted obstacles are
+        unregistered.
+
+        Args:
+            names (List[str]): names of the obstacles
+
+        Returns:
+            Dict[str, str]: the names of the obstacles which couldn't be deleted mapped to the error message, empty
+                if all obstacles have been deleted.
+        """
+        delete_requests = []
+        for name in names:
+            delete_request = DeleteModelRequest()
+            delete_request.name = name
+            delete_requests.append(delete_request)
+        failures = self._call_service_batch('delete_model', DeleteModel, delete_requests)
+        deleted_names = set(names) - set(failures)
+        self.obstacle_name_list = [name for name in self.obstacle_name_list if name not in deleted_names]
+        self._static_obstacle_names -= deleted_names
+        self._parked_obstacle_names -= deleted_names
+        self._active_obstacle_names -= deleted_names
+        for name in deleted_names:
+            self._obstacle_radii.pop(name, None)
+            self._last_poses.pop(name, None)
+        if self._enabled_obstacle_names is not None:
+            self._enabled_obstacle_names -= deleted_names
+        rospy.logdebug(f"Removed {len(deleted_names)} obstacles")
+        return failures
+
     def remove_obstacles(self, prefix_names: Union[list, None] = None):
         """remove all the obstacless belong to specific groups.
         Args:
@@ -529,17 +809,14 @@ class ObstaclesManager:
             r = re.compile(re_pattern)
             to_be_removed_obstacles_names = list(
                 filter(r.match, self.obstacle_name_list))
-            for n in to_be_removed_obstacles_names:
-                self.remove_obstacle(n)
-            self.obstacle_name_list = list(
-                set(self.obstacle_name_list)-set(to_be_removed_obstacles_names))
         else:
             # it possible that in flatland there are still obstacles remaining when we create an instance of
             # this class.
-            topics = rospy.get_published_topics()
-            for t in topics:
-                # the format of the topic is (topic_name,message_name)
-                topic_name = t[0]
-                object_name = topic_name.split("/")[-1]
-                if object_name.startswith(self._obstacle_name_prefix):
-                    self.remove_obstacle(object_name)
+            topics = rospy.get_published_topics(
+                self.ns_prefix if self.ns_prefix else '/')
+            # the format of the topic is (topic_name,message_name)
+            to_be_removed_obstacles_names = list({t[0].split("/")[-1] for t in topics
+                                                  if t[0].split("/")[-1].startswith(self._obstacle_name_prefix)})
+        failures = self.delete_obstacles(to_be_removed_obstacles_names)
+        if failures:
+            raise rospy.ServiceException(f"failed to remove the obstacles: {failures}")
@@ -12,7 +12,7 @@ from geometry_msgs.msg import Pose2D, PoseWithCovarianceStamped, PoseStamped
 
 from nav_msgs.msg import OccupancyGrid, Path
 
-from .utils import generate_freespace_indices, get_random_pos_on_map
+from .utils import NoReachableGoalError, get_map_index
 
 
 class RobotManager:
@@ -21,22 +21,27 @@ class RobotManager:
     is managed
     """
 
-    def __init__(self, map_: OccupancyGrid, robot_yaml_path: str, is_training_mode: bool):
+    def __init__(self, map_: OccupancyGrid, robot_yaml_path: str, is_training_mode: bool, ns: str = None):
         """[summary]
 
         Args:
             map_ (OccupancyGrid): the map info
             robot_yaml_path (str): the file name of the robot yaml file.
             is_training_mode (bool): a flag to indicate the mode (training or test)
+            ns (str, optional): namespace of the simulation instance. Defaults to None (global namespace).
         """
+        self.ns = ns
+        self.ns_prefix = "" if ns is None or ns == "" else "/"+ns+"/"
+        # the frames of namespaced simulation instances are prefixed with the namespace
+        self.global_frame_id = "map" if ns is None or ns == "" else ns+"/map"
         self.is_training_mode = is_training_mode
         self._get_robot_configration(robot_yaml_path)
         # setup proxy to handle  services provided by flatland
-        rospy.wait_for_service('move_model', timeout=20)
+        rospy.wait_for_service(f'{self.ns_prefix}move_model', timeout=20)
         #rospy.wait_for_service('step_world', timeout=20)
-        self._srv_move_model = rospy.ServiceProxy('move_model', MoveModel)
+        self._srv_move_model = rospy.ServiceProxy(f'{self.ns_prefix}move_model', MoveModel)
         # it's only needed in training mode to send the clock signal.
-        self._step_world = rospy.ServiceProxy("step_world", StepWorld)
+        self._step_world = rospy.ServiceProxy(f'{self.ns_prefix}step_world', StepWorld)
 
         # subcriber
         # self._global_path_sub = rospy.Subscriber(
@@ -49,7 +54,7 @@ class RobotManager:
         # self._initialpose_pub = rospy.Publisher(
         #     'initialpose', PoseWithCovarianceStamped, queue_size=1)
         self._goal_pub = rospy.Publisher(
-            '/goal', PoseStamped, queue_size=1, latch=True)
+            f'{self.ns_prefix}goal', PoseStamped, queue_size=1, latch=True)
 
         self.update_map(map_)
 
@@ -85,8 +90,8 @@ class RobotManager:
 
     def update_map(self, new_map: OccupancyGrid):
         self.map = new_map
-        # a tuple stores the indices of the non-occupied spaces. format ((y,....),(x,...)
-        self._free_space_indices = generate_freespace_indices(self.map)
+        # free space of the map for sampling the start and goal positions
+        self._map_index = get_map_index(self.map)
 
     def move_robot(self, pose: Pose2D):
         """move the robot to a given position
@@ -114,19 +119,24 @@ class RobotManager:
 
     def set_start_pos_random(self):
         start_pos = Pose2D()
-        start_pos.x, start_pos, start_pos.theta = get_random_pos_on_map(
-            self._free_space_indices, self.map, self.ROBOT_RADIUS)
+        start_pos.x, start_pos.y, start_pos.theta = self._map_index.get_random_pos(self.ROBOT_RADIUS)
         self.move_robot(start_pos)
 
     def set_start_pos_goal_pos(self, start_pos: Union[Pose2D, None]
-                               = None, goal_pos: Union[Pose2D, None] = None, min_dist=1):
-        """set up start position and the goal postion. Path validation checking will be conducted. If it failed, an
-        exception will be raised.
+                               = None, goal_pos: Union[Pose2D, None] = None, min_dist=1,
+                               min_path_length: float = None, max_path_length: float = None):
+        """set up start position and the goal postion. A random goal is drawn from the positions which the robot
+        can reach from the start position (checked on the map inflated by the robot radius), so no path planner
+        is needed. If no valid pair is found, an exception will be raised.
 
         Args:
             start_pos (Union[Pose2D,None], optional): start position. if None, it will be set randomly. Defaults to None.
             goal_pos (Union[Pose2D,None], optional): [description]. if None, it will be set randomly .Defaults to None.
             min_dist (float): minimum distance between start_pos and goal_pos
+            min_path_length (float, optional): minimum length of the path between random start and goal
+                positions, approximated on a coarse grid. Defaults to None.
+            max_path_length (float, optional): maximum length of the path between random start and goal
+                positions, approximated on a coarse grid. Defaults to None.
         Exception:
             Exception("can not generate a path with the given start position and the goal position of the robot")
         """
@@ -135,7 +145,7 @@ class RobotManager:
             return math.sqrt((x1 - x2)**2 + (y1 - y2)**2)
 
         if start_pos is None or goal_pos is None:
-            # if any of them need to be random generated, we set a higher threshold,otherwise only try once
+            # the goal is drawn from the reachable positions, a retry is only needed if there is no such position
             max_try_times = 20
         else:
             max_try_times = 1
@@ -147,28 +157,35 @@ class RobotManager:
 
             if start_pos is None:
                 start_pos_ = Pose2D()
-                start_pos_.x, start_pos_.y, start_pos_.theta = get_random_pos_on_map(
-                    self._free_space_indices, self.map, self.ROBOT_RADIUS * 2)
+                start_pos_.x, start_pos_.y, start_pos_.theta = self._map_index.get_random_pos(self.ROBOT_RADIUS * 2)
             else:
                 start_pos_ = start_pos
             if goal_pos is None:
                 goal_pos_ = Pose2D()
-                goal_pos_.x, goal_pos_.y, goal_pos_.theta = get_random_pos_on_map(
-                    self._free_space_indices, self.map, self.ROBOT_RADIUS * 4)
+                try:
+                    goal_pos_.x, goal_pos_.y, goal_pos_.theta = self._map_index.sample_reachable_goal(
+                        (start_pos_.x, start_pos_.y), self.ROBOT_RADIUS * 4, self.ROBOT_RADIUS, min_dist,
+                        min_path_length, max_path_length)
+                except NoReachableGoalError:
+                    i_try += 1
+                    continue
             else:
                 goal_pos_ = goal_pos
+                if not self._map_index.is_reachable((start_pos_.x, start_pos_.y), (goal_pos_.x, goal_pos_.y), self.ROBOT_RADIUS):
+                    if start_pos is not None:
+                        # a given pair is used anyway
+                        rospy.logwarn("the goal position can't be reached from the start position of the robot")
+                    else:
+                        i_try += 1
+                        continue
 
             if dist(start_pos_.x, start_pos_.y, goal_pos_.x, goal_pos_.y) < min_dist:
                 i_try += 1
                 continue
             # move the robot to the start pos
             self.move_robot(start_pos_)
-            try:
-                # publish the goal, if the gobal plath planner can't generate a path, a, exception will be raised.
-                self.publish_goal(goal_pos_.x, goal_pos_.y, goal_pos_.theta)
-                break
-            except rospy.ServiceException:
-                i_try += 1
+            self.publish_goal(goal_pos_.x, goal_pos_.y, goal_pos_.theta)
+            break
         if i_try == max_try_times:
             # TODO Define specific type of Exception
             raise rospy.ServiceException(
@@ -202,7 +219,7 @@ class RobotManager:
         """
         initpose = PoseWithCovarianceStamped()
         initpose.header.stamp = rospy.get_rostime()
-        initpose.header.frame_id = "map"
+        initpose.header.frame_id = self.global_frame_id
         initpose.pose.pose.position.x = x
         initpose.pose.pose.position.y = y
         quaternion = tf.transformations.quaternion_from_euler(0, 0, theta)
@@ -223,7 +240,7 @@ class RobotManager:
         self._old_global_path_timestamp = self._global_path.header.stamp
         goal = PoseStamped()
         goal.header.stamp = rospy.get_rostime()
-        goal.header.frame_id = "map"
+        goal.header.frame_id = self.global_frame_id
         goal.pose.position.x = x
         goal.pose.position.y = y
         quaternion = tf.transformations.quaternion_from_euler(0, 0, 0)
@@ -0,0 +1,175 @@
+"""Compiles the scenerio json files of the ScenerioTask into cached artifacts.
+
+A compiled scenerio contains the model files of its obstacles (already generated), the start poses, waypoints and
+trigger zones as numeric arrays and the robot's start and goal pose. The json file is validated once while it's
+compiled, loading a new scenerio then only needs to spawn the obstacles. The artifacts are stored next to the
+generated model files, keyed by a hash of the json file, and are recompiled when the file changes.
+"""
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from .obstacles_manager import ObstaclesManager, get_model_cache_folder
+
+# must be increased whenever the format of the compiled scenerios changes
+COMPILED_FORMAT_VERSION = 2
+
+# path of the json file -> (mtime, size, compiled scenerios) of the process
+_compiled_scenerios = {}
+_compiled_scenerios_lock = threading.Lock()
+
+
+def compile_scenerios(scenerios_json_path: str) -> list:
+    """validate the scenerios of the json file and generate the model files of their obstacles.
+
+    Args:
+        scenerios_json_path (str): json file with the section "scenerios" (see
+            ScenerioTask.generate_scenerios_json_example)
+
+    Raises:
+        ValueError: the file contains an invalid scenerio
+
+    Returns:
+        list: the compiled scenerios, json serializable
+    """
+    with open(scenerios_json_path) as f:
+        scenerios_data = json.load(f)["scenerios"]
+    return [_compile_scenerio(scenerio_data) for scenerio_data in scenerios_data]
+
+
+def _compile_scenerio(scenerio_data: dict) -> dict:
+    scenerio_name = scenerio_data['scene_name']
+    static_obstacles = {'yaml_paths': [], 'start_poses': []}
+    for obstacle_name, obstacle_data in scenerio_data["static_obstacles"].items():
+        if obstacle_data['shape'] == 'circle':
+            yaml_path = ObstaclesManager._generate_static_obstacle_circle_yaml(obstacle_data['radius'])
+            start_pos = [obstacle_data['x'], obstacle_data['y'], 0]
+        # vertices uses global coordinate system, the order of the vertices is doesn't matter
+        elif obstacle_data['shape'] == 'polygon':
+            vertices = np.array(obstacle_data["vertices"], dtype=np.float64)
+            if vertices.ndim != 2 or vertices.shape[0] < 3 or vertices.shape[1] != 2:
+                raise ValueError(
+                    f"The static obstacle [{obstacle_name}] of scene {scenerio_name} needs at least 3 vertices (x,y)")
+            yaml_path, start_pos = ObstaclesManager._generate_static_obstacle_polygon_yaml(vertices)
+        else:
+            raise ValueError(f"Shape {obstacle_data['shape']} is not supported, supported shape 'circle' OR 'polygon'")
+        static_obstacles['yaml_paths'].append(yaml_path)
+        static_obstacles['start_poses'].append([float(v) for v in start_pos])
+
+    watchers_dict = scenerio_data.get('watchers', {})
+    dynamic_obstacles = {'yaml_paths': [], 'start_poses': [], 'move_to_start_pos_topics': [], 'waypoints': [],
+                         'trigger_zones': []}
+    for obstacle_name, obstacle_data in scenerio_data["dynamic_obstacles"].items():
+        # currently dynamic obstacle only has circle shape
+        trigger_zones = []
+        for trigger in obstacle_data.get('triggers', []):
+            if trigger not in watchers_dict:
+                raise ValueError(
+                    f"For dynamic obstacle [{obstacle_name}] the trigger: {trigger} not found in the corresponding 'watchers' dict for scene {scenerio_name} ")
+            trigger_zones.append(watchers_dict[trigger]['pos'] + [watchers_dict[trigger]['range']])
+        if len(obstacle_data["start_pos"]) != 3:
+            raise ValueError(
+                f"The start_pos of the dynamic obstacle [{obstacle_name}] of scene {scenerio_name} must be a 3-elementary list")
+        yaml_path, move_to_start_pos_topic = ObstaclesManager._generate_dynamic_obstacle_yaml_tween2(
+            obstacle_name, obstacle_data["obstacle_radius"], obstacle_data['linear_velocity'],
+            obstacle_data["waypoints"], obstacle_data["is_waypoint_relative"], obstacle_data["mode"], trigger_zones)
+        dynamic_obstacles['yaml_paths'].append(yaml_path)
+        dynamic_obstacles['start_poses'].append([float(v) for v in obstacle_data["start_pos"]])
+        dynamic_obstacles['move_to_start_pos_topics'].append(move_to_start_pos_topic)
+        dynamic_obstacles['waypoints'].append(obstacle_data["waypoints"])
+        dynamic_obstacles['trigger_zones'].append(trigger_zones)
+
+    robot_data = scenerio_data["robot"]
+    for key in ["start_pos", "goal_pos"]:
+        if len(robot_data[key]) != 3:
+            raise ValueError(f"The robot's {key} of scene {scenerio_name} must be a 3-elementary list")
+    return {'scene_name': scenerio_name,
+            'repeats': scenerio_data["repeats"],
+            'static_obstacles': static_obstacles,
+            'dynamic_obstacles': dynamic_obstacles,
+            'watchers': watchers_dict,
+            'robot': {'start_pos': robot_data["start_pos"], 'goal_pos': robot_data["goal_pos"]},
+            # needed to regenerate evicted model files
+            'source': scenerio_data}
+
+
+def _to_arrays(compiled_scenerio: dict) -> dict:
+    """convert the poses, waypoints and trigger zones of a loaded scenerio to numpy arrays"""
+    static_obstacles = compiled_scenerio['static_obstacles']
+    static_obstacles['start_poses'] = np.array(static_obstacles['start_poses'], dtype=np.float64).reshape(-1, 3)
+    dynamic_obstacles = compiled_scenerio['dynamic_obstacles']
+    dynamic_obstacles['start_poses'] = np.array(dynamic_obstacles['start_poses'], dtype=np.float64).reshape(-1, 3)
+    dynamic_obstacles['waypoints'] = [np.array(waypoints, dtype=np.float64).reshape(-1, 3)
+                                      for waypoints in dynamic_obstacles['waypoints']]
+    dynamic_obstacles['trigger_zones'] = [np.array(zones, dtype=np.float64).reshape(-1, 3)
+                                          for zones in dynamic_obstacles['trigger_zones']]
+    robot = compiled_scenerio['robot']
+    robot['start_pos'] = np.array(robot['start_pos'], dtype=np.float64)
+    robot['goal_pos'] = np.array(robot['goal_pos'], dtype=np.float64)
+    return compiled_scenerio
+
+
+def _model_files_exist(compiled_scenerios: list) -> bool:
+    """check that the model files haven't been evicted and mark them as recently used"""
+    for compiled_scenerio in compiled_scenerios:
+        for obstacles in [compiled_scenerio['static_obstacles'], compiled_scenerio['dynamic_obstacles']]:
+            for yaml_path in obstacles['yaml_paths']:
+                try:
+                    os.utime(yaml_path)
+                except FileNotFoundError:
+                    return False
+    return True
+
+
+def ensure_model_files(compiled_scenerio: dict):
+    """regenerate the model files of a compiled scenerio which have been evicted from the cache meanwhile, the
+    paths don't change since they only depend on the content.
+    """
+    if not _model_files_exist([compiled_scenerio]):
+        _compile_scenerio(compiled_scenerio['source'])
+
+
+def load_compiled_scenerios(scenerios_json_path: str) -> list:
+    """the compiled scenerios of the json file. They are compiled only if the file has changed since the last
+    compilation (by any process), within a process the file is only hashed again when its mtime or size change.
+
+    Args:
+        scenerios_json_path (str): json file with the section "scenerios"
+
+    Returns:
+        list: the compiled scenerios with numpy arrays for the poses, waypoints and trigger zones
+    """
+    scenerios_json_path = os.path.abspath(scenerios_json_path)
+    stat = os.stat(scenerios_json_path)
+    with _compiled_scenerios_lock:
+        cached = _compiled_scenerios.get(scenerios_json_path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size) and _model_files_exist(cached[2]):
+            return cached[2]
+
+        with open(scenerios_json_path, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()[:16]
+        artifact_folder = os.path.join(get_model_cache_folder(), 'compiled_scenerios')
+        os.makedirs(artifact_folder, exist_ok=True)
+        artifact_path = os.path.join(
+            artifact_folder,
+            f"{os.path.basename(scenerios_json_path).split('.')[0]}.{digest}.v{COMPILED_FORMAT_VERSION}.json")
+        compiled_scenerios = None
+        if os.path.isfile(artifact_path):
+            with open(artifact_path) as f:
+                compiled_scenerios = json.load(f)
+            if not _model_files_exist(compiled_scenerios):
+                compiled_scenerios = None
+        if compiled_scenerios is None:
+            compiled_scenerios = compile_scenerios(scenerios_json_path)
+            # the folder is shared by all simulation instances, the file is renamed atomically
+            tmp_path = f"{artifact_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(compiled_scenerios, f)
+            os.replace(tmp_path, artifact_path)
+
+        compiled_scenerios = [_to_arrays(compiled_scenerio) for compiled_scenerio in compiled_scenerios]
+        _compiled_scenerios[scenerios_json_path] = (stat.st_mtime_ns, stat.st_size, compiled_scenerios)
+        return compiled_scenerios
@@ -1,7 +1,10 @@
 import os
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from threading import Condition, Lock
 
+import rosgraph
 import rospy
 import rospkg
 import json
@@ -10,10 +13,13 @@ import numpy as np
 from nav_msgs.msg import OccupancyGrid
 from nav_msgs.srv import GetMap
 from geometry_msgs.msg import Pose2D
+from std_msgs.msg import Empty
 from rospy.exceptions import ROSException
 
 from .obstacles_manager import ObstaclesManager
 from .robot_manager import RobotManager
+from .scenerio_compiler import ensure_model_files, load_compiled_scenerios
+from .utils import get_map_index
 from pathlib import Path
 
 
@@ -29,9 +35,14 @@ class ABSTask(ABC):
     def __init__(self, obstacles_manager: ObstaclesManager, robot_manager: RobotManager):
         self.obstacles_manager = obstacles_manager
         self.robot_manager = robot_manager
-        self._service_client_get_map = rospy.ServiceProxy("static_map", GetMap)
+        # both managers are bound to the same simulation instance
+        self.ns_prefix = robot_manager.ns_prefix
+        self._service_client_get_map = rospy.ServiceProxy(
+            f"{self.ns_prefix}static_map", GetMap)
         self._map_lock = Lock()
-        rospy.Subscriber("map", OccupancyGrid, self._update_map)
+        # the map index shared with the managers, see task_generator.utils.get_map_index
+        self._map_index = get_map_index(robot_manager.map)
+        rospy.Subscriber(f"{self.ns_prefix}map", OccupancyGrid, self._update_map)
         # a mutex keep the map is not unchanged during reset task.
 
     @abstractmethod
@@ -41,6 +52,11 @@ class ABSTask(ABC):
         """
 
     def _update_map(self, map_: OccupancyGrid):
+        # the map is usually republished unchanged, e.g. when a new node subscribes to it
+        map_index = get_map_index(map_)
+        if map_index is self._map_index:
+            return
+        self._map_index = map_index
         with self._map_lock:
             self.obstacles_manager.update_map(map_)
             self.robot_manager.update_map(map_)
@@ -50,8 +66,15 @@ class RandomTask(ABSTask):
     """ Evertime the start position and end position of the robot is reset.
     """
 
-    def __init__(self, obstacles_manager: ObstaclesManager, robot_manager: RobotManager):
+    def __init__(self, obstacles_manager: ObstaclesManager, robot_manager: RobotManager, reshuffle_rate: float = 1):
+        """
+        Args:
+            reshuffle_rate (float, optional): fraction of the static obstacles which get a new position every
+                episode, the others stay where they are (see ObstaclesManager.reset_pos_obstacles_random).
+                Defaults to 1.
+        """
         super().__init__(obstacles_manager, robot_manager)
+        self._reshuffle_rate = reshuffle_rate
 
     def reset(self):
         """[summary]
@@ -69,7 +92,8 @@ class RandomTask(ABSTask):
                                 self.robot_manager.ROBOT_RADIUS),
                             (goal_pos.x,
                                 goal_pos.y,
-                                self.robot_manager.ROBOT_RADIUS)])
+                                self.robot_manager.ROBOT_RADIUS)],
+                        reshuffle_rate=self._reshuffle_rate)
                     break
                 except rospy.ServiceException as e:
                     rospy.logwarn(repr(e))
@@ -119,8 +143,8 @@ class ManualTask(ABSTask):
 
 
 class StagedRandomTask(RandomTask):
-    def __init__(self, obstacles_manager: ObstaclesManager, robot_manager: RobotManager, start_stage: int = 1, PATHS=None):
-        super().__init__(obstacles_manager, robot_manager)
+    def __init__(self, obstacles_manager: ObstaclesManager, robot_manager: RobotManager, start_stage: int = 1, PATHS=None, reshuffle_rate: float = 1):
+        super().__init__(obstacles_manager, robot_manager, reshuffle_rate)
         if not isinstance(start_stage, int):
             raise ValueError("Given start_stage not an Integer!")
         self._curr_stage = start_stage
@@ -130,25 +154,41 @@ class StagedRandomTask(RandomTask):
         if self._curr_stage < 1 or self._curr_stage > len(self._stages):
             raise IndexError(
                 "Start stage given for training curriculum out of bounds! Has to be between {1 to %d}!" % len(self._stages))
+        self._spawn_obstacle_pool()
         self._initiate_stage()
 
     def next_stage(self):
         if self._curr_stage < len(self._stages):
             self._curr_stage += 1
             self._update_curr_stage_json()
-            self._remove_obstacles()
             self._initiate_stage()
 
+    def _spawn_obstacle_pool(self):
+        """spawn the maximum number of static and dynamic obstacles of all stages once, a stage only enables a
+        part of them (the others are parked outside of the map), so no obstacles need to be spawned or deleted
+        when the stage changes.
+        """
+        max_static_obstacles = max(stage['static'] for stage in self._stages.values())
+        max_dynamic_obstacles = max(stage['dynamic'] for stage in self._stages.values())
+
+        num_obstacles = len(self.obstacles_manager.obstacle_name_list)
+        self.obstacles_manager.register_random_static_obstacles(max_static_obstacles)
+        self._static_obstacle_pool = self.obstacles_manager.obstacle_name_list[num_obstacles:]
+        num_obstacles = len(self.obstacles_manager.obstacle_name_list)
+        self.obstacles_manager.register_random_dynamic_obstacles(max_dynamic_obstacles)
+        self._dynamic_obstacle_pool = self.obstacles_manager.obstacle_name_list[num_obstacles:]
+
+        print("Spawning a pool of %d static and %d dynamic obstacles!" %
+              (max_static_obstacles, max_dynamic_obstacles))
+
     def _initiate_stage(self):
         static_obstacles = self._stages[self._curr_stage]['static']
         dynamic_obstacles = self._stages[self._curr_stage]['dynamic']
 
-        self.obstacles_manager.register_random_static_obstacles(
-            self._stages[self._curr_stage]['static'])
-        self.obstacles_manager.register_random_dynamic_obstacles(
-            self._stages[self._curr_stage]['dynamic'])
+        self.obstacles_manager.set_enabled_obstacles(
+            self._static_obstacle_pool[:static_obstacles] + self._dynamic_obstacle_pool[:dynamic_obstacles])
 
-        print("Spawning %d static and %d dynamic obstacles!" %
+        print("Enabled %d static and %d dynamic obstacles!" %
               (static_obstacles, dynamic_obstacles))
 
     def _read_stages_from_yaml(self):
@@ -185,22 +225,32 @@ class StagedRandomTask(RandomTask):
 
 
 class ScenerioTask(ABSTask):
-    def __init__(self, obstacles_manager: ObstaclesManager, robot_manager: RobotManager, scenerios_json_path: str):
+    def __init__(self, obstacles_manager: ObstaclesManager, robot_manager: RobotManager, scenerios_json_path: str, prefetch: bool = False):
         """ The scenerio_json_path only has the "Scenerios" section, which contains a list of scenerios
         Args:
             scenerios_json_path (str): [description]
+            prefetch (bool, optional): prepare the next scenerio (model files, publishers) on a worker thread while
+                the current one is running, so that only the service calls to swap the obstacles are left when it's
+                loaded. Defaults to False.
         """
         super().__init__(obstacles_manager, robot_manager)
         json_path = Path(scenerios_json_path)
         assert json_path.is_file() and json_path.suffix == ".json"
-        json_data = json.load(json_path.open())
-        self._scenerios_data = json_data["scenerios"]
+        # the scenerios are validated and their model files are generated once, see scenerio_compiler
+        self._scenerios_data = load_compiled_scenerios(scenerios_json_path)
         # current index of the scenerio
         self._idx_curr_scene = -1
         # The times of current scenerio repeated
         self._num_repeats_curr_scene = -1
         # The times of current scenerio need to be repeated
         self._max_repeats_curr_scene = 0
+        # the obstacles of the current scenerio, static obstacles: name -> (yaml path, start pose)
+        self._curr_static_obstacles = {}
+        self._curr_dynamic_obstacle_names = []
+        # the next scenerio prepared by the worker thread (future of _prepare_scenerio)
+        self._prefetch_executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        self._next_scenerio = None
+        self._prepared_publishers = []
 
     def reset(self):
         info = {}
@@ -215,69 +265,102 @@ class ScenerioTask(ABSTask):
             robot_data = self._scenerios_data[self._idx_curr_scene]['robot']
             robot_start_pos = robot_data["start_pos"]
             robot_goal_pos = robot_data["goal_pos"]
-            info["robot_goal_pos"] = robot_goal_pos
+            info["robot_goal_pos"] = robot_goal_pos.tolist()
             self.robot_manager.set_start_pos_goal_pos(
-                Pose2D(*robot_start_pos), Pose2D(*robot_goal_pos))
+                Pose2D(*robot_start_pos.tolist()), Pose2D(*robot_goal_pos.tolist()))
             self._num_repeats_curr_scene += 1
             info['num_repeats_curr_scene'] = self._num_repeats_curr_scene
             info['max_repeats_curr_scene'] = self._max_repeats_curr_scene
         return info
 
-    def _set_new_scenerio(self):
-        try:
-            while True:
-                self._idx_curr_scene += 1
-                scenerio_data = self._scenerios_data[self._idx_curr_scene]
-                scenerio_name = scenerio_data['scene_name']
-                # use can set "repeats" to a non-positive value to disable the scenerio
-                if scenerio_data["repeats"] > 0:
-                    # set obstacles
-                    self.obstacles_manager.remove_obstacles()
-                    watchers_dict = scenerio_data.setdefault('watchers', [])
-                    for obstacle_name, obstacle_data in scenerio_data["static_obstacles"].items():
-                        if obstacle_data['shape'] == 'circle':
-                            self.obstacles_manager.register_static_obstacle_circle(obstacle_data['x'],obstacle_data['y'],obstacle_data['radius'])
-                        # vertices uses global coordinate system, the order of the vertices is doesn't matter
-                        elif obstacle_data['shape'] == 'polygon': 
-                            obstacle_vertices = np.array(
-                                obstacle_data["vertices"], dtype=np.float)
-                            self.obstacles_manager.register_static_obstacle_polygon(
-                                obstacle_vertices)
-                        else:
-                            raise ValueError(f"Shape {obstacle_data['shape']} is not supported, supported shape 'circle' OR 'polygon'")
-
-                    for obstacle_name, obstacle_data in scenerio_data["dynamic_obstacles"].items():
-                        # currently dynamic obstacle only has circle shape
-                        obstacle_radius = obstacle_data["obstacle_radius"]
-                        linear_velocity = obstacle_data['linear_velocity']
-                        # 3-elementary list
-                        start_pos = obstacle_data["start_pos"]
-                        waypoints = obstacle_data["waypoints"]
-                        is_waypoint_relative = obstacle_data["is_waypoint_relative"]
-                        mode = obstacle_data["mode"]
-                        trigger_zones = []
-                        if 'triggers' in obstacle_data:
-                            for trigger in obstacle_data['triggers']:
-                                if trigger not in watchers_dict:
-                                    raise ValueError(
-                                        f"For dynamic obstacle [{obstacle_name}] the trigger: {trigger} not found in the corresponding 'watchers' dict for scene {scenerio_name} ")
-                                trigger_zones.append(
-                                    watchers_dict[trigger]['pos']+[watchers_dict[trigger]['range']])
-                        self.obstacles_manager.register_dynamic_obstacle_circle_tween2(
-                            obstacle_name, obstacle_radius, linear_velocity, start_pos, waypoints, is_waypoint_relative, mode, trigger_zones)
-                    # self.robot_
-                    robot_data = scenerio_data["robot"]
-                    robot_start_pos = robot_data["start_pos"]
-                    robot_goal_pos = robot_data["goal_pos"]
-                    self.robot_manager.set_start_pos_goal_pos(
-                        Pose2D(*robot_start_pos), Pose2D(*robot_goal_pos))
-
-                    self._num_repeats_curr_scene = 0
-                    self._max_repeats_curr_scene = scenerio_data["repeats"]
-                    break
+    def _find_next_scenerio(self, idx_scene: int):
+        """index of the next scenerio after idx_scene which is enabled, None if there is none"""
+        # use can set "repeats" to a non-positive value to disable the scenerio
+        for idx in range(idx_scene + 1, len(self._scenerios_data)):
+            if self._scenerios_data[idx]["repeats"] > 0:
+                return idx
+        return None
 
-        except IndexError as e:
-            raise StopReset("All scenerios have been evaluated!") from e
+    def _prepare_scenerio(self, idx_scene: int):
+        """prepare everything of the scenerio which doesn't change the simulation, in prefetch mode it runs on the
+        worker thread.
+
+        Returns:
+            the index of the scenerio and the publishers of its dynamic obstacles, None if there is no scenerio
+        """
+        if idx_scene is None:
+            return None
+        scenerio_data = self._scenerios_data[idx_scene]
+        ensure_model_files(scenerio_data)
+        # registering a topic is a round trip to the master, the publishers created later for the same topics
+        # reuse the registration as long as these ones are alive
+        publishers = [rospy.Publisher(self.ns_prefix + topic, Empty, queue_size=1)
+                      for topic in scenerio_data["dynamic_obstacles"]['move_to_start_pos_topics']]
+        return idx_scene, publishers
+
+    def _set_new_scenerio(self):
+        if self._next_scenerio is not None:
+            prepared_scenerio = self._next_scenerio.result()
+            self._next_scenerio = None
+        else:
+            prepared_scenerio = self._prepare_scenerio(self._find_next_scenerio(self._idx_curr_scene))
+        if prepared_scenerio is None:
+            raise StopReset("All scenerios have been evaluated!")
+        self._idx_curr_scene, self._prepared_publishers = prepared_scenerio
+        scenerio_data = self._scenerios_data[self._idx_curr_scene]
+        self._swap_obstacles(scenerio_data)
+        # self.robot_
+        robot_data = scenerio_data["robot"]
+        robot_start_pos = robot_data["start_pos"]
+        robot_goal_pos = robot_data["goal_pos"]
+        self.robot_manager.set_start_pos_goal_pos(
+            Pose2D(*robot_start_pos.tolist()), Pose2D(*robot_goal_pos.tolist()))
+
+        self._num_repeats_curr_scene = 0
+        self._max_repeats_curr_scene = scenerio_data["repeats"]
+        if self._prefetch_executor is not None:
+            self._next_scenerio = self._prefetch_executor.submit(
+                self._prepare_scenerio, self._find_next_scenerio(self._idx_curr_scene))
+
+    def _swap_obstacles(self, scenerio_data: dict):
+        """replace the obstacles of the current scenerio by the ones of the given scenerio. Static obstacles at the
+        same place in both scenerios are kept, the dynamic ones are always respawned since their plugin has to
+        start over.
+        """
+        static_obstacles = scenerio_data["static_obstacles"]
+        new_static_obstacles = list(zip(static_obstacles['yaml_paths'],
+                                        map(tuple, static_obstacles['start_poses'].tolist())))
+        kept_static_obstacles = {}
+        if not self._curr_static_obstacles and not self._curr_dynamic_obstacle_names:
+            self.obstacles_manager.remove_obstacles()
+        else:
+            obstacles_to_delete = list(self._curr_dynamic_obstacle_names)
+            for name, static_obstacle in self._curr_static_obstacles.items():
+                if static_obstacle in new_static_obstacles:
+                    new_static_obstacles.remove(static_obstacle)
+                    kept_static_obstacles[name] = static_obstacle
+                else:
+                    obstacles_to_delete.append(name)
+            self._curr_static_obstacles, self._curr_dynamic_obstacle_names = kept_static_obstacles, []
+            failures = self.obstacles_manager.delete_obstacles(obstacles_to_delete)
+            if failures:
+                raise rospy.ServiceException(f"failed to remove the obstacles: {failures}")
+
+        num_obstacles = len(self.obstacles_manager.obstacle_name_list)
+        self.obstacles_manager.register_obstacles_batch(
+            [yaml_path for yaml_path, _ in new_static_obstacles],
+            [list(start_pos) for _, start_pos in new_static_obstacles], is_static=True)
+        self._curr_static_obstacles.update(
+            zip(self.obstacles_manager.obstacle_name_list[num_obstacles:], new_static_obstacles))
+
+        dynamic_obstacles = scenerio_data["dynamic_obstacles"]
+        self.obstacles_manager.clear_move_to_start_pos_publishers()
+        for move_to_start_pos_topic in dynamic_obstacles['move_to_start_pos_topics']:
+            self.obstacles_manager.add_move_to_start_pos_publisher(move_to_start_pos_topic)
+        num_obstacles = len(self.obstacles_manager.obstacle_name_list)
+        self.obstacles_manager.register_obstacles_batch(
+            dynamic_obstacles['yaml_paths'], dynamic_obstacles['start_poses'].tolist())
+        self._curr_dynamic_obstacle_names = self.obstacles_manager.obstacle_name_list[num_obstacles:]
 
     @staticmethod
     def generate_scenerios_json_example(dst_json_path: str):
@@ -331,40 +414,121 @@ class ScenerioTask(ABSTask):
         json.dump(json_data, dst_json_path_.open('w'), indent=4)
 
 
-def get_predefined_task(mode="random", start_stage: int = 1, PATHS: dict = None):
+def _is_service_available(service: str) -> bool:
+    # a single lookup at the master, rospy.wait_for_service sleeps 0.3s after every failed attempt
+    try:
+        rosgraph.Master(rospy.get_name()).lookupService(rospy.resolve_name(service))
+        return True
+    except rosgraph.MasterError:
+        return False
+
+
+def wait_for_simulation(ns: str = None, training_mode: bool = True, timeout: float = 60, max_steps_per_probe: int = 64,
+                        max_probe_interval: float = 1.0) -> dict:
+    """wait until the services (static_map, spawn_model, move_model, delete_model) and the map topic of the
+    simulation are available. In training mode the simulation only proceeds when it's stepped, therefore it's
+    stepped between the probes, the number of steps (and in real time mode the sleep time) between two probes is
+    doubled every time (bounded by max_steps_per_probe and max_probe_interval).
+
+    Args:
+        ns (str, optional): namespace of the simulation instance. Defaults to None (global namespace).
+        training_mode (bool, optional): the simulation is stepped by the service step_world. Defaults to True.
+        timeout (float, optional): in seconds. Defaults to 60.
+        max_steps_per_probe (int, optional): Defaults to 64.
+        max_probe_interval (float, optional): in seconds, only used in real time mode. Defaults to 1.0.
+
+    Raises:
+        ROSException: the simulation isn't ready after the timeout
+
+    Returns:
+        dict: timing breakdown, the time spent stepping and probing, the total time in seconds and the number of
+            steps and probes
+    """
+    ns_prefix = "" if ns is None or ns == "" else "/"+ns+"/"
+    services = [f'{ns_prefix}{name}' for name in ['static_map', 'spawn_model', 'move_model', 'delete_model']]
+    map_topic = rospy.resolve_name(f'{ns_prefix}map')
+    timing = {'step_world': 0.0, 'probe': 0.0, 'total': 0.0, 'num_steps': 0, 'num_probes': 0}
+    if training_mode:
+        from flatland_msgs.srv import StepWorld
+        step_world = rospy.ServiceProxy(f'{ns_prefix}step_world', StepWorld, persistent=True)
+
+    start_time = time.perf_counter()
+    num_steps, interval = 1, 0.05
+    missing_services, is_map_missing = services, True
+    while True:
+        probe_start_time = time.perf_counter()
+        # services and topics which are available once stay available
+        missing_services = [service for service in missing_services if not _is_service_available(service)]
+        if is_map_missing:
+            is_map_missing = all(topic != map_topic for topic, _ in rospy.get_published_topics('/'))
+        timing['probe'] += time.perf_counter() - probe_start_time
+        timing['num_probes'] += 1
+        if not missing_services and not is_map_missing:
+            break
+        if time.perf_counter() - start_time > timeout:
+            missing = missing_services + [map_topic] if is_map_missing else missing_services
+            raise ROSException(f"the simulation isn't ready after {timeout}s, missing: {missing}")
+        step_start_time = time.perf_counter()
+        if training_mode:
+            for _ in range(num_steps):
+                step_world()
+            timing['num_steps'] += num_steps
+            num_steps = min(2 * num_steps, max_steps_per_probe)
+        else:
+            time.sleep(interval)
+            interval = min(2 * interval, max_probe_interval)
+        timing['step_world'] += time.perf_counter() - step_start_time
+    if training_mode:
+        step_world.close()
+    timing['total'] = time.perf_counter() - start_time
+    rospy.loginfo(f"simulation {ns_prefix or '/'} ready after {timing['total']:.2f}s "
+                  f"(stepping {timing['step_world']:.2f}s / {timing['num_steps']} steps, "
+                  f"probing {timing['probe']:.2f}s / {timing['num_probes']} probes)")
+    return timing
+
+
+def get_predefined_task(mode="random", start_stage: int = 1, PATHS: dict = None, ns: str = None, prefetch_scenerios: bool = False, reshuffle_rate: float = 1):
+    """create a task together with its obstacles manager and robot manager.
+
+    Args:
+        mode (str, optional): task mode, one of "random", "manual", "staged" or "ScenerioTask". Defaults to "random".
+        start_stage (int, optional): stage to start with in "staged" mode. Defaults to 1.
+        PATHS (dict, optional): paths to the curriculum, model and scenerio files. Defaults to None.
+        ns (str, optional): namespace of the simulation instance the task is bound to. every parallel
+            environment needs its own task. Defaults to None (global namespace).
+        prefetch_scenerios (bool, optional): in "ScenerioTask" mode prepare the next scenerio while the current
+            one is running. Defaults to False.
+        reshuffle_rate (float, optional): in "random" and "staged" mode the fraction of the static obstacles which
+            get a new position every episode. Defaults to 1.
+    """
 
     # TODO extend get_predefined_task(mode="string") such that user can choose between task, if mode is
+    ns_prefix = "" if ns is None or ns == "" else "/"+ns+"/"
 
     # check is it on traininig mode or test mode. if it's on training mode
     # flatland will provide an service called 'step_world' to change the simulation time
     # otherwise it will be bounded to real time.
     try:
-        rospy.wait_for_service('step_world', timeout=0.5)
+        rospy.wait_for_service(f'{ns_prefix}step_world', timeout=0.5)
         TRAINING_MODE = True
     except ROSException:
         TRAINING_MODE = False
 
-    if TRAINING_MODE:
-        from flatland_msgs.srv import StepWorld, StepWorldRequest
-        # This is kind of hacky. the services provided by flatland may take a couple of step to complete
-        # the configuration including the map service.
-        steps = 400
-        step_world = rospy.ServiceProxy(
-            'step_world', StepWorld, persistent=True)
-        for _ in range(steps):
-            step_world()
+    # the services provided by flatland may take a couple of steps to complete the configuration including the
+    # map service.
+    wait_for_simulation(ns, TRAINING_MODE)
 
     # get the map
-    service_client_get_map = rospy.ServiceProxy("static_map", GetMap)
+    service_client_get_map = rospy.ServiceProxy(f"{ns_prefix}static_map", GetMap)
     map_response = service_client_get_map()
 
     # use rospkg to get the path where the model config yaml file stored
     models_folder_path = rospkg.RosPack().get_path('simulator_setup')
     # robot's yaml file is needed to get its radius.
     robot_manager = RobotManager(map_response.map, os.path.join(
-        models_folder_path, 'robot', "myrobot.model.yaml"), TRAINING_MODE)
+        models_folder_path, 'robot', "myrobot.model.yaml"), TRAINING_MODE, ns=ns)
 
-    obstacles_manager = ObstaclesManager(map_response.map, TRAINING_MODE)
+    obstacles_manager = ObstaclesManager(map_response.map, TRAINING_MODE, ns=ns)
     # only generate 3 static obstaticles
     # obstacles_manager.register_obstacles(3, os.path.join(
     # models_folder_path, "obstacles", 'random.model.yaml'), 'static')
@@ -376,7 +540,7 @@ def get_predefined_task(mode="random", start_stage: int = 1, PATHS: dict = None)
     task = None
     if mode == "random":
         obstacles_manager.register_random_obstacles(20, 0.4)
-        task = RandomTask(obstacles_manager, robot_manager)
+        task = RandomTask(obstacles_manager, robot_manager, reshuffle_rate)
         print("random tasks requested")
     if mode == "manual":
         obstacles_manager.register_random_obstacles(20, 0.4)
@@ -384,8 +548,8 @@ def get_predefined_task(mode="random", start_stage: int = 1, PATHS: dict = None)
         print("manual tasks requested")
     if mode == "staged":
         task = StagedRandomTask(
-            obstacles_manager, robot_manager, start_stage, PATHS)
+            obstacles_manager, robot_manager, start_stage, PATHS, reshuffle_rate)
     if mode == "ScenerioTask":
         task = ScenerioTask(obstacles_manager, robot_manager,
-                            PATHS['scenerios_json_path'])
+                            PATHS['scenerios_json_path'], prefetch=prefetch_scenerios)
     return task
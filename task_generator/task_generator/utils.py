@@ -1,7 +1,13 @@
+import hashlib
 import math
+import threading
+from collections import OrderedDict
 import numpy as np
 from nav_msgs.msg import OccupancyGrid
 import random
+from scipy import ndimage
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import dijkstra
 
 
 def generate_freespace_indices(map_: OccupancyGrid) -> tuple:
@@ -82,3 +88,376 @@ def get_random_pos_on_map(free_space_indices, map_: OccupancyGrid, safe_dist: fl
     theta = random.uniform(-math.pi, math.pi)
 
     return x_in_meters, y_in_meters, theta
+
+
+class NoReachableGoalError(Exception):
+    """raised by MapIndex.sample_reachable_goal if no goal position can be reached from the start position"""
+
+
+class MapIndex:
+    """free space of a map preprocessed for sampling positions. The clearance (distance to the closest non-free
+    cell) of every cell is computed by a euclidean distance transform, the cells with enough clearance are then
+    collected once per safe distance. All derived data is computed lazily on first use.
+
+    Use get_map_index to share the index of a map between all users in the process.
+    """
+
+    def __init__(self, map_: OccupancyGrid):
+        """
+        Args:
+            map_ (OccupancyGrid): map proviced by the ros map service
+        """
+        self.map = map_
+        self.resolution = map_.info.resolution
+        self.width, self.height = map_.info.width, map_.info.height
+        self.origin = np.array([map_.info.origin.position.x, map_.info.origin.position.y])
+        # computed on first use, see the properties grid, free_space_indices and clearance
+        self._grid = None
+        self._free_space_indices = None
+        self._clearance = None
+        # safe_dist -> flat indices and positions (x,y) in meters of the cells with enough clearance
+        self._free_cells = {}
+        self._free_positions = {}
+        # safe_dist -> labels of the connected components of the cells with enough clearance
+        self._component_labels = {}
+        # safe_dist -> (downsampling factor, graph of the coarse grid), (safe_dist, node) -> path distances
+        self._coarse_graphs = {}
+        self._path_distances = OrderedDict()
+        self._lock = threading.RLock()
+
+    @property
+    def grid(self) -> np.ndarray:
+        """the map data with the shape (height, width)"""
+        with self._lock:
+            if self._grid is None:
+                self._grid = np.reshape(np.asarray(self.map.data, dtype=np.int8), (self.height, self.width))
+            return self._grid
+
+    @property
+    def free_space_indices(self) -> tuple:
+        """indices of the non-occupied cells, the first element is the y-axis indices, the second element is the
+        x-axis indices (see generate_freespace_indices)."""
+        with self._lock:
+            if self._free_space_indices is None:
+                self._free_space_indices = np.where(self.grid == 0)
+            return self._free_space_indices
+
+    @property
+    def clearance(self) -> np.ndarray:
+        """distance in meters from every cell to the closest non-free cell, with the shape (height, width)"""
+        with self._lock:
+            if self._clearance is None:
+                # unknown cells and the area outside of the map are treated like occupied cells
+                free = np.pad(self.grid == 0, 1, constant_values=False)
+                self._clearance = ndimage.distance_transform_edt(free)[1:-1, 1:-1] * self.resolution
+            return self._clearance
+
+    def get_component_labels(self, safe_dist: float = 0) -> np.ndarray:
+        """labels of the 4-connected components of the cells whose clearance is at least safe_dist (the free space
+        inflated by safe_dist), with the shape (height, width), 0 for the other cells. A robot with the radius
+        safe_dist can drive between two cells if and only if they have the same label.
+        """
+        with self._lock:
+            if safe_dist not in self._component_labels:
+                self._component_labels[safe_dist], _ = ndimage.label(self.clearance >= max(safe_dist, 1e-9))
+            return self._component_labels[safe_dist]
+
+    def get_free_cells(self, safe_dist: float) -> np.ndarray:
+        """flat indices of all cells whose clearance is at least safe_dist"""
+        with self._lock:
+            if safe_dist not in self._free_cells:
+                self._free_cells[safe_dist] = np.flatnonzero(self.clearance >= safe_dist)
+            return self._free_cells[safe_dist]
+
+    def get_free_positions(self, safe_dist: float) -> np.ndarray:
+        """positions (x,y) in meters of all cells whose clearance is at least safe_dist, shape (N,2)"""
+        with self._lock:
+            if safe_dist not in self._free_positions:
+                y_in_cells, x_in_cells = np.divmod(self.get_free_cells(safe_dist), self.width)
+                self._free_positions[safe_dist] = np.stack([x_in_cells, y_in_cells], axis=1) * self.resolution + \
+                    self.origin
+            return self._free_positions[safe_dist]
+
+    def world_to_cell(self, x: float, y: float) -> tuple:
+        """cell (row, col) of a position, None if it's outside of the map"""
+        # the positions of sampled cells are their corners, the tolerance avoids rounding them to the neighbor
+        col = math.floor((x - self.origin[0]) / self.resolution + 1e-6)
+        row = math.floor((y - self.origin[1]) / self.resolution + 1e-6)
+        if 0 <= row < self.height and 0 <= col < self.width:
+            return row, col
+        return None
+
+    def is_reachable(self, start: tuple, goal: tuple, safe_dist: float) -> bool:
+        """whether a robot with the radius safe_dist can drive from the start position (x,y) to the goal position
+        (x,y)"""
+        start_cell, goal_cell = self.world_to_cell(*start[:2]), self.world_to_cell(*goal[:2])
+        if start_cell is None or goal_cell is None:
+            return False
+        labels = self.get_component_labels(safe_dist)
+        return labels[start_cell] != 0 and labels[start_cell] == labels[goal_cell]
+
+    def _get_coarse_graph(self, safe_dist: float):
+        """graph of a coarse grid with cells of about the size safe_dist, a coarse cell is passable if all of its
+        cells have a clearance of at least safe_dist. Neighboring passable cells (8-connected) are linked."""
+        with self._lock:
+            if safe_dist not in self._coarse_graphs:
+                factor = max(1, int(safe_dist / self.resolution))
+                height, width = -(-self.height // factor), -(-self.width // factor)
+                inflated = np.zeros((height * factor, width * factor), dtype=bool)
+                inflated[:self.height, :self.width] = self.clearance >= max(safe_dist, 1e-9)
+                passable = inflated.reshape(height, factor, width, factor).all(axis=(1, 3))
+                nodes = np.arange(height * width).reshape(height, width)
+                rows, cols, weights = [], [], []
+                for d_row, d_col in [(0, 1), (1, 0), (1, 1), (1, -1)]:
+                    # the cells and their neighbors in the direction (d_row, d_col)
+                    src = (slice(0, height - d_row), slice(max(0, -d_col), width - max(0, d_col)))
+                    dst = (slice(d_row, height), slice(max(0, d_col), width - max(0, -d_col)))
+                    linked = passable[src] & passable[dst]
+                    rows.append(nodes[src][linked])
+                    cols.append(nodes[dst][linked])
+                    weights.append(np.full(linked.sum(), math.hypot(d_row, d_col) * factor * self.resolution))
+                rows, cols, weights = np.concatenate(rows), np.concatenate(cols), np.concatenate(weights)
+                graph = coo_matrix((weights, (rows, cols)), shape=(height * width, height * width)).tocsr()
+                self._coarse_graphs[safe_dist] = (factor, width, graph)
+            return self._coarse_graphs[safe_dist]
+
+    def get_path_distances(self, start: tuple, safe_dist: float) -> tuple:
+        """approximated lengths of the shortest paths of a robot with the radius safe_dist from the start position
+        (x,y) to all cells, computed on a coarse grid (see _get_coarse_graph). The last 32 results are cached.
+
+        Returns:
+            tuple: downsampling factor of the coarse grid and the path lengths in meters with the shape (height of
+                coarse grid, width of coarse grid), inf for unreachable coarse cells.
+        """
+        factor, width, graph = self._get_coarse_graph(safe_dist)
+        start_cell = self.world_to_cell(*start[:2])
+        if start_cell is None:
+            raise ValueError("the start position is outside of the map")
+        node = (start_cell[0] // factor) * width + start_cell[1] // factor
+        with self._lock:
+            if (safe_dist, node) in self._path_distances:
+                self._path_distances.move_to_end((safe_dist, node))
+            else:
+                distances = dijkstra(graph, directed=False, indices=node).reshape(-1, width)
+                self._path_distances[(safe_dist, node)] = distances
+                if len(self._path_distances) > 32:
+                    self._path_distances.popitem(last=False)
+            return factor, self._path_distances[(safe_dist, node)]
+
+    def sample_reachable_goal(self, start: tuple, safe_dist: float, path_safe_dist: float, min_dist: float = 0,
+                              min_path_length: float = None, max_path_length: float = None) -> tuple:
+        """draw a random goal position which can be reached from the start position.
+
+        Args:
+            start (tuple): start position (x,y) of the robot
+            safe_dist (float): minimum clearance of the goal
+            path_safe_dist (float): minimum clearance along the path, usually the robot radius
+            min_dist (float, optional): minimum straight distance between start and goal. Defaults to 0.
+            min_path_length (float, optional): minimum length of the path, approximated on a coarse grid.
+                Defaults to None.
+            max_path_length (float, optional): maximum length of the path, approximated on a coarse grid.
+                Defaults to None.
+
+        Raises:
+            NoReachableGoalError: the start position isn't in the free space or there is no valid goal position
+
+        Returns:
+            x_in_meters,y_in_meters,theta
+        """
+        start_cell = self.world_to_cell(*start[:2])
+        label = 0 if start_cell is None else self.get_component_labels(path_safe_dist)[start_cell]
+        if label == 0:
+            raise NoReachableGoalError("the start position is not in the free space")
+        cells = self.get_free_cells(safe_dist)
+        positions = self.get_free_positions(safe_dist)
+        valid = self.get_component_labels(path_safe_dist).ravel()[cells] == label
+        valid &= (positions[:, 0] - start[0])**2 + (positions[:, 1] - start[1])**2 >= min_dist**2
+        if min_path_length is not None or max_path_length is not None:
+            factor, distances = self.get_path_distances(start, path_safe_dist)
+            rows, cols = np.divmod(cells, self.width)
+            path_lengths = distances[rows // factor, cols // factor]
+            if min_path_length is not None:
+                valid &= path_lengths >= min_path_length
+            if max_path_length is not None:
+                valid &= path_lengths <= max_path_length
+        candidates = np.flatnonzero(valid)
+        if len(candidates) == 0:
+            raise NoReachableGoalError("can not find a reachable goal position for the given start position")
+        x_in_meters, y_in_meters = positions[candidates[random.randrange(len(candidates))]].tolist()
+        return x_in_meters, y_in_meters, random.uniform(-math.pi, math.pi)
+
+    def sample_positions(self, n: int, safe_dist: float, forbidden_zones: list = None) -> np.ndarray:
+        """draw n random positions with a clearance of at least safe_dist outside of the forbidden zones.
+
+        Args:
+            n (int): number of positions
+            safe_dist (float): minimum distance to occupied cells and forbidden zones
+            forbidden_zones (list of 3 elementary tuple(x,y,r)): a list of zones which is forbidden
+
+        Returns:
+            np.ndarray: positions (x_in_meters, y_in_meters, theta) with the shape (n,3)
+        """
+        positions = self.get_free_positions(safe_dist)
+        if len(positions) == 0:
+            raise Exception(
+                "cann't find any no-occupied space please check the map information")
+        forbidden_zones = forbidden_zones or []
+
+        def is_valid(candidates):
+            valid = np.ones(len(candidates), dtype=bool)
+            for zone_x, zone_y, zone_r in forbidden_zones:
+                valid &= (candidates[:, 0] - zone_x)**2 + (candidates[:, 1] - zone_y)**2 >= (zone_r + safe_dist)**2
+            return valid
+
+        # the forbidden zones usually cover a small part of the map, most of the drawn positions are valid
+        result = np.empty((n, 3))
+        n_found = 0
+        for _ in range(10):
+            if n_found == n:
+                break
+            candidates = positions[[random.randrange(len(positions)) for _ in range(2 * (n - n_found))]]
+            candidates = candidates[is_valid(candidates)][:n - n_found]
+            result[n_found:n_found + len(candidates), :2] = candidates
+            n_found += len(candidates)
+        if n_found < n:
+            # most of the free space is forbidden, draw from the remaining positions directly
+            positions = positions[is_valid(positions)]
+            if len(positions) == 0:
+                raise Exception(
+                    "cann't find any no-occupied space please check the map information")
+            result[n_found:, :2] = positions[[random.randrange(len(positions)) for _ in range(n - n_found)]]
+        result[:, 2] = [random.uniform(-math.pi, math.pi) for _ in range(n)]
+        return result
+
+    def sample_separated_positions(self, radii: list, forbidden_zones: list = None, placed_obstacles: list = None,
+                                   max_rounds: int = 10, num_candidates: int = 4) -> np.ndarray:
+        """draw one position per obstacle such that the obstacles overlap neither each other nor the occupied cells
+        or the forbidden zones.
+
+        Every round draws num_candidates positions for each obstacle which isn't placed yet at once, the candidates
+        are checked against the placed obstacles with a uniform grid (spatial hash) whose cells are as large as the
+        largest possible distance of two overlapping obstacles, so only the placed obstacles in the 3x3 neighborhood
+        of a candidate are compared. The larger obstacles are placed first. Obstacles which can't be placed after
+        max_rounds rounds (e.g. the map is too crowded) are drawn like by sample_positions with their own radius
+        rounded up to whole cells, they keep their distance to the occupied cells and the forbidden zones but may
+        overlap the other obstacles.
+
+        Args:
+            radii (list): radius of the bounding circle of every obstacle
+            forbidden_zones (list of 3 elementary tuple(x,y,r)): a list of zones which is forbidden
+            placed_obstacles (list of 3 elementary tuple(x,y,r)): obstacles which are already in the map, the new
+                ones don't overlap them.
+            max_rounds (int, optional): Defaults to 10.
+            num_candidates (int, optional): candidates per obstacle and round. Defaults to 4.
+
+        Returns:
+            np.ndarray: positions (x_in_meters, y_in_meters, theta) with the shape (n,3)
+        """
+        # obstacles without a footprint still must not be placed on occupied cells
+        radii = np.maximum(np.asarray(radii, dtype=np.float64).reshape(-1), 1e-9)
+        n = len(radii)
+        result = np.empty((n, 3))
+        if n == 0:
+            return result
+        # the candidates are drawn from the cells with the clearance of the smallest obstacle, rounded down to whole
+        # cells so that random radii don't fill the per safe_dist caches
+        min_radius = math.floor(float(radii.min()) / self.resolution) * self.resolution
+        cells, positions = self.get_free_cells(min_radius), self.get_free_positions(min_radius)
+        if len(positions) == 0:
+            raise Exception(
+                "cann't find any no-occupied space please check the map information")
+        zones = np.asarray(forbidden_zones or [], dtype=np.float64).reshape(-1, 3)
+        clearance = self.clearance.reshape(-1)
+        # seeded by the random module like the other samplers
+        rng = np.random.default_rng(random.getrandbits(64))
+
+        # the placed obstacles get the indices n, n+1, ... in the spatial hash
+        placed_obstacles = np.asarray(placed_obstacles or [], dtype=np.float64).reshape(-1, 3)
+        placed_xy = np.concatenate([np.zeros((n, 2)), placed_obstacles[:, :2]])
+        radii = np.concatenate([radii, placed_obstacles[:, 2]])
+        hash_cell_size = 2 * float(radii.max())
+        spatial_hash = {}
+        for obstacle, key in enumerate(np.floor(placed_xy[n:] / hash_cell_size).astype(np.int64).tolist(), n):
+            spatial_hash.setdefault(tuple(key), []).append(obstacle)
+        pending = np.argsort(-radii[:n], kind='stable')
+        for _ in range(max_rounds):
+            if len(pending) == 0:
+                break
+            # (num_pending, num_candidates)
+            idx_candidates = rng.integers(len(positions), size=(len(pending), num_candidates))
+            candidates = positions[idx_candidates]
+            pending_radii = radii[pending][:, None]
+            valid = clearance[cells[idx_candidates]] >= pending_radii
+            for zone_x, zone_y, zone_r in zones:
+                valid &= (candidates[..., 0] - zone_x)**2 + (candidates[..., 1] - zone_y)**2 >= \
+                    (zone_r + pending_radii)**2
+            hash_keys = np.floor(candidates / hash_cell_size).astype(np.int64)
+
+            not_placed = []
+            for i, obstacle in enumerate(pending):
+                for j in np.flatnonzero(valid[i]):
+                    x, y = candidates[i, j]
+                    key_x, key_y = hash_keys[i, j]
+                    if all((x - placed_xy[other, 0])**2 + (y - placed_xy[other, 1])**2 >= (radii[obstacle] + radii[other])**2
+                           for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                           for other in spatial_hash.get((key_x + dx, key_y + dy), ())):
+                        placed_xy[obstacle] = x, y
+                        spatial_hash.setdefault((key_x, key_y), []).append(obstacle)
+                        break
+                else:
+                    not_placed.append(obstacle)
+            pending = np.array(not_placed, dtype=np.int64)
+        result[:, :2] = placed_xy[:n]
+        for obstacle in pending:
+            safe_dist = max(1, math.ceil(radii[obstacle] / self.resolution - 1e-6)) * self.resolution
+            result[obstacle] = self.sample_positions(1, safe_dist, forbidden_zones)[0]
+        result[:, 2] = rng.uniform(-math.pi, math.pi, size=n)
+        return result
+
+    def get_random_pos(self, safe_dist: float, forbidden_zones: list = None):
+        """single position version of sample_positions
+
+        Returns:
+           x_in_meters,y_in_meters,theta
+        """
+        x_in_meters, y_in_meters, theta = self.sample_positions(1, safe_dist, forbidden_zones)[0].tolist()
+        return x_in_meters, y_in_meters, theta
+
+
+# the indices of the last maps of the process, keyed by the hash of the map
+MAP_CACHE_SIZE = 4
+_map_cache = OrderedDict()
+_map_cache_lock = threading.Lock()
+# the message of the last lookup, a message passed to several users is only hashed once
+_last_map_msg = None
+_last_map_index = None
+
+
+def get_map_hash(map_: OccupancyGrid) -> str:
+    """content hash of the map, independent of the header (e.g. the time stamp)"""
+    info = map_.info
+    hasher = hashlib.sha1()
+    hasher.update(np.array([info.width, info.height], dtype=np.int64).tobytes())
+    hasher.update(np.array([info.resolution, info.origin.position.x, info.origin.position.y,
+                            info.origin.orientation.z, info.origin.orientation.w], dtype=np.float64).tobytes())
+    hasher.update(np.asarray(map_.data, dtype=np.int8).tobytes())
+    return hasher.hexdigest()
+
+
+def get_map_index(map_: OccupancyGrid) -> MapIndex:
+    """the MapIndex of the map shared by all users in the process. A republished map with the same content gets
+    the existing index, so nothing is recomputed.
+    """
+    global _last_map_msg, _last_map_index
+    with _map_cache_lock:
+        if map_ is _last_map_msg:
+            return _last_map_index
+        map_hash = get_map_hash(map_)
+        if map_hash in _map_cache:
+            _map_cache.move_to_end(map_hash)
+        else:
+            _map_cache[map_hash] = MapIndex(map_)
+            if len(_map_cache) > MAP_CACHE_SIZE:
+                _map_cache.popitem(last=False)
+        _last_map_msg, _last_map_index = map_, _map_cache[map_hash]
+        return _last_map_index
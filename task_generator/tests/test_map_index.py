@@ -0,0 +1,145 @@
+import math
+import random
+
+import numpy as np
+import pytest
+
+OccupancyGrid = pytest.importorskip("nav_msgs.msg").OccupancyGrid
+
+from task_generator.utils import MapIndex, NoReachableGoalError, get_map_index
+
+RESOLUTION = 0.1
+ORIGIN = (-1.0, -2.0)
+# column of the wall which splits the map into a left and a right room
+WALL_COL = 30
+
+
+def make_grid() -> np.ndarray:
+    """60x40 cells with walls around the map, a wall between the two rooms and a block in the left room"""
+    grid = np.zeros((40, 60), dtype=np.int8)
+    grid[[0, -1], :] = 100
+    grid[:, [0, -1]] = 100
+    grid[:, WALL_COL] = 100
+    grid[15:20, 10:14] = 100
+    # unknown cells are treated like occupied ones
+    grid[30:33, 45:48] = -1
+    return grid
+
+
+def make_map(grid: np.ndarray, seq: int = 0) -> OccupancyGrid:
+    map_ = OccupancyGrid()
+    map_.header.seq = seq
+    map_.info.resolution = RESOLUTION
+    map_.info.height, map_.info.width = grid.shape
+    map_.info.origin.position.x, map_.info.origin.position.y = ORIGIN
+    map_.info.origin.orientation.w = 1.0
+    map_.data = grid.reshape(-1).tolist()
+    return map_
+
+
+def wall_distance(grid: np.ndarray, x: float, y: float) -> float:
+    """brute force distance between the cell of the position and the closest non-free cell"""
+    row = int(round((y - ORIGIN[1]) / RESOLUTION))
+    col = int(round((x - ORIGIN[0]) / RESOLUTION))
+    rows, cols = np.nonzero(grid != 0)
+    return float(np.hypot(rows - row, cols - col).min()) * RESOLUTION
+
+
+def to_col(x: float) -> int:
+    return int(round((x - ORIGIN[0]) / RESOLUTION))
+
+
+@pytest.fixture(autouse=True)
+def seed():
+    random.seed(0)
+
+
+@pytest.fixture
+def grid():
+    return make_grid()
+
+
+@pytest.fixture
+def map_index(grid):
+    return MapIndex(make_map(grid))
+
+
+@pytest.mark.parametrize("safe_dist", [0.1, 0.25, 0.4])
+def test_sample_positions_clearance(grid, map_index, safe_dist):
+    positions = map_index.sample_positions(200, safe_dist)
+    assert positions.shape == (200, 3)
+    for x, y, theta in positions.tolist():
+        assert wall_distance(grid, x, y) >= safe_dist - 1e-9
+        assert -math.pi <= theta <= math.pi
+
+
+def test_sample_positions_forbidden_zones(grid, map_index):
+    safe_dist = 0.2
+    # the second zone covers most of the right room
+    forbidden_zones = [(0.5, 0.0, 0.5), (3.5, 0.0, 1.3)]
+    positions = map_index.sample_positions(300, safe_dist, forbidden_zones)
+    for x, y, _ in positions.tolist():
+        assert wall_distance(grid, x, y) >= safe_dist - 1e-9
+        for zone_x, zone_y, zone_r in forbidden_zones:
+            assert math.hypot(x - zone_x, y - zone_y) >= zone_r + safe_dist - 1e-9
+
+
+def test_sample_separated_positions(grid, map_index):
+    rng = np.random.default_rng(0)
+    radii = rng.uniform(0.1, 0.3, 15)
+    forbidden_zones = [(0.5, 0.0, 0.4)]
+    placed_obstacles = [(3.0, -0.5, 0.3), (4.0, 0.5, 0.2)]
+    positions = map_index.sample_separated_positions(radii, forbidden_zones, placed_obstacles)
+    assert positions.shape == (15, 3)
+
+    obstacles = [(x, y, r) for (x, y, _), r in zip(positions.tolist(), radii.tolist())]
+    for i, (x, y, r) in enumerate(obstacles):
+        assert wall_distance(grid, x, y) >= r - 1e-9
+        for zone_x, zone_y, zone_r in forbidden_zones:
+            assert math.hypot(x - zone_x, y - zone_y) >= zone_r + r - 1e-9
+        for other_x, other_y, other_r in obstacles[i + 1:] + placed_obstacles:
+            assert math.hypot(x - other_x, y - other_y) >= r + other_r - 1e-9
+
+
+def test_sample_separated_positions_crowded_map_keeps_clearance(grid, map_index):
+    # far too many obstacles for the map, the obstacles which can't be placed may only overlap each other
+    radii = [0.5] * 20 + [0.0] * 10
+    positions = map_index.sample_separated_positions(radii, max_rounds=2)
+    for (x, y, _), r in zip(positions.tolist(), radii):
+        assert wall_distance(grid, x, y) >= max(r, RESOLUTION) - 1e-9
+
+
+def test_is_reachable(map_index):
+    left_a, left_b, right = (0.0, -1.0), (0.5, 1.5), (3.5, 0.0)
+    assert map_index.is_reachable(left_a, left_b, 0.15)
+    assert not map_index.is_reachable(left_a, right, 0.15)
+    assert not map_index.is_reachable(right, left_a, 0.15)
+    # outside of the map
+    assert not map_index.is_reachable(left_a, (-5.0, 0.0), 0.15)
+
+
+def test_sample_reachable_goal(map_index):
+    start = (0.0, -1.0)
+    for _ in range(50):
+        x, y, _ = map_index.sample_reachable_goal(start, 0.2, 0.15, min_dist=0.5)
+        assert to_col(x) < WALL_COL
+        assert math.hypot(x - start[0], y - start[1]) >= 0.5
+        assert map_index.is_reachable(start, (x, y), 0.15)
+
+
+def test_sample_reachable_goal_no_valid_goal(map_index):
+    # the left room is smaller than the minimum distance
+    with pytest.raises(NoReachableGoalError):
+        map_index.sample_reachable_goal((0.0, -1.0), 0.2, 0.15, min_dist=10.0)
+    # the start position is inside of the wall
+    with pytest.raises(NoReachableGoalError):
+        map_index.sample_reachable_goal((WALL_COL * RESOLUTION + ORIGIN[0], 0.0), 0.2, 0.15)
+
+
+def test_get_map_index_caching(grid):
+    map_index = get_map_index(make_map(grid, seq=1))
+    assert get_map_index(make_map(grid, seq=2)) is map_index
+
+    other_grid = grid.copy()
+    other_grid[20, 40] = 100
+    assert get_map_index(make_map(other_grid)) is not map_index